@@ -0,0 +1,28 @@
+"""Index users.token_expires_at
+
+Revision ID: d8f2a4c6e1b3
+Revises: c5d1e7a3b9f2
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f2a4c6e1b3'
+down_revision: Union[str, Sequence[str], None] = 'c5d1e7a3b9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_users_token_expires_at'), 'users', ['token_expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_token_expires_at'), table_name='users')
@@ -0,0 +1,42 @@
+"""Unique index on quota_usage (user_id, date)
+
+Revision ID: e4b9c2d7f1a6
+Revises: d8f2a4c6e1b3
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9c2d7f1a6'
+down_revision: Union[str, Sequence[str], None] = 'd8f2a4c6e1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTER_COLUMNS = ['api_calls_count', 'quota_units_used', 'videos_list_calls', 'videos_update_calls']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        # Older writers stored the time of the first call; rows are per day
+        op.execute("UPDATE quota_usage SET date = date_trunc('day', date) WHERE date <> date_trunc('day', date)")
+
+    # Fold duplicate (user, day) rows into the first one before the index is created
+    totals = ", ".join(f"{column} = (SELECT SUM(COALESCE(d.{column}, 0)) FROM quota_usage d "
+                       f"WHERE d.user_id = quota_usage.user_id AND d.date = quota_usage.date)"
+                       for column in COUNTER_COLUMNS)
+    first_rows = "SELECT MIN(id) FROM quota_usage GROUP BY user_id, date"
+    op.execute(f"UPDATE quota_usage SET {totals} WHERE id IN ({first_rows} HAVING COUNT(*) > 1)")
+    op.execute(f"DELETE FROM quota_usage WHERE id NOT IN ({first_rows})")
+
+    op.create_index('ix_quota_usage_user_id_date', 'quota_usage', ['user_id', 'date'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_quota_usage_user_id_date', table_name='quota_usage')
@@ -7,9 +7,12 @@ from pydantic import BaseModel, Field
 from .database import get_db
 from .models import User, ABTest, TitleRotation, QuotaUsage
 from .youtube_api import get_youtube_client, YouTubeAPIClient
-from .auth_dependencies import get_current_firebase_user, get_current_paid_user
+from .auth_dependencies import get_current_firebase_user, get_current_paid_user, get_paid_auth_context
+from .auth_context import AuthContext, AUTHORIZED_EMAILS
 from .tasks import update_quota_usage
-from .services.token_refresh import refresh_google_token
+from .google_token_refresh import google_token_refresher
+from .auth_manager import AuthenticationError
+from .quota_forecaster import quota_forecaster, AdmissionDecision
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,6 +39,7 @@ class ABTestResponse(BaseModel):
     created_at: datetime
     started_at: Optional[datetime]
     completed_at: Optional[datetime]
+    admission: Optional[dict] = None
 
 
 class TitleRotationResponse(BaseModel):
@@ -109,6 +113,15 @@ async def create_ab_test(
                 detail="An active test already exists for this video"
             )
         
+        admission = quota_forecaster.evaluate_admission(
+            db, request.test_duration_hours, request.rotation_interval_hours
+        )
+        if admission["decision"] == AdmissionDecision.REJECT:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={"message": "Test cannot fit in the YouTube API quota", **admission}
+            )
+        
         ab_test = ABTest(
             user_id=current_user.id,
             video_id=request.video_id,
@@ -137,9 +150,12 @@ async def create_ab_test(
             status=ab_test.status,
             created_at=ab_test.created_at,
             started_at=ab_test.started_at,
-            completed_at=ab_test.completed_at
+            completed_at=ab_test.completed_at,
+            admission=admission
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating A/B test: {str(e)}")
         raise HTTPException(
@@ -233,6 +249,21 @@ async def start_ab_test(
             detail="A/B test not found or already started"
         )
     
+    admission = quota_forecaster.evaluate_admission(
+        db, test.test_duration_hours, test.rotation_interval_hours
+    )
+    if admission["decision"] == AdmissionDecision.REJECT:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Test cannot fit in the YouTube API quota", **admission}
+        )
+    if admission["decision"] == AdmissionDecision.DEFER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"message": "Projected YouTube API quota is exhausted. Start the test later.", **admission},
+            headers={"Retry-After": str(admission["retry_after"])}
+        )
+    
     try:
         first_title = test.title_variants[0]
         logger.info(f"Starting A/B test {test.id}: updating video {test.video_id} title to '{first_title}'")
@@ -279,8 +310,10 @@ async def start_ab_test(
         
         logger.info(f"Started A/B test {test.id}")
         
-        return {"message": "A/B test started successfully"}
+        return {"message": "A/B test started successfully", "admission": admission}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error starting A/B test: {str(e)}")
         raise HTTPException(
@@ -454,7 +487,7 @@ async def get_test_rotations(
 @router.get("/channel/videos")
 async def get_channel_videos(
     max_results: int = 50,
-    current_user: User = Depends(get_current_paid_user),
+    auth: AuthContext = Depends(get_paid_auth_context),
     db: Session = Depends(get_db),
     youtube_client: YouTubeAPIClient = Depends(get_youtube_client)
 ):
@@ -463,30 +496,26 @@ async def get_channel_videos(
         from .config import settings
         
         # NO MOCK DATA - Always use real YouTube API in production
+        current_user = auth.user
         
         logger.info(f"Starting channel videos fetch for user {current_user.id}")
         
-        # Bypass token refresh for authorized emails to avoid session issues
-        authorized_emails = [
-            "liftedkulture@gmail.com", 
-            "liftedkulture-6202@pages.plusgoogle.com",
-            "Shemeka.womenofexcellence@gmail.com"
-        ]
-        
         # Check if user needs token refresh or doesn't have a valid token
-        access_token = current_user.get_google_access_token()
+        access_token = auth.access_token
         logger.info(f"User {current_user.email} current token status: has_token={bool(access_token)}, needs_refresh={current_user.needs_token_refresh()}")
         
         if not access_token or current_user.needs_token_refresh():
             logger.info(f"Token refresh needed for user {current_user.id}")
             
             # For authorized users, attempt refresh but handle failures gracefully
-            if current_user.email in authorized_emails:
+            if current_user.email in AUTHORIZED_EMAILS:
                 logger.info(f"Attempting token refresh for authorized user {current_user.email}")
                 try:
-                    access_token = refresh_google_token(current_user)
+                    access_token = await google_token_refresher.refresh(current_user.id)
+                    if not access_token:
+                        raise ValueError("No refresh token available")
                     logger.info(f"Successfully refreshed token for authorized user {current_user.email}")
-                except ValueError as e:
+                except (AuthenticationError, ValueError) as e:
                     logger.error(f"Token refresh failed for authorized user {current_user.email}: {e}")
                     raise HTTPException(
                         status_code=401, 
@@ -495,17 +524,16 @@ async def get_channel_videos(
             else:
                 # For non-authorized users, standard token refresh
                 try:
-                    access_token = refresh_google_token(current_user)
-                except ValueError as e:
+                    access_token = await google_token_refresher.refresh(current_user.id)
+                except AuthenticationError as e:
                     raise HTTPException(status_code=401, detail=str(e))
+                if not access_token:
+                    raise HTTPException(status_code=401, detail="Token refresh failed. Please re-authenticate.")
+            auth.access_token = access_token
         else:
             logger.info(f"Using existing valid token for user {current_user.email}")
         
-        from .models import YouTubeChannel
-        selected_channel = db.query(YouTubeChannel).filter(
-            YouTubeChannel.user_id == current_user.id,
-            YouTubeChannel.is_selected == True
-        ).first()
+        selected_channel = auth.selected_channel
         
         if selected_channel:
             logger.debug(f"Using selected channel {selected_channel.channel_id} for user {current_user.id}")
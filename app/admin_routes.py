@@ -1,9 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
 from sqlalchemy.orm import Session
 import sqlite3
 import os
 from .database import get_db
 from .config import settings
+from .youtube_quota_manager import youtube_quota_manager
+from .rotation_queue import deferred_rotation_queue
+from .job_manager import job_manager, JobStatus
+from .auth_dependencies import get_current_admin_user
+from .models import User
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -101,3 +107,43 @@ async def fix_sqlite_schema():
             "message": str(e),
             "error_type": type(e).__name__
         }
+
+
+@router.get("/quota/tenants")
+async def get_quota_tenant_report(admin_user: User = Depends(get_current_admin_user)):
+    """
+    Per-tenant YouTube quota report
+    Shows today's consumption against each tenant's weighted fair-share entitlement
+    """
+    return youtube_quota_manager.scheduler.get_tenant_report()
+
+
+@router.get("/rotations/deferred")
+async def get_deferred_rotations(admin_user: User = Depends(get_current_admin_user)):
+    """
+    Deferred title rotations
+    Shows rotations parked for quota and when the queue resumes releasing them
+    """
+    return deferred_rotation_queue.get_status()
+
+
+@router.get("/jobs")
+async def list_jobs(user_id: Optional[str] = None, task_name: Optional[str] = None,
+                    status: Optional[str] = None, cursor: Optional[str] = None, limit: int = 50,
+                    admin_user: User = Depends(get_current_admin_user)):
+    """
+    Job history from the secondary indexes, newest first
+    Filter by user, task and/or status; pass next_cursor back to get the next page
+    """
+    try:
+        job_status = JobStatus(status) if status else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown job status: {status}")
+    
+    return job_manager.query_jobs(
+        user_id=user_id,
+        task_name=task_name,
+        status=job_status,
+        cursor=cursor,
+        limit=limit
+    )
@@ -0,0 +1,86 @@
+"""
+OAuth Authorization Code Replay Protection
+Shared, expiring record of authorization codes already being exchanged
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class AuthCodeStore:
+    """Claims each OAuth authorization code once across all workers
+
+    A claim is a Redis `SET NX EX` on a hash of the code, so it is shared by
+    every process and disappears after `ttl` seconds; Google rejects codes
+    older than that anyway. While Redis is unreachable, claims fall back to a
+    bounded in-process LRU with the same expiry, so memory stays flat.
+    """
+
+    def __init__(self, ttl: int = 600, max_local_entries: int = 10000):
+        self.redis_client: Optional[redis.Redis] = None
+        self.key_prefix = "ttpr:oauth_code"
+        self.ttl = ttl
+        self.max_local_entries = max_local_entries
+
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[str, float]" = OrderedDict()
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        if self.redis_client is None and settings.redis_url:
+            self.redis_client = redis.from_url(
+                settings.redis_url,
+                socket_timeout=2,
+                socket_connect_timeout=2,
+                retry_on_timeout=True
+            )
+        return self.redis_client
+
+    def _key(self, code: str) -> str:
+        return f"{self.key_prefix}:{hashlib.sha256(code.encode()).hexdigest()}"
+
+    def claim(self, code: str) -> bool:
+        """Claim a code for exchange; False if it was already claimed"""
+        key = self._key(code)
+        try:
+            client = self._get_redis()
+            if client is not None:
+                return bool(client.set(key, 1, nx=True, ex=self.ttl))
+        except Exception as e:
+            logger.warning(f"⚠️ OAuth code store unavailable, using in-process fallback: {e}")
+
+        now = time.time()
+        with self._lock:
+            expires_at = self._local.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+
+            self._local[key] = now + self.ttl
+            self._local.move_to_end(key)
+            while self._local and (len(self._local) > self.max_local_entries or next(iter(self._local.values())) <= now):
+                self._local.popitem(last=False)
+            return True
+
+    def release(self, code: str):
+        """Give up a claim so the same code can be retried after a failed exchange"""
+        key = self._key(code)
+        with self._lock:
+            self._local.pop(key, None)
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.delete(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to release OAuth code claim: {e}")
+
+# Global authorization code store
+auth_code_store = AuthCodeStore()
@@ -0,0 +1,81 @@
+"""
+Request-Scoped Auth Context
+Everything a handler needs about the signed-in user, worked out at most once
+per request and only when first asked for
+"""
+
+import logging
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .models import User, YouTubeChannel
+
+logger = logging.getLogger(__name__)
+
+# Allowed paid features without a subscription until further users are approved
+AUTHORIZED_EMAILS = frozenset([
+    "liftedkulture@gmail.com",
+    "liftedkulture-6202@pages.plusgoogle.com",
+    "Shemeka.womenofexcellence@gmail.com"
+])
+
+PAID_SUBSCRIPTION_STATUSES = frozenset(["active", "trialing"])
+
+_UNSET = object()
+
+class AuthContext:
+    """The authenticated user plus lazily computed, per-request facts about them
+
+    Built once per request by `get_auth_context` and kept on
+    `request.state.auth_context`, so every dependency and handler in the
+    request shares it. The entitlement check, access token decryption and
+    selected channel lookup each run on first access only.
+    """
+
+    def __init__(self, user: User, db: Session):
+        self.user = user
+        self.db = db
+        self._is_entitled = _UNSET
+        self._access_token = _UNSET
+        self._selected_channel = _UNSET
+
+    @property
+    def is_entitled(self) -> bool:
+        """Whether the user may use paid features"""
+        if self._is_entitled is _UNSET:
+            self._is_entitled = (
+                self.user.email in AUTHORIZED_EMAILS or
+                self.user.subscription_status in PAID_SUBSCRIPTION_STATUSES
+            )
+        return self._is_entitled
+
+    @property
+    def access_token(self) -> Optional[str]:
+        """The user's decrypted Google access token, or None if they have none
+
+        Expiry is not checked here; callers check `user.is_token_expired()` and
+        set the refreshed token back on the context.
+        """
+        if self._access_token is _UNSET:
+            self._access_token = self.user.get_google_access_token()
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, token: Optional[str]):
+        # Set after a refresh so later readers in this request use the new token
+        self._access_token = token
+
+    @property
+    def selected_channel(self) -> Optional[YouTubeChannel]:
+        """The user's selected YouTube channel, if any"""
+        if self._selected_channel is _UNSET:
+            self._selected_channel = self.db.query(YouTubeChannel).filter(
+                YouTubeChannel.user_id == self.user.id,
+                YouTubeChannel.is_selected == True
+            ).first()
+        return self._selected_channel
+
+    @selected_channel.setter
+    def selected_channel(self, channel: Optional[YouTubeChannel]):
+        self._selected_channel = channel
@@ -1,4 +1,4 @@
-from fastapi import Depends, HTTPException, status, Request
+from fastapi import Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from typing import Dict, Any, Optional
@@ -12,14 +12,18 @@ from .auth_manager import (
     retry_on_auth_failure
 )
 from .models import User
+from .auth_context import AuthContext
+from .user_resolver import user_resolver
+from .session_store import session_store, session_cookie_options
+from .google_token_refresh import google_token_refresher, TOKEN_COLUMNS
+from .signed_sessions import signed_session_manager
 from .config import settings
 import logging
-import hashlib
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 @retry_on_auth_failure(max_retries=2)
 async def get_current_firebase_user(
@@ -112,28 +116,8 @@ async def get_current_firebase_user(
         )
 
 def _find_user_by_uid_and_email(db: Session, firebase_uid: str, email: str) -> Optional[User]:
-    """Find user by Firebase UID or email with multiple format fallbacks"""
-    # Try multiple UID formats for backwards compatibility
-    uid_formats = [
-        firebase_uid,
-        f"google_{firebase_uid}",
-        f"google:{firebase_uid}"
-    ]
-    
-    for uid_format in uid_formats:
-        user = db.query(User).filter(User.firebase_uid == uid_format).first()
-        if user:
-            # Update UID to canonical format if needed
-            if user.firebase_uid != firebase_uid:
-                user.firebase_uid = firebase_uid
-                db.commit()
-            return user
-    
-    # Fallback: find by email
-    if email:
-        return db.query(User).filter(User.email == email).first()
-    
-    return None
+    """Find user by Firebase UID or email, served from the user resolver cache when warm"""
+    return user_resolver.resolve(db, firebase_uid, email)
 
 def _create_development_user(db: Session, decoded_token: Dict[str, Any]) -> User:
     """Create development user for testing"""
@@ -157,19 +141,13 @@ async def _ensure_user_tokens_valid(user: User, db: Session):
     """Ensure user's Google tokens are valid and refresh if needed"""
     try:
         if user.needs_token_refresh():
-            refresh_token = user.get_google_refresh_token()
-            if refresh_token:
-                logger.info(f"🔄 Refreshing tokens for user {user.id}")
-                try:
-                    new_tokens = auth_manager.refresh_google_token(refresh_token)
-                    user.set_google_tokens(
-                        access_token=new_tokens.get("access_token"),
-                        refresh_token=new_tokens.get("refresh_token", refresh_token)
-                    )
-                    db.commit()
-                    logger.info(f"✅ Tokens refreshed for user {user.id}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Token refresh failed for user {user.id}: {e}")
+            try:
+                # Concurrent requests for this user share one refresh
+                await google_token_refresher.refresh(user.id)
+                # The refresher stored the new token; reload it on next access
+                db.expire(user, TOKEN_COLUMNS)
+            except Exception as e:
+                logger.warning(f"⚠️ Token refresh failed for user {user.id}: {e}")
     except Exception as e:
         logger.warning(f"⚠️ Token validation check failed for user {user.id}: {e}")
 
@@ -216,35 +194,66 @@ def _try_emergency_fallback(token: str, db: Session) -> Optional[User]:
     return None
 
 
-async def get_current_paid_user(
-    current_user: User = Depends(get_current_firebase_user)
-) -> User:
+async def get_auth_context(
+    request: Request,
+    current_user: User = Depends(get_current_firebase_user),
+    db: Session = Depends(get_db)
+) -> AuthContext:
+    """Get the request's auth context, creating it on first use"""
+    auth_context = getattr(request.state, "auth_context", None)
+    if auth_context is None or auth_context.user is not current_user:
+        auth_context = AuthContext(current_user, db)
+        request.state.auth_context = auth_context
+    return auth_context
+
+
+async def get_paid_auth_context(
+    auth_context: AuthContext = Depends(get_auth_context)
+) -> AuthContext:
     """
     Require user to have active subscription
-    Only liftedkulture@gmail.com has access until further approved users are added
+    Approved emails have access without one until further users are added
     """
-    # Allow access for approved emails
-    authorized_emails = [
-        "liftedkulture@gmail.com", 
-        "liftedkulture-6202@pages.plusgoogle.com",
-        "Shemeka.womenofexcellence@gmail.com"
-    ]
-    if current_user.email in authorized_emails:
-        return current_user
-    
-    # Check subscription status for other users
-    if current_user.subscription_status not in ["active", "trialing"]:
-        logger.warning(f"User {current_user.email} attempted access without subscription")
+    if not auth_context.is_entitled:
+        logger.warning(f"User {auth_context.user.email} attempted access without subscription")
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail="Active subscription required. Please upgrade to access this feature."
         )
     
+    return auth_context
+
+
+async def get_current_paid_user(
+    auth_context: AuthContext = Depends(get_paid_auth_context)
+) -> User:
+    """Require user to have active subscription"""
+    return auth_context.user
+
+
+def is_admin_user(user: User) -> bool:
+    """Whether the user is listed in ADMIN_EMAILS"""
+    admin_emails = {email.strip().lower() for email in settings.admin_emails.split(",") if email.strip()}
+    return (user.email or "").lower() in admin_emails
+
+
+async def get_current_admin_user(
+    current_user: User = Depends(get_current_firebase_user)
+) -> User:
+    """Require the user to be listed in ADMIN_EMAILS"""
+    if not is_admin_user(current_user):
+        logger.warning(f"User {current_user.email} attempted admin access")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required."
+        )
+    
     return current_user
 
 
 async def get_current_user_session(
     request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ) -> User:
     """
@@ -263,15 +272,14 @@ async def get_current_user_session(
                 headers={"WWW-Authenticate": "Session"}
             )
         
-        # Hash the session token for database lookup
-        session_hash = hashlib.sha256(session_token.encode()).hexdigest()
-        
-        # Find user with this session token
-        user = db.query(User).filter(
-            User.session_token == session_hash,
-            User.session_expires > datetime.utcnow(),
-            User.is_active == True
-        ).first()
+        if signed_session_manager.is_signed_token(session_token):
+            user = _signed_session_user(request, response, session_token, db)
+        else:
+            # Session and user are both served from cache in the common case
+            session = session_store.resolve(db, session_token)
+            user = user_resolver.resolve(db, session["firebase_uid"], None) if session else None
+            if user is not None and (user.id != session["user_id"] or not user.is_active):
+                user = None
         
         if not user:
             logger.debug("Invalid or expired session token")
@@ -292,3 +300,42 @@ async def get_current_user_session(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Authentication system error. Please try again."
         )
+
+
+def _signed_session_user(request: Request, response: Response, session_token: str, db: Session) -> Optional[User]:
+    """Authenticate a signed session token, from its claims alone unless it is due a reissue"""
+    claims = signed_session_manager.verify(session_token)
+    if not claims:
+        return None
+    
+    if not signed_session_manager.needs_reissue(claims):
+        return signed_session_manager.user_from_claims(db, claims)
+    
+    # Past half-life or stale claims: reissue from the user row
+    claims_version = signed_session_manager.claims_version(claims["sub"])
+    user = db.query(User).filter(User.id == claims["sub"]).first()
+    if user is None or not user.is_active:
+        return None
+    
+    response.set_cookie(
+        key="session_token",
+        value=signed_session_manager.issue(user, session_started_at=claims["sat"], claims_version=claims_version),
+        **session_cookie_options(request)
+    )
+    return user
+
+
+async def get_current_user_bearer_or_session(
+    request: Request,
+    response: Response,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Authenticate with the Firebase bearer token, or with the session cookie
+    when there is none. Browser EventSource connections cannot set an
+    Authorization header, so they rely on the cookie.
+    """
+    if token:
+        return await get_current_firebase_user(token, db)
+    return await get_current_user_session(request, response, db)
@@ -14,11 +14,11 @@ from contextlib import asynccontextmanager
 import firebase_admin
 from firebase_admin import credentials, auth
 import jwt
-import requests
-from jwt import PyJWKClient
 
 from .config import settings
 from .firebase_auth import initialize_firebase
+from .id_token_cache import verified_token_cache
+from .firebase_token_verifier import firebase_token_verifier
 
 logger = logging.getLogger(__name__)
 
@@ -45,9 +45,6 @@ class FirebaseAuthManager:
         self.firebase_initialized = False
         self.initialization_attempts = 0
         self.max_init_attempts = 3
-        self.jwks_client = None
-        self.last_jwks_refresh = 0
-        self.jwks_cache_duration = 3600  # 1 hour
         
     def safe_initialize(self) -> bool:
         """Safely initialize Firebase with retry logic"""
@@ -72,74 +69,59 @@ class FirebaseAuthManager:
                     
         return False
     
-    def get_jwks_client(self) -> PyJWKClient:
-        """Get JWKS client with caching and refresh logic"""
-        current_time = time.time()
-        
-        if (not self.jwks_client or 
-            current_time - self.last_jwks_refresh > self.jwks_cache_duration):
-            
-            try:
-                self.jwks_client = PyJWKClient(
-                    "https://www.googleapis.com/oauth2/v3/certs",
-                    cache_keys=True,
-                    max_cached_keys=10
-                )
-                self.last_jwks_refresh = current_time
-                logger.debug("🔄 JWKS client refreshed")
-                
-            except Exception as e:
-                logger.warning(f"⚠️ JWKS client refresh failed: {e}")
-                if not self.jwks_client:
-                    raise AuthServiceUnavailableError("Cannot initialize JWKS client")
-        
-        return self.jwks_client
-    
     def verify_id_token_comprehensive(self, id_token: str) -> Dict[str, Any]:
         """Verify ID token with multiple fallback methods"""
         if not id_token or not id_token.strip():
             raise TokenInvalidError("ID token is required and cannot be empty")
         
-        # Try Firebase Admin SDK first (most reliable)
+        user_info = verified_token_cache.get(id_token)
+        if user_info is None:
+            user_info = self._verify_id_token_uncached(id_token)
+            verified_token_cache.put(id_token, user_info)
+        
+        # Revocation is rechecked per user on a cadence, not per request
+        reason = verified_token_cache.revocation_reason(user_info["uid"], user_info.get("iat"))
+        if reason:
+            verified_token_cache.discard(id_token)
+            raise TokenInvalidError(f"Token has been {reason}")
+        
+        return user_info
+    
+    def _verify_id_token_uncached(self, id_token: str) -> Dict[str, Any]:
+        """Verify token signature and claims; revocation is checked by the caller"""
+        # Verify locally against cached Firebase certificates (no network call)
+        local_result = self._verify_token_manually(id_token)
+        if local_result is not None:
+            return local_result
+        
+        # Certificates unavailable; fall back to the Firebase Admin SDK
         try:
             if self.safe_initialize():
-                decoded_token = auth.verify_id_token(id_token, check_revoked=True)
+                decoded_token = auth.verify_id_token(id_token)
                 logger.debug("✅ Token verified via Firebase Admin SDK")
                 return self._normalize_token_data(decoded_token)
                 
         except auth.ExpiredIdTokenError:
             raise TokenExpiredError("Token has expired")
-        except auth.RevokedIdTokenError:
-            raise TokenInvalidError("Token has been revoked")
         except auth.InvalidIdTokenError as e:
             logger.warning(f"⚠️ Firebase Admin SDK verification failed: {e}")
+            raise TokenInvalidError(f"Token verification failed: {str(e)}")
         except Exception as e:
             logger.warning(f"⚠️ Firebase Admin SDK unavailable: {e}")
         
-        # Fallback to manual JWT verification
-        try:
-            return self._verify_token_manually(id_token)
-        except Exception as e:
-            logger.error(f"❌ Manual token verification failed: {e}")
-            raise TokenInvalidError(f"Token verification failed: {str(e)}")
+        raise AuthServiceUnavailableError("No token verifier available")
     
-    def _verify_token_manually(self, id_token: str) -> Dict[str, Any]:
-        """Manually verify JWT token using Google's public keys"""
+    def _verify_token_manually(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """Verify a Firebase ID token in process using the securetoken certificates
+        
+        Returns None when the certificates cannot be loaded.
+        """
         try:
-            jwks_client = self.get_jwks_client()
-            signing_key = jwks_client.get_signing_key_from_jwt(id_token)
-            
-            decoded_token = jwt.decode(
-                id_token,
-                signing_key.key,
-                algorithms=["RS256"],
-                audience=settings.google_client_id,
-                issuer=["https://accounts.google.com", "accounts.google.com"],
-                options={"verify_exp": True, "verify_iat": True},
-                leeway=60  # 1 minute leeway for clock skew
-            )
+            decoded_token = firebase_token_verifier.verify(id_token)
+            if decoded_token is None:
+                return None
             
-            logger.debug("✅ Token verified manually via JWKS")
+            logger.debug("✅ Token verified locally via securetoken certificates")
             return self._normalize_token_data(decoded_token)
             
         except jwt.ExpiredSignatureError:
@@ -193,41 +175,6 @@ class FirebaseAuthManager:
             logger.error(f"❌ Custom token creation failed for {uid}: {e}")
             raise AuthServiceUnavailableError(f"Failed to create custom token: {str(e)}")
     
-    def refresh_google_token(self, refresh_token: str) -> Dict[str, Any]:
-        """Refresh Google OAuth token with error handling"""
-        if not refresh_token:
-            raise TokenInvalidError("Refresh token is required")
-        
-        try:
-            token_url = "https://oauth2.googleapis.com/token"
-            data = {
-                "client_id": settings.google_client_id,
-                "client_secret": settings.google_client_secret,
-                "refresh_token": refresh_token,
-                "grant_type": "refresh_token"
-            }
-            
-            response = requests.post(token_url, data=data, timeout=10)
-            
-            if response.status_code == 200:
-                token_data = response.json()
-                logger.info("✅ Google token refreshed successfully")
-                return token_data
-            elif response.status_code == 400:
-                error_data = response.json()
-                if error_data.get("error") == "invalid_grant":
-                    raise TokenInvalidError("Refresh token is invalid or expired")
-                raise TokenInvalidError(f"Token refresh failed: {error_data.get('error_description', 'Unknown error')}")
-            else:
-                raise AuthServiceUnavailableError(f"Token refresh failed with status {response.status_code}")
-                
-        except requests.RequestException as e:
-            logger.error(f"❌ Token refresh network error: {e}")
-            raise AuthServiceUnavailableError("Cannot connect to Google OAuth service")
-        except Exception as e:
-            logger.error(f"❌ Token refresh failed: {e}")
-            raise AuthServiceUnavailableError(f"Token refresh failed: {str(e)}")
-    
     def revoke_user_tokens_safe(self, uid: str) -> bool:
         """Safely revoke all user tokens"""
         if not uid:
@@ -236,6 +183,7 @@ class FirebaseAuthManager:
         try:
             if self.safe_initialize():
                 auth.revoke_refresh_tokens(uid)
+                verified_token_cache.mark_revoked(uid)
                 logger.info(f"✅ Revoked tokens for user {uid}")
                 return True
         except Exception as e:
@@ -262,8 +210,8 @@ class FirebaseAuthManager:
         return {
             "firebase_initialized": self.firebase_initialized,
             "initialization_attempts": self.initialization_attempts,
-            "jwks_cached": self.jwks_client is not None,
-            "last_jwks_refresh": self.last_jwks_refresh,
+            "token_verifier": firebase_token_verifier.get_status(),
+            "token_cache": verified_token_cache.get_stats(),
             "status": "healthy" if self.firebase_initialized else "degraded"
         }
 
@@ -1,11 +1,13 @@
 from celery import Celery
 from .config import settings
+from .task_routing import configure_task_routing
+from . import job_telemetry  # noqa: F401 - stamps published tasks with their send time
 
 celery_app = Celery(
     "titletesterpro",
     broker=settings.redis_url,
     backend=settings.redis_url,
-    include=["app.tasks"]
+    include=["app.tasks", "app.robust_tasks"]
 )
 
 celery_app.conf.update(
@@ -21,6 +23,8 @@ celery_app.conf.update(
     worker_max_tasks_per_child=1000,
 )
 
+configure_task_routing(celery_app)
+
 celery_app.conf.beat_schedule = {
     "rotate-titles": {
         "task": "app.tasks.rotate_titles",
@@ -30,4 +34,12 @@ celery_app.conf.beat_schedule = {
         "task": "app.tasks.cleanup_completed_tests",
         "schedule": 3600.0,  # Run every hour
     },
+    "flush-quota-usage": {
+        "task": "app.tasks.flush_quota_usage",
+        "schedule": float(settings.quota_flush_interval_seconds),  # Write buffered quota counters
+    },
+    "refresh-expiring-tokens": {
+        "task": "app.tasks.refresh_expiring_tokens",
+        "schedule": float(settings.token_refresh_interval_seconds),  # Refresh Google tokens before they expire
+    },
 }
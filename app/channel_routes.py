@@ -4,10 +4,11 @@ from typing import List, Dict, Any
 from .database import get_db
 from .models import User
 from .models import YouTubeChannel
-from .auth_dependencies import get_current_firebase_user, get_current_paid_user
+from .auth_dependencies import get_current_firebase_user, get_current_paid_user, get_paid_auth_context
+from .auth_context import AuthContext
 from .youtube_api import get_youtube_client, YouTubeAPIClient
 from .tasks import update_quota_usage
-from .oauth_refresh import refresh_google_access_token
+from .google_token_refresh import google_token_refresher
 from .config import settings
 import logging
 
@@ -51,17 +52,18 @@ async def get_user_channels(
 
 @router.post("/sync")
 async def sync_user_channels(
-    current_user: User = Depends(get_current_paid_user),
+    auth: AuthContext = Depends(get_paid_auth_context),
     db: Session = Depends(get_db),
     youtube_client: YouTubeAPIClient = Depends(get_youtube_client)
 ):
     """Sync user's YouTube channels from Google account"""
     try:
+        current_user = auth.user
         logger.info(f"Starting channel sync for user {current_user.id}")
         
         # TEMPORARY: For testing purposes, return mock data if no valid OAuth tokens
         # This allows endpoint testing without full OAuth flow completion
-        access_token = current_user.get_google_access_token()
+        access_token = auth.access_token
         has_valid_token = access_token and not current_user.is_token_expired()
         
         if not has_valid_token:
@@ -83,9 +85,13 @@ async def sync_user_channels(
                 logger.info(f"Attempting token refresh for user {current_user.id}")
                 refresh_token = current_user.get_google_refresh_token()
                 if refresh_token:
-                    new_access_token = await refresh_google_access_token(current_user, db)
+                    try:
+                        new_access_token = await google_token_refresher.refresh(current_user.id)
+                    except Exception as e:
+                        logger.error(f"Token refresh failed for user {current_user.id}: {e}")
+                        new_access_token = None
                     if new_access_token:
-                        access_token = new_access_token
+                        access_token = auth.access_token = new_access_token
                         logger.info(f"Successfully refreshed access token for user {current_user.id}")
                     else:
                         raise HTTPException(
@@ -222,15 +228,11 @@ async def select_channel(
 
 @router.get("/selected")
 async def get_selected_channel(
-    current_user: User = Depends(get_current_paid_user),
-    db: Session = Depends(get_db)
+    auth: AuthContext = Depends(get_paid_auth_context)
 ):
     """Get the currently selected YouTube channel"""
     try:
-        selected_channel = db.query(YouTubeChannel).filter(
-            YouTubeChannel.user_id == current_user.id,
-            YouTubeChannel.is_selected == True
-        ).first()
+        selected_channel = auth.selected_channel
         
         if not selected_channel:
             return None
@@ -44,6 +44,48 @@ class Settings(BaseSettings):
     stripe_webhook_secret: Optional[str] = None
     environment: str = "production"
     
+    # Comma-separated emails allowed to use the /admin endpoints; empty means nobody
+    admin_emails: str = os.getenv("ADMIN_EMAILS", "")
+    
+    # Number of workers sharing the remaining YouTube quota while Redis is down
+    quota_fallback_workers: int = int(os.getenv("QUOTA_FALLBACK_WORKERS", "4"))
+    
+    # Seconds between flushes of buffered quota counters into quota_usage
+    quota_flush_interval_seconds: int = int(os.getenv("QUOTA_FLUSH_INTERVAL_SECONDS", "60"))
+    
+    # Longest a claimed idempotency key blocks resubmission of an unfinished job
+    job_dedup_window_seconds: int = int(os.getenv("JOB_DEDUP_WINDOW_SECONDS", "300"))
+    
+    # Verified Firebase ID tokens kept in process until they expire
+    id_token_cache_size: int = int(os.getenv("ID_TOKEN_CACHE_SIZE", "10000"))
+    
+    # Seconds between revocation rechecks of a user's cached tokens
+    token_revocation_check_seconds: int = int(os.getenv("TOKEN_REVOCATION_CHECK_SECONDS", "300"))
+    
+    # Comma-separated former SECRET_KEY values still accepted when decrypting stored tokens
+    previous_secret_keys: str = os.getenv("PREVIOUS_SECRET_KEYS", "")
+    
+    # "table" (sessions table) or "signed" (stateless signed tokens) for new sessions
+    session_mode: str = os.getenv("SESSION_MODE", "table")
+    
+    # Lifetime of a signed session token before it must be reissued
+    signed_session_ttl_seconds: int = int(os.getenv("SIGNED_SESSION_TTL_SECONDS", "3600"))
+    
+    # Google tokens expiring within this many seconds are refreshed ahead of use
+    token_refresh_window_seconds: int = int(os.getenv("TOKEN_REFRESH_WINDOW_SECONDS", "900"))
+    
+    # Seconds between proactive token refresh runs; keep well under the window
+    token_refresh_interval_seconds: int = int(os.getenv("TOKEN_REFRESH_INTERVAL_SECONDS", "300"))
+    
+    # Users picked per proactive refresh run
+    token_refresh_batch_size: int = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", "500"))
+    
+    # Google token requests in flight at once per proactive run
+    token_refresh_concurrency: int = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "10"))
+    
+    # Google token requests per second across all workers
+    token_refresh_rate_per_second: int = int(os.getenv("TOKEN_REFRESH_RATE_PER_SECOND", "10"))
+    
     log_level: str = "INFO"
     
     @property
@@ -0,0 +1,153 @@
+"""
+Local Firebase ID Token Verification
+Verifies ID tokens in process against Firebase's securetoken certificates,
+cached for their Cache-Control max-age and refreshed in the background
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Dict, Any, Optional
+
+import jwt
+import requests
+from cryptography import x509
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+SECURETOKEN_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+class FirebaseTokenVerifier:
+    """Verifies Firebase ID tokens without calling Firebase per request
+
+    Certificates are refreshed in a background thread once 80% of their
+    max-age has passed, so requests keep using the cached keys while the
+    refresh runs. Only a cold start or an unknown key ID (Google rotated its
+    keys) fetches synchronously, the latter at most once per
+    `min_refresh_interval`. Expired certificates are still served for
+    `stale_grace` seconds while Google cannot be reached.
+    """
+
+    def __init__(self, project_id: Optional[str] = None):
+        self.project_id = project_id or settings.firebase_project_id
+        self.issuer = f"https://securetoken.google.com/{self.project_id}"
+        self.leeway = 10  # seconds of clock skew tolerated
+        self.min_refresh_interval = 60
+        self.stale_grace = 3600
+
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._last_fetch_attempt = 0.0
+        self._refreshing = False
+
+    @staticmethod
+    def _max_age(cache_control: str) -> int:
+        match = re.search(r"max-age=(\d+)", cache_control or "")
+        return int(match.group(1)) if match else 3600
+
+    def refresh(self) -> bool:
+        """Fetch the current signing certificates"""
+        self._last_fetch_attempt = time.time()
+        try:
+            response = requests.get(SECURETOKEN_CERTS_URL, timeout=5)
+            response.raise_for_status()
+
+            keys = {
+                kid: x509.load_pem_x509_certificate(pem.encode()).public_key()
+                for kid, pem in response.json().items()
+            }
+            max_age = self._max_age(response.headers.get("Cache-Control"))
+            now = time.time()
+
+            with self._lock:
+                self._keys = keys
+                self._expires_at = now + max_age
+                self._refresh_at = now + max_age * 0.8
+
+            logger.debug(f"🔄 Firebase signing certificates refreshed ({len(keys)} keys, max-age {max_age}s)")
+            return True
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to refresh Firebase signing certificates: {e}")
+            return False
+
+        finally:
+            self._refreshing = False
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name="firebase-cert-refresh", daemon=True).start()
+
+    def _get_key(self, kid: str) -> Optional[Any]:
+        now = time.time()
+
+        if not self._keys or now >= self._expires_at + self.stale_grace:
+            if now - self._last_fetch_attempt >= 1:
+                self.refresh()
+        elif now >= self._refresh_at:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and self._keys and now - self._last_fetch_attempt >= self.min_refresh_interval:
+            # Google rotated its keys before our cached copy expired
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    @property
+    def available(self) -> bool:
+        return bool(self._keys) and time.time() < self._expires_at + self.stale_grace
+
+    def verify(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """Verify an ID token's signature and claims
+
+        Returns the decoded claims, or None when no certificates could be
+        loaded so the caller can fall back to another verifier. Invalid or
+        expired tokens raise the corresponding `jwt` exceptions.
+        """
+        header = jwt.get_unverified_header(id_token)
+        if header.get("alg") != "RS256":
+            raise jwt.InvalidAlgorithmError("ID token must be signed with RS256")
+
+        key = self._get_key(header.get("kid", ""))
+        if key is None:
+            if not self.available:
+                return None
+            raise jwt.InvalidTokenError("ID token signed with an unknown key")
+
+        decoded = jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=self.project_id,
+            issuer=self.issuer,
+            options={"require": ["exp", "iat", "sub"]},
+            leeway=self.leeway
+        )
+
+        if not decoded["sub"] or len(decoded["sub"]) > 128:
+            raise jwt.InvalidTokenError("ID token has an invalid subject")
+        if decoded.get("auth_time", 0) > time.time() + self.leeway:
+            raise jwt.ImmatureSignatureError("ID token auth_time is in the future")
+
+        decoded["uid"] = decoded["sub"]
+        return decoded
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "project_id": self.project_id,
+            "cached_keys": len(self._keys),
+            "certs_expire_in": max(0, int(self._expires_at - time.time())) if self._keys else None,
+            "available": self.available
+        }
+
+# Global Firebase token verifier
+firebase_token_verifier = FirebaseTokenVerifier()
@@ -0,0 +1,345 @@
+"""
+Google Token Refresh
+Async, single-flight refresh of users' Google OAuth access tokens, used by
+request paths, Celery tasks and the proactive refresh job alike
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta
+
+import httpx
+import redis.asyncio as aioredis
+
+from .config import settings
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+
+# Delete the lock only if this worker still holds it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Columns written by a refresh; expire them on objects loaded before it
+TOKEN_COLUMNS = ["google_access_token", "google_refresh_token", "token_expires_at", "updated_at"]
+
+class GoogleTokenRefresher:
+    """Refreshes a user's Google access token once, however many requests need it
+
+    Concurrent callers in a process share one in-flight refresh per user ID.
+    Across workers a Redis lock elects the one that calls Google; the others
+    wait for the lock to clear and read the token it stored. The token
+    endpoint is called through a pooled async HTTP client, and database work
+    runs in the default executor so the event loop never blocks.
+
+    Clients are held per event loop, so sync callers (Celery tasks) can use
+    `refresh_blocking`, which runs on a private loop and closes its clients.
+    """
+
+    def __init__(self):
+        self.lock_prefix = "ttpr:google_refresh:lock"
+        self.rate_key_prefix = "ttpr:google_refresh:rate"
+        self.stats_key = "ttpr:google_refresh:stats"
+        self.lock_ttl = 15  # seconds; longer than one token request
+        self.poll_interval = 0.2
+
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+        self._inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    def _clients(self) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        clients = self._loop_clients.get(loop)
+        if clients is None:
+            clients = self._loop_clients[loop] = {"redis": None, "http": None}
+        return clients
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        clients = self._clients()
+        if clients["redis"] is None and settings.redis_url:
+            clients["redis"] = aioredis.from_url(
+                settings.redis_url,
+                socket_timeout=2,
+                socket_connect_timeout=2,
+                decode_responses=True
+            )
+        return clients["redis"]
+
+    def _get_http(self) -> httpx.AsyncClient:
+        clients = self._clients()
+        if clients["http"] is None:
+            clients["http"] = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+            )
+        return clients["http"]
+
+    async def close(self):
+        """Close the clients opened on the running event loop"""
+        clients = self._loop_clients.pop(asyncio.get_running_loop(), None) or {}
+        if clients.get("http") is not None:
+            await clients["http"].aclose()
+        if clients.get("redis") is not None:
+            await clients["redis"].aclose()
+
+    def run_blocking(self, coro):
+        """Run a refresher coroutine from sync code on a private event loop"""
+        async def run_and_close():
+            try:
+                return await coro
+            finally:
+                await self.close()
+        return asyncio.run(run_and_close())
+
+    def refresh_blocking(self, user_id: str) -> Optional[str]:
+        """`refresh` for sync callers such as Celery tasks"""
+        return self.run_blocking(self.refresh(user_id))
+
+    async def refresh(self, user_id: str, min_valid_seconds: int = 0) -> Optional[str]:
+        """Get a fresh access token for the user, refreshing it if needed
+
+        A token is refreshed when the user needs one (see
+        `User.needs_token_refresh`) or it expires within `min_valid_seconds`.
+        """
+        key = (id(asyncio.get_running_loop()), user_id)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh_once(user_id, min_valid_seconds))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so one caller being cancelled does not cancel the others' refresh
+        return await asyncio.shield(future)
+
+    async def _refresh_once(self, user_id: str, min_valid_seconds: int) -> Optional[str]:
+        lock_key = f"{self.lock_prefix}:{user_id}"
+        lock_token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_ttl * 2
+
+        while True:
+            user_state = await self._run_sync(self._load_user_state, user_id, min_valid_seconds)
+            if user_state is None:
+                return None
+            if not user_state["needs_refresh"]:
+                return user_state["access_token"]
+
+            acquired = await self._acquire(lock_key, lock_token)
+            if acquired:
+                break
+
+            # Another worker is refreshing; wait for it, then read what it stored
+            while time.monotonic() < deadline and await self._is_locked(lock_key):
+                await asyncio.sleep(self.poll_interval)
+            if time.monotonic() >= deadline:
+                logger.warning(f"⚠️ Timed out waiting for token refresh of user {user_id}")
+                return None
+
+        try:
+            # Re-check under the lock: the previous holder may have just finished
+            user_state = await self._run_sync(self._load_user_state, user_id, min_valid_seconds)
+            if user_state is None:
+                return None
+            if not user_state["needs_refresh"]:
+                return user_state["access_token"]
+
+            logger.info(f"🔄 Refreshing Google token for user {user_id}")
+            token_data = await self.request_token(user_state["refresh_token"])
+            await self._run_sync(self._store_tokens, user_id, token_data, user_state["refresh_token"])
+            logger.info(f"✅ Google token refreshed for user {user_id}")
+            return token_data.get("access_token")
+
+        finally:
+            await self._release(lock_key, lock_token)
+
+    async def request_token(self, refresh_token: str) -> Dict[str, Any]:
+        """Exchange a refresh token for a new access token"""
+        from .auth_manager import TokenInvalidError, AuthServiceUnavailableError
+
+        if not refresh_token:
+            raise TokenInvalidError("Refresh token is required")
+
+        try:
+            response = await self._get_http().post(GOOGLE_TOKEN_URL, data={
+                "client_id": settings.google_client_id,
+                "client_secret": settings.google_client_secret,
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token"
+            })
+        except httpx.HTTPError as e:
+            logger.error(f"❌ Token refresh network error: {e}")
+            raise AuthServiceUnavailableError("Cannot connect to Google OAuth service")
+
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 400:
+            error_data = response.json()
+            if error_data.get("error") == "invalid_grant":
+                raise TokenInvalidError("Refresh token is invalid or expired")
+            raise TokenInvalidError(f"Token refresh failed: {error_data.get('error_description', 'Unknown error')}")
+        raise AuthServiceUnavailableError(f"Token refresh failed with status {response.status_code}")
+
+    async def refresh_expiring(self, window_seconds: int, batch_size: int,
+                               concurrency: int, rate_per_second: int) -> Dict[str, Any]:
+        """Refresh every token expiring within the window ahead of its use
+
+        Picks users by `token_expires_at` (indexed) from shortly in the past
+        to `window_seconds` ahead, refreshes up to `concurrency` at a time
+        under a fleet-wide per-second rate limit, and records the outcomes.
+        """
+        started = time.time()
+        user_ids = await self._run_sync(self._find_expiring, window_seconds, batch_size)
+        outcomes = {"refreshed": 0, "already_fresh": 0, "invalid_grant": 0, "failed": 0}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def refresh_one(user_id: str):
+            async with semaphore:
+                await self._wait_for_rate_slot(rate_per_second)
+                try:
+                    state = await self._run_sync(self._load_user_state, user_id, window_seconds)
+                    if state is None or not state["needs_refresh"]:
+                        outcomes["already_fresh"] += 1
+                    elif await self.refresh(user_id, min_valid_seconds=window_seconds):
+                        outcomes["refreshed"] += 1
+                    else:
+                        outcomes["failed"] += 1
+                except Exception as e:
+                    from .auth_manager import TokenInvalidError
+                    outcomes["invalid_grant" if isinstance(e, TokenInvalidError) else "failed"] += 1
+                    logger.warning(f"⚠️ Proactive token refresh failed for user {user_id}: {e}")
+
+        await asyncio.gather(*[refresh_one(user_id) for user_id in user_ids])
+
+        result = {"candidates": len(user_ids), **outcomes, "duration_seconds": round(time.time() - started, 3)}
+        await self._record_outcomes(result)
+        return result
+
+    @staticmethod
+    def _find_expiring(window_seconds: int, batch_size: int) -> List[str]:
+        from .database_manager import db_manager
+        now = datetime.utcnow()
+        with db_manager.get_db_session() as db:
+            rows = db.query(User.id).filter(
+                User.token_expires_at > now - timedelta(hours=1),  # dormant or revoked grants age out
+                User.token_expires_at <= now + timedelta(seconds=window_seconds),
+                User.google_refresh_token.isnot(None),
+                User.is_active == True
+            ).order_by(User.token_expires_at).limit(batch_size).all()
+            return [row.id for row in rows]
+
+    async def _wait_for_rate_slot(self, rate_per_second: int):
+        """Fixed one-second windows shared by every worker through Redis"""
+        while True:
+            try:
+                client = self._get_redis()
+                if client is None:
+                    return
+                window = int(time.time())
+                key = f"{self.rate_key_prefix}:{window}"
+                pipe = client.pipeline(transaction=False)
+                pipe.incr(key)
+                pipe.expire(key, 2)
+                count, _ = await pipe.execute()
+                if count <= rate_per_second:
+                    return
+                await asyncio.sleep(window + 1 - time.time())
+            except Exception as e:
+                logger.warning(f"⚠️ Token refresh rate limiter unavailable: {e}")
+                return
+
+    async def _record_outcomes(self, result: Dict[str, Any]):
+        try:
+            client = self._get_redis()
+            if client is None:
+                return
+            pipe = client.pipeline(transaction=False)
+            for outcome in ("refreshed", "already_fresh", "invalid_grant", "failed"):
+                pipe.hincrby(self.stats_key, outcome, result[outcome])
+            pipe.hset(self.stats_key, mapping={
+                "last_run_at": datetime.utcnow().isoformat(),
+                "last_candidates": result["candidates"],
+                "last_duration_seconds": result["duration_seconds"]
+            })
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to record token refresh outcomes: {e}")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Lifetime outcome counters and the last proactive run"""
+        try:
+            client = self._get_redis()
+            return await client.hgetall(self.stats_key) if client is not None else {}
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to read token refresh stats: {e}")
+            return {}
+
+    @staticmethod
+    async def _run_sync(func, *args):
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    @staticmethod
+    def _load_user_state(user_id: str, min_valid_seconds: int = 0) -> Optional[Dict[str, Any]]:
+        from .database_manager import db_manager
+        with db_manager.get_db_session() as db:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is None:
+                return None
+            needs_refresh = user.needs_token_refresh() or (
+                user.google_refresh_token is not None and
+                user.token_expires_at is not None and
+                user.token_expires_at <= datetime.utcnow() + timedelta(seconds=min_valid_seconds)
+            )
+            return {
+                "needs_refresh": needs_refresh,
+                "refresh_token": user.get_google_refresh_token() if needs_refresh else None,
+                "access_token": None if needs_refresh else user.get_google_access_token()
+            }
+
+    @staticmethod
+    def _store_tokens(user_id: str, token_data: Dict[str, Any], refresh_token: str):
+        from .database_manager import db_manager
+        with db_manager.get_db_session() as db:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is not None:
+                user.set_google_tokens(
+                    access_token=token_data.get("access_token"),
+                    refresh_token=token_data.get("refresh_token", refresh_token),
+                    expires_in=int(token_data.get("expires_in", 3600))
+                )
+
+    async def _acquire(self, lock_key: str, lock_token: str) -> bool:
+        try:
+            client = self._get_redis()
+            if client is None:
+                return True
+            return bool(await client.set(lock_key, lock_token, nx=True, ex=self.lock_ttl))
+        except Exception as e:
+            # Without Redis, single flight still holds within this process
+            logger.warning(f"⚠️ Token refresh lock unavailable: {e}")
+            return True
+
+    async def _is_locked(self, lock_key: str) -> bool:
+        try:
+            client = self._get_redis()
+            return client is not None and bool(await client.exists(lock_key))
+        except Exception:
+            return False
+
+    async def _release(self, lock_key: str, lock_token: str):
+        try:
+            client = self._get_redis()
+            if client is not None:
+                await client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, lock_token)
+        except Exception as e:
+            logger.debug(f"Token refresh lock release failed: {e}")
+
+# Global Google token refresher
+google_token_refresher = GoogleTokenRefresher()
@@ -0,0 +1,181 @@
+"""
+Verified ID Token Cache
+Keeps verified Firebase ID tokens in process until they expire and rechecks
+revocation per user on a fixed cadence shared across workers through Redis
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+import redis
+from firebase_admin import auth
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified ID tokens keyed by the token's SHA-256
+
+    A repeat request with the same token is a dict lookup. Revocation is not
+    checked per token but per user: the user's `tokens_valid_after` time and
+    disabled flag are fetched from Firebase at most once per
+    `check_interval` across all workers (the result is shared in Redis) and
+    every token issued before that time is rejected.
+    """
+
+    def __init__(self):
+        self.redis_client: Optional[redis.Redis] = None
+        self.key_prefix = "ttpr:auth:revocation"
+        self.max_size = settings.id_token_cache_size
+        self.check_interval = settings.token_revocation_check_seconds
+
+        self._lock = threading.Lock()
+        self._tokens: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # uid -> (checked_at, tokens_valid_after_seconds, disabled)
+        self._revocation: "OrderedDict[str, Tuple[float, float, bool]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        if self.redis_client is None and settings.redis_url:
+            self.redis_client = redis.from_url(
+                settings.redis_url,
+                socket_timeout=2,
+                socket_connect_timeout=2,
+                retry_on_timeout=True
+            )
+        return self.redis_client
+
+    @staticmethod
+    def _token_key(id_token: str) -> str:
+        return hashlib.sha256(id_token.encode()).hexdigest()
+
+    def get(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """Get the verified claims of a token that has not expired yet"""
+        key = self._token_key(id_token)
+
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            user_info, expires_at = entry
+            if expires_at <= time.time():
+                del self._tokens[key]
+                self.misses += 1
+                return None
+
+            self._tokens.move_to_end(key)
+            self.hits += 1
+            return dict(user_info)
+
+    def put(self, id_token: str, user_info: Dict[str, Any]):
+        """Cache verified claims until the token's `exp`"""
+        expires_at = float(user_info.get("exp") or 0)
+        if expires_at <= time.time():
+            return
+
+        key = self._token_key(id_token)
+        with self._lock:
+            self._tokens[key] = (dict(user_info), expires_at)
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def discard(self, id_token: str):
+        with self._lock:
+            self._tokens.pop(self._token_key(id_token), None)
+
+    def _load_revocation_state(self, uid: str) -> Tuple[float, bool]:
+        """Read the user's revocation state from Redis, or from Firebase on a miss"""
+        key = f"{self.key_prefix}:{uid}"
+
+        try:
+            client = self._get_redis()
+            raw = client.get(key) if client is not None else None
+            if raw is not None:
+                valid_after, _, disabled = (raw.decode() if isinstance(raw, bytes) else raw).partition(":")
+                return float(valid_after), disabled == "1"
+        except Exception as e:
+            logger.debug(f"Revocation state lookup failed for {uid}: {e}")
+
+        user_record = auth.get_user(uid)
+        valid_after = (user_record.tokens_valid_after_timestamp or 0) / 1000
+        disabled = bool(user_record.disabled)
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.set(key, f"{valid_after}:{int(disabled)}", ex=self.check_interval)
+        except Exception as e:
+            logger.debug(f"Revocation state store failed for {uid}: {e}")
+
+        return valid_after, disabled
+
+    def revocation_reason(self, uid: str, issued_at: Optional[float]) -> Optional[str]:
+        """Return "revoked" or "disabled" if the user's token may no longer be used
+
+        Uses the locally known state while it is fresher than the check
+        interval. If Firebase cannot be reached the last known state is kept.
+        """
+        now = time.time()
+
+        with self._lock:
+            state = self._revocation.get(uid)
+
+        if state is None or now - state[0] >= self.check_interval:
+            try:
+                valid_after, disabled = self._load_revocation_state(uid)
+            except auth.UserNotFoundError:
+                valid_after, disabled = now, True
+            except Exception as e:
+                logger.warning(f"⚠️ Revocation check unavailable for {uid}, using last known state: {e}")
+                valid_after, disabled = (state[1], state[2]) if state else (0.0, False)
+
+            state = (now, valid_after, disabled)
+            with self._lock:
+                self._revocation[uid] = state
+                self._revocation.move_to_end(uid)
+                while len(self._revocation) > self.max_size:
+                    self._revocation.popitem(last=False)
+
+        if state[2]:
+            return "disabled"
+        if issued_at is not None and float(issued_at) < state[1]:
+            return "revoked"
+        return None
+
+    def mark_revoked(self, uid: str):
+        """Reject the user's current tokens now, here and on other workers at their next check"""
+        # Firebase keeps tokens_valid_after at whole seconds, like `iat`
+        valid_after = float(int(time.time()))
+
+        with self._lock:
+            self._revocation[uid] = (time.time(), valid_after, False)
+            self._revocation.move_to_end(uid)
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.set(f"{self.key_prefix}:{uid}", f"{valid_after}:0", ex=self.check_interval)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to share revocation of {uid}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cached_tokens": len(self._tokens),
+                "tracked_users": len(self._revocation),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revocation_check_seconds": self.check_interval
+            }
+
+# Global verified token cache
+verified_token_cache = VerifiedTokenCache()
@@ -0,0 +1,121 @@
+"""
+Live Job Progress Events
+Streams job status and progress to clients as Server-Sent Events
+"""
+
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from .config import settings
+from .job_manager import job_manager, JobStatus
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {JobStatus.SUCCESS.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value}
+
+KEEPALIVE_SECONDS = 15.0
+
+# A stalled job's stream is closed after this long without an event
+IDLE_TIMEOUT_SECONDS = 300.0
+
+# No stream stays open longer than this; clients reconnect with Last-Event-ID
+MAX_STREAM_SECONDS = 3600.0
+
+_redis_client: Optional[aioredis.Redis] = None
+
+def _get_redis() -> aioredis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = aioredis.from_url(settings.redis_url, decode_responses=True)
+    return _redis_client
+
+def _parse_event_id(event_id: str) -> Tuple[int, int]:
+    milliseconds, _, sequence = event_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+def _format_event(event_id: Optional[str], event: Dict[str, str]) -> str:
+    event_name = event.get("status", "status")
+    if event_name == JobStatus.RUNNING.value and "progress" in event:
+        event_name = "progress"
+
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_name}")
+    lines.append(f"data: {json.dumps(event)}")
+    return "\n".join(lines) + "\n\n"
+
+async def stream_job_events(job_id: str, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Yield SSE frames for a job until it reaches a terminal status
+
+    Subscribes before reading the backlog so no event published in between is
+    missed; every notification then reads the stream past the last event sent.
+    The stream ends with a `timeout` event after IDLE_TIMEOUT_SECONDS without
+    news or MAX_STREAM_SECONDS overall.
+    """
+    started = time.monotonic()
+    last_event_at = started
+    client = _get_redis()
+    key = f"{job_manager.events_key}:{job_id}"
+    pubsub = client.pubsub()
+
+    try:
+        await pubsub.subscribe(key)
+
+        last_sent = last_event_id
+        if last_sent:
+            try:
+                _parse_event_id(last_sent)
+            except ValueError:
+                last_sent = None
+
+        if last_sent is None:
+            backlog = await client.xrange(key)
+            if not backlog:
+                # No events recorded (yet); start from the stored job state
+                snapshot = await client.hmget(
+                    f"{job_manager.job_metadata_key}:{job_id}", "status", "progress"
+                )
+                if snapshot[0]:
+                    event = {"status": snapshot[0], "progress": snapshot[1] or "0.0"}
+                    yield _format_event(None, event)
+                    if snapshot[0] in TERMINAL_STATUSES:
+                        return
+        else:
+            backlog = await client.xrange(key, min=f"({last_sent}")
+
+        while True:
+            for event_id, event in backlog:
+                yield _format_event(event_id, event)
+                last_sent = event_id
+                last_event_at = time.monotonic()
+                if event.get("status") in TERMINAL_STATUSES:
+                    return
+
+            now = time.monotonic()
+            if now - last_event_at >= IDLE_TIMEOUT_SECONDS or now - started >= MAX_STREAM_SECONDS:
+                yield f"event: timeout\ndata: {json.dumps({'job_id': job_id})}\n\n"
+                return
+
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=KEEPALIVE_SECONDS)
+            if message is None:
+                yield ": keepalive\n\n"
+                backlog = []
+                continue
+
+            backlog = await client.xrange(key, min=f"({last_sent}" if last_sent else "-")
+
+    except Exception as e:
+        logger.error(f"❌ Job event stream failed for {job_id}: {e}")
+        yield _format_event(None, {"status": "error", "error_message": "event stream unavailable"})
+
+    finally:
+        try:
+            await pubsub.unsubscribe(key)
+            await pubsub.aclose()
+        except Exception:
+            pass
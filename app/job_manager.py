@@ -6,9 +6,12 @@ Handles job persistence, recovery, and monitoring with comprehensive error handl
 import logging
 import time
 import json
+import hashlib
 import traceback
+import uuid
+import functools
 from typing import Dict, List, Any, Optional, Callable
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 from dataclasses import dataclass, asdict
 from contextlib import contextmanager
@@ -17,9 +20,13 @@ import redis
 from celery import Celery
 from celery.exceptions import Retry, WorkerLostError
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import OperationalError, DisconnectionError, InterfaceError
 
 from .config import settings
 from .database_manager import db_manager
+from .youtube_quota_manager import QuotaExceededException, RateLimitExceededException
+from .task_routing import configure_task_routing, celery_priority
+from .job_telemetry import JobTelemetry, request_queue_wait
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +44,87 @@ class JobPriority(Enum):
     HIGH = 3
     CRITICAL = 4
 
+class ErrorKind:
+    TRANSIENT = "transient"
+    PERMANENT = "permanent"
+
+# Failures caused by an unavailable dependency rather than by the job itself
+TRANSIENT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    redis.ConnectionError,
+    redis.TimeoutError,
+    OperationalError,
+    DisconnectionError,
+    InterfaceError,
+    WorkerLostError,
+    QuotaExceededException,
+    RateLimitExceededException
+)
+
+def epoch_seconds(value: datetime) -> float:
+    """Epoch seconds of a naive UTC datetime, comparable with time.time()
+
+    A naive datetime's .timestamp() is read as local time, so scores written
+    from utcnow() would drift from time.time() on non-UTC hosts.
+    """
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+def classify_error(error: Exception) -> str:
+    """Classify a task failure as transient (worth replaying) or permanent"""
+    return ErrorKind.TRANSIENT if isinstance(error, TRANSIENT_ERRORS) else ErrorKind.PERMANENT
+
+# Applies a partial job update and moves the job between status indexes
+# atomically, without a client-side read of the stored metadata. Returns the
+# previous status and the timestamps latency telemetry needs.
+UPDATE_JOB_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'status')
+if not current then
+    return 0
+end
+
+local job_id, index_prefix, started_at = ARGV[1], ARGV[2], ARGV[3]
+local status = ARGV[5]
+
+for i = 4, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+local newly_started = 0
+if started_at ~= '' then
+    newly_started = redis.call('HSETNX', KEYS[1], 'started_at', started_at)
+end
+
+if current ~= status then
+    local created_ts = redis.call('HGET', KEYS[1], 'created_ts') or '0'
+    redis.call('ZREM', index_prefix .. current, job_id)
+    redis.call('ZADD', index_prefix .. status, created_ts, job_id)
+    redis.call('HINCRBY', KEYS[2], status, 1)
+end
+
+local timing = redis.call('HMGET', KEYS[1], 'task_name', 'enqueue_ts', 'started_at')
+return {current, timing[1] or '', timing[2] or '', timing[3] or '', newly_started}
+"""
+
+# Drop the claim on an idempotency key only while it still points at this job
+RELEASE_DEDUP_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Tasks where a second identical run inside the dedup window is pure waste;
+# everything else is deduplicated only when the caller passes a key
+IDEMPOTENT_TASKS = frozenset([
+    "app.robust_tasks.rotate_titles_robust",
+    "app.robust_tasks.rotate_tenant_titles_robust",
+    "app.robust_tasks.cleanup_completed_tests_robust",
+    "app.robust_tasks.flush_quota_usage_robust",
+    "app.robust_tasks.refresh_expiring_tokens_robust",
+    "app.robust_tasks.recover_failed_jobs",
+    "app.robust_tasks.cleanup_old_job_metadata",
+])
+
 @dataclass
 class JobMetadata:
     """Metadata for tracking job execution"""
@@ -45,6 +133,7 @@ class JobMetadata:
     status: JobStatus
     priority: JobPriority
     created_at: datetime
+    enqueued_at: Optional[datetime] = None  # When the job became runnable (after any countdown)
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     retry_count: int = 0
@@ -53,6 +142,23 @@ class JobMetadata:
     progress: float = 0.0
     user_id: Optional[str] = None
     result: Optional[Dict[str, Any]] = None
+    args: Optional[List[Any]] = None
+    kwargs: Optional[Dict[str, Any]] = None
+    error_kind: Optional[str] = None
+    dead_letter_replays: int = 0
+    idempotency_key: Optional[str] = None
+
+@dataclass
+class JobSubmission:
+    """One job in a bulk submission"""
+    task_name: str
+    args: Optional[List[Any]] = None
+    kwargs: Optional[Dict[str, Any]] = None
+    priority: JobPriority = JobPriority.NORMAL
+    user_id: Optional[str] = None
+    delay: Optional[float] = None
+    idempotency_key: Optional[str] = None
+    dedup_window: Optional[int] = None
 
 class RobustJobManager:
     """Enhanced job manager with persistence and recovery"""
@@ -63,6 +169,28 @@ class RobustJobManager:
         self.connection_healthy = False
         self.job_metadata_key = "ttpr:jobs"
         self.dead_letter_key = "ttpr:failed_jobs"
+        self.status_index_key = "ttpr:job_index:status"
+        self.user_index_key = "ttpr:job_index:user"
+        self.task_index_key = "ttpr:job_index:task"
+        self.created_index_key = "ttpr:job_index:created"
+        self.recoverable_key = "ttpr:job_index:recoverable"
+        self.dedup_key = "ttpr:job_dedup"
+        self.events_key = "ttpr:job_events"
+        self.events_maxlen = 200
+        self.events_ttl = 86400
+        self.transition_counter_key = "ttpr:job_index:transitions"
+        self.metadata_ttl = 86400 * 7  # 7 days
+        self.dead_letter_retention = 86400 * 14  # 14 days
+        self.expiry_batch_size = 500
+        
+        # Failed-job recovery
+        self.recovery_batch_size = 25  # replays per recovery run
+        self.recovery_spacing = 2.0  # seconds between replays in a batch
+        self.recovery_base_delay = 60  # backoff before the first replay
+        self.recovery_max_delay = 3600
+        self.max_dead_letter_replays = 1
+        self._update_script_obj = None
+        self.telemetry = JobTelemetry(self)
         
     def initialize(self) -> bool:
         """Initialize job manager with Redis and Celery"""
@@ -111,6 +239,12 @@ class RobustJobManager:
             self.connection_healthy = False
             return False
     
+    def _ensure_celery(self) -> bool:
+        """Workers never call initialize(), so set up the Celery app on first publish"""
+        if self.celery_app is None:
+            self._init_celery()
+        return self.celery_app is not None
+    
     def _init_celery(self) -> bool:
         """Initialize Celery with robust configuration"""
         try:
@@ -162,27 +296,40 @@ class RobustJobManager:
                 task_send_sent_event=True
             )
             
+            # Role queues so rotations never wait behind background work
+            configure_task_routing(self.celery_app)
+            
             # Job schedule with error recovery
             self.celery_app.conf.beat_schedule = {
                 "rotate-titles-robust": {
                     "task": "app.robust_tasks.rotate_titles_robust",
                     "schedule": 60.0,  # Every minute
-                    "options": {"priority": JobPriority.HIGH.value}
+                    "options": {"priority": celery_priority(JobPriority.HIGH.value)}
                 },
                 "cleanup-completed-tests-robust": {
                     "task": "app.robust_tasks.cleanup_completed_tests_robust", 
                     "schedule": 3600.0,  # Every hour
-                    "options": {"priority": JobPriority.NORMAL.value}
+                    "options": {"priority": celery_priority(JobPriority.NORMAL.value)}
                 },
                 "recover-failed-jobs": {
                     "task": "app.robust_tasks.recover_failed_jobs",
                     "schedule": 300.0,  # Every 5 minutes
-                    "options": {"priority": JobPriority.HIGH.value}
+                    "options": {"priority": celery_priority(JobPriority.HIGH.value)}
+                },
+                "flush-quota-usage": {
+                    "task": "app.robust_tasks.flush_quota_usage_robust",
+                    "schedule": float(settings.quota_flush_interval_seconds),
+                    "options": {"priority": celery_priority(JobPriority.NORMAL.value)}
+                },
+                "refresh-expiring-tokens": {
+                    "task": "app.robust_tasks.refresh_expiring_tokens_robust",
+                    "schedule": float(settings.token_refresh_interval_seconds),
+                    "options": {"priority": celery_priority(JobPriority.HIGH.value)}
                 },
                 "cleanup-old-job-metadata": {
                     "task": "app.robust_tasks.cleanup_old_job_metadata",
                     "schedule": 86400.0,  # Daily
-                    "options": {"priority": JobPriority.LOW.value}
+                    "options": {"priority": celery_priority(JobPriority.LOW.value)}
                 }
             }
             
@@ -193,80 +340,319 @@ class RobustJobManager:
             logger.error(f"❌ Celery initialization failed: {e}")
             return False
     
+    @staticmethod
+    def make_idempotency_key(task_name: str, args: Optional[List[Any]] = None,
+                             kwargs: Optional[Dict[str, Any]] = None) -> str:
+        """Derive a stable idempotency key from the task invocation"""
+        payload = json.dumps(
+            {"task": task_name, "args": args or [], "kwargs": kwargs or {}},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _claim_idempotency_key(self, idempotency_key: str, job_id: str, window: int) -> Optional[str]:
+        """Claim a key for `job_id`; return the job already holding it, if any"""
+        if not self.redis_client or not self.connection_healthy:
+            return None
+        
+        key = f"{self.dedup_key}:{idempotency_key}"
+        if self.redis_client.set(key, job_id, nx=True, ex=window):
+            return None
+        
+        existing = self.redis_client.get(key)
+        return existing.decode() if isinstance(existing, bytes) else existing
+    
+    def _release_idempotency_key(self, job_id: str):
+        """Let the same work be submitted again once this job has finished"""
+        try:
+            idempotency_key = self.redis_client.hget(f"{self.job_metadata_key}:{job_id}", "idempotency_key")
+            if idempotency_key:
+                if isinstance(idempotency_key, bytes):
+                    idempotency_key = idempotency_key.decode()
+                self.redis_client.eval(RELEASE_DEDUP_SCRIPT, 1, f"{self.dedup_key}:{idempotency_key}", job_id)
+        except Exception as e:
+            logger.debug(f"Idempotency key release failed for {job_id}: {e}")
+    
     def submit_job(self, task_name: str, args: List[Any] = None, kwargs: Dict[str, Any] = None,
                    priority: JobPriority = JobPriority.NORMAL, user_id: Optional[str] = None,
-                   delay: Optional[float] = None) -> Optional[str]:
-        """Submit a job with metadata tracking"""
+                   delay: Optional[float] = None, retry_count: int = 0,
+                   dead_letter_replays: int = 0, idempotency_key: Optional[str] = None,
+                   dedup_window: Optional[int] = None) -> Optional[str]:
+        """Submit a job with metadata tracking
+        
+        Submissions sharing an idempotency key while an earlier one is still
+        queued or running (and within the dedup window) return that job
+        instead of queueing it again. Deduplication is opt-in: pass a key, or
+        submit a task in IDEMPOTENT_TASKS to have one derived from the task
+        name and arguments. The claim is released when the job finishes.
+        """
+        # User-scoped tasks take the owner as a kwarg; record it so the owner can follow the job
+        user_id = user_id or (kwargs or {}).get("user_id")
+        if idempotency_key is None and task_name in IDEMPOTENT_TASKS:
+            idempotency_key = self.make_idempotency_key(task_name, args, kwargs)
+        dedup_key_claimed = False
+        
         try:
-            if not self.celery_app:
+            if not self._ensure_celery():
                 logger.error("❌ Celery not initialized")
                 return None
             
-            job_id = f"job_{int(time.time() * 1000)}_{hash(task_name + str(args))}"
+            job_id = self._new_job_id()
+            
+            if idempotency_key:
+                existing_job_id = self._claim_idempotency_key(
+                    idempotency_key, job_id, dedup_window or settings.job_dedup_window_seconds
+                )
+                if existing_job_id:
+                    logger.info(f"♻️ Duplicate submission of {task_name} skipped, already queued as {existing_job_id}")
+                    return existing_job_id
+                dedup_key_claimed = True
             
             # Create job metadata
+            created_at = datetime.utcnow()
             metadata = JobMetadata(
                 job_id=job_id,
                 task_name=task_name,
                 status=JobStatus.PENDING,
                 priority=priority,
-                created_at=datetime.utcnow(),
-                user_id=user_id
+                created_at=created_at,
+                enqueued_at=created_at + timedelta(seconds=delay or 0),
+                user_id=user_id,
+                retry_count=retry_count,
+                args=list(args or []),
+                kwargs=dict(kwargs or {}),
+                dead_letter_replays=dead_letter_replays,
+                idempotency_key=idempotency_key
             )
             
             # Store metadata
             self._store_job_metadata(metadata)
             
             # Submit job to Celery
-            task_kwargs = kwargs or {}
-            task_kwargs['job_id'] = job_id
-            
-            if delay:
-                result = self.celery_app.send_task(
-                    task_name,
-                    args=args or [],
-                    kwargs=task_kwargs,
-                    countdown=delay,
-                    priority=priority.value,
-                    task_id=job_id
-                )
-            else:
-                result = self.celery_app.send_task(
-                    task_name,
-                    args=args or [],
-                    kwargs=task_kwargs,
-                    priority=priority.value,
-                    task_id=job_id
-                )
+            self._send_task(job_id, task_name, args, kwargs, priority, delay)
             
             logger.info(f"✅ Job {job_id} submitted: {task_name}")
             return job_id
             
         except Exception as e:
             logger.error(f"❌ Job submission failed: {e}")
+            # Let a later submission of the same work go through
+            if dedup_key_claimed:
+                try:
+                    self.redis_client.delete(f"{self.dedup_key}:{idempotency_key}")
+                except Exception:
+                    pass
             return None
     
-    def _store_job_metadata(self, metadata: JobMetadata):
-        """Store job metadata in Redis"""
-        try:
-            if self.redis_client and self.connection_healthy:
-                key = f"{self.job_metadata_key}:{metadata.job_id}"
-                data = asdict(metadata)
+    @staticmethod
+    def _new_job_id() -> str:
+        return f"job_{int(time.time() * 1000)}_{uuid.uuid4().hex[:16]}"
+    
+    def _send_task(self, job_id: str, task_name: str, args: Optional[List[Any]],
+                   kwargs: Optional[Dict[str, Any]], priority: JobPriority,
+                   delay: Optional[float] = None, producer=None):
+        """Publish a job's task, over `producer` when one is given"""
+        options = {"task_id": job_id, "priority": celery_priority(priority.value)}
+        if delay:
+            options["countdown"] = delay
+        if producer is not None:
+            options["producer"] = producer
+        return self.celery_app.send_task(
+            task_name,
+            args=args or [],
+            kwargs={**(kwargs or {}), "job_id": job_id},
+            **options
+        )
+    
+    def submit_many(self, submissions: List[JobSubmission], chunk_size: int = 500) -> List[Optional[str]]:
+        """Submit many jobs with pipelined metadata and one broker connection per chunk
+        
+        Per chunk, idempotency keys are claimed in one pipeline, metadata for
+        the new jobs is written in one transaction and every task is published
+        over a single producer connection. Deduplication follows `submit_job`.
+        Returns job IDs in input order: the existing job for duplicates and
+        None for jobs that could not be published.
+        """
+        job_ids: List[Optional[str]] = [None] * len(submissions)
+        
+        if not self._ensure_celery():
+            logger.error("❌ Celery not initialized")
+            return job_ids
+        
+        redis_available = bool(self.redis_client and self.connection_healthy)
+        
+        for chunk_start in range(0, len(submissions), chunk_size):
+            entries = []
+            for index, submission in enumerate(submissions[chunk_start:chunk_start + chunk_size], start=chunk_start):
+                idempotency_key = submission.idempotency_key
+                if idempotency_key is None and submission.task_name in IDEMPOTENT_TASKS:
+                    idempotency_key = self.make_idempotency_key(submission.task_name, submission.args, submission.kwargs)
+                entries.append((index, submission, idempotency_key, self._new_job_id()))
+            claimed = []
+            
+            try:
+                # Claim idempotency keys; duplicates resolve to the queued job
+                keyed = [entry for entry in entries if entry[2]] if redis_available else []
+                if keyed:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    for _, submission, idempotency_key, job_id in keyed:
+                        pipe.set(f"{self.dedup_key}:{idempotency_key}", job_id, nx=True,
+                                 ex=submission.dedup_window or settings.job_dedup_window_seconds)
+                    claims = pipe.execute()
+                    claimed = [entry for entry, won in zip(keyed, claims) if won]
+                    
+                    duplicates = [entry for entry, won in zip(keyed, claims) if not won]
+                    if duplicates:
+                        pipe = self.redis_client.pipeline(transaction=False)
+                        for _, _, idempotency_key, _ in duplicates:
+                            pipe.get(f"{self.dedup_key}:{idempotency_key}")
+                        for (index, _, _, _), existing in zip(duplicates, pipe.execute()):
+                            job_ids[index] = existing.decode() if isinstance(existing, bytes) else existing
+                        duplicate_indexes = {entry[0] for entry in duplicates}
+                        entries = [entry for entry in entries if entry[0] not in duplicate_indexes]
+                
+                if not entries:
+                    continue
                 
-                # Convert datetime objects to ISO strings
-                for field in ['created_at', 'started_at', 'completed_at']:
-                    if data[field]:
-                        data[field] = data[field].isoformat()
+                # One transaction for all metadata of the chunk
+                if redis_available:
+                    created_at = datetime.utcnow()
+                    pipe = self.redis_client.pipeline(transaction=True)
+                    for _, submission, idempotency_key, job_id in entries:
+                        self._queue_job_metadata(pipe, JobMetadata(
+                            job_id=job_id,
+                            task_name=submission.task_name,
+                            status=JobStatus.PENDING,
+                            priority=submission.priority,
+                            created_at=created_at,
+                            enqueued_at=created_at + timedelta(seconds=submission.delay or 0),
+                            user_id=submission.user_id or (submission.kwargs or {}).get("user_id"),
+                            args=list(submission.args or []),
+                            kwargs=dict(submission.kwargs or {}),
+                            idempotency_key=idempotency_key
+                        ))
+                    pipe.execute()
                 
-                # Convert enum to value
-                data['status'] = data['status'].value
-                data['priority'] = data['priority'].value
+                # Each task is still one message, but they share one connection
+                with self.celery_app.producer_or_acquire() as producer:
+                    for index, submission, _, job_id in entries:
+                        self._send_task(job_id, submission.task_name, submission.args, submission.kwargs,
+                                        submission.priority, submission.delay, producer=producer)
+                        job_ids[index] = job_id
                 
-                self.redis_client.setex(key, 86400 * 7, json.dumps(data))  # 7 days TTL
+                logger.info(f"✅ Submitted {len(entries)} jobs in bulk")
+                
+            except Exception as e:
+                logger.error(f"❌ Bulk job submission failed for chunk at {chunk_start}: {e}")
+                # Let later submissions of the unpublished work go through
+                unpublished = [f"{self.dedup_key}:{entry[2]}" for entry in claimed if job_ids[entry[0]] is None]
+                if unpublished:
+                    try:
+                        self.redis_client.delete(*unpublished)
+                    except Exception:
+                        pass
+        
+        return job_ids
+    
+    def _status_key(self, status: JobStatus) -> str:
+        return f"{self.status_index_key}:{status.value}"
+    
+    def _update_script(self, keys: List[str], args: List[Any]):
+        if self._update_script_obj is None or self._update_script_obj.registered_client is not self.redis_client:
+            self._update_script_obj = self.redis_client.register_script(UPDATE_JOB_SCRIPT)
+        return self._update_script_obj(keys=keys, args=args)
+    
+    def _serialize_metadata(self, metadata: JobMetadata) -> Dict[str, str]:
+        """Flatten job metadata into hash fields, leaving out unset values"""
+        data = asdict(metadata)
+        
+        # Convert datetime objects to ISO strings
+        for field in ['created_at', 'enqueued_at', 'started_at', 'completed_at']:
+            if data[field]:
+                data[field] = data[field].isoformat()
+        
+        # Convert enum to value
+        data['status'] = data['status'].value
+        data['priority'] = data['priority'].value
+        for field in ['result', 'args', 'kwargs']:
+            data[field] = json.dumps(data[field]) if data[field] is not None else None
+        
+        # Index score used when the status changes without reading the job
+        data['created_ts'] = epoch_seconds(metadata.created_at)
+        # Queue wait is measured from here when the job starts
+        data['enqueue_ts'] = epoch_seconds(metadata.enqueued_at or metadata.created_at)
+        
+        return {field: str(value) for field, value in data.items() if value is not None}
+    
+    def _deserialize_metadata(self, raw: Dict[Any, Any]) -> JobMetadata:
+        """Rebuild job metadata from stored hash fields"""
+        job_data = {
+            (field.decode() if isinstance(field, bytes) else field): (value.decode() if isinstance(value, bytes) else value)
+            for field, value in raw.items()
+        }
+        job_data.pop('created_ts', None)
+        job_data.pop('enqueue_ts', None)
+        
+        # Convert back from stored format
+        for field in ['created_at', 'enqueued_at', 'started_at', 'completed_at']:
+            if job_data.get(field):
+                job_data[field] = datetime.fromisoformat(job_data[field])
+        
+        job_data['status'] = JobStatus(job_data['status'])
+        job_data['priority'] = JobPriority(int(job_data['priority']))
+        for field in ['retry_count', 'max_retries', 'dead_letter_replays']:
+            if field in job_data:
+                job_data[field] = int(job_data[field])
+        if 'progress' in job_data:
+            job_data['progress'] = float(job_data['progress'])
+        for field in ['result', 'args', 'kwargs']:
+            if job_data.get(field):
+                job_data[field] = json.loads(job_data[field])
+        
+        return JobMetadata(**job_data)
+    
+    def _store_job_metadata(self, metadata: JobMetadata, previous_status: Optional[JobStatus] = None):
+        """Store job metadata in Redis and maintain its secondary indexes"""
+        try:
+            if self.redis_client and self.connection_healthy:
+                # Metadata, indexes and transition counter change together
+                pipe = self.redis_client.pipeline(transaction=True)
+                self._queue_job_metadata(pipe, metadata, previous_status)
+                pipe.execute()
                 
         except Exception as e:
             logger.warning(f"⚠️ Failed to store job metadata: {e}")
     
+    def _queue_job_metadata(self, pipe, metadata: JobMetadata, previous_status: Optional[JobStatus] = None):
+        """Queue the commands storing a job's metadata, indexes and counters"""
+        key = f"{self.job_metadata_key}:{metadata.job_id}"
+        pipe.delete(key)
+        pipe.hset(key, mapping=self._serialize_metadata(metadata))
+        pipe.expire(key, self.metadata_ttl)
+        self._index_job(pipe, metadata)
+        if previous_status != metadata.status:
+            pipe.hincrby(self.transition_counter_key, metadata.status.value, 1)
+    
+    def _index_job(self, pipe, metadata: JobMetadata):
+        """Queue the commands placing a job in its status, user and task indexes"""
+        score = epoch_seconds(metadata.created_at)
+        for other in JobStatus:
+            if other != metadata.status:
+                pipe.zrem(self._status_key(other), metadata.job_id)
+        pipe.zadd(self._status_key(metadata.status), {metadata.job_id: score})
+        pipe.zadd(self.created_index_key, {metadata.job_id: score})
+        
+        # Per-task and per-user indexes vanish once their newest job is past
+        # the TTL; older entries in live indexes are trimmed when queried
+        task_key = f"{self.task_index_key}:{metadata.task_name}"
+        pipe.zadd(task_key, {metadata.job_id: score})
+        pipe.expire(task_key, self.metadata_ttl)
+        if metadata.user_id:
+            user_key = f"{self.user_index_key}:{metadata.user_id}"
+            pipe.zadd(user_key, {metadata.job_id: score})
+            pipe.expire(user_key, self.metadata_ttl)
+    
     def get_job_status(self, job_id: str) -> Optional[JobMetadata]:
         """Get job status and metadata"""
         try:
@@ -274,22 +660,22 @@ class RobustJobManager:
                 return None
             
             key = f"{self.job_metadata_key}:{job_id}"
-            data = self.redis_client.get(key)
-            
-            if not data:
-                return None
             
-            job_data = json.loads(data)
-            
-            # Convert back from stored format
-            for field in ['created_at', 'started_at', 'completed_at']:
-                if job_data[field]:
-                    job_data[field] = datetime.fromisoformat(job_data[field])
+            try:
+                raw = self.redis_client.hgetall(key)
+            except redis.ResponseError:
+                # Job stored as a JSON blob before metadata moved to hashes
+                data = self.redis_client.get(key)
+                raw = json.loads(data) if data else {}
+                for field in ['result', 'args', 'kwargs']:
+                    if raw.get(field) is not None:
+                        raw[field] = json.dumps(raw[field])
+                raw = {field: value for field, value in raw.items() if value is not None}
             
-            job_data['status'] = JobStatus(job_data['status'])
-            job_data['priority'] = JobPriority(job_data['priority'])
+            if not raw:
+                return None
             
-            return JobMetadata(**job_data)
+            return self._deserialize_metadata(raw)
             
         except Exception as e:
             logger.warning(f"⚠️ Failed to get job status: {e}")
@@ -298,35 +684,122 @@ class RobustJobManager:
     def update_job_status(self, job_id: str, status: JobStatus, 
                          error_message: Optional[str] = None,
                          progress: Optional[float] = None,
-                         result: Optional[Dict[str, Any]] = None):
+                         result: Optional[Dict[str, Any]] = None,
+                         error_kind: Optional[str] = None):
         """Update job status and metadata"""
         try:
-            metadata = self.get_job_status(job_id)
-            if not metadata:
-                logger.warning(f"⚠️ Job metadata not found: {job_id}")
+            if not self.redis_client or not self.connection_healthy:
                 return
             
-            # Update fields
-            metadata.status = status
+            now = datetime.utcnow().isoformat()
+            
+            # Only the changed fields are written; no read of the job needed
+            fields = {"status": status.value}
             if error_message:
-                metadata.error_message = error_message
+                fields["error_message"] = error_message
+            if error_kind:
+                fields["error_kind"] = error_kind
             if progress is not None:
-                metadata.progress = progress
+                fields["progress"] = str(progress)
             if result is not None:
-                metadata.result = result
+                fields["result"] = json.dumps(result)
+            if status in [JobStatus.SUCCESS, JobStatus.FAILED, JobStatus.CANCELLED]:
+                fields["completed_at"] = now
             
-            # Update timestamps
-            if status == JobStatus.RUNNING and not metadata.started_at:
-                metadata.started_at = datetime.utcnow()
-            elif status in [JobStatus.SUCCESS, JobStatus.FAILED, JobStatus.CANCELLED]:
-                metadata.completed_at = datetime.utcnow()
+            args = [job_id, f"{self.status_index_key}:", now if status == JobStatus.RUNNING else ""]
+            for field, value in fields.items():
+                args.extend([field, value])
             
-            self._store_job_metadata(metadata)
+            key = f"{self.job_metadata_key}:{job_id}"
+            try:
+                updated = self._update_script(keys=[key, self.transition_counter_key], args=args)
+                if updated:
+                    previous, task_name, enqueue_ts, started_at, newly_started = [
+                        value.decode() if isinstance(value, bytes) else value for value in updated
+                    ]
+            except redis.ResponseError as e:
+                if "WRONGTYPE" not in str(e):
+                    raise
+                # Job stored as a JSON blob; rewrite it as a hash
+                metadata = self.get_job_status(job_id)
+                if not metadata:
+                    return
+                previous_status = metadata.status
+                metadata.status = status
+                metadata.error_message = error_message or metadata.error_message
+                metadata.error_kind = error_kind or metadata.error_kind
+                metadata.progress = progress if progress is not None else metadata.progress
+                metadata.result = result if result is not None else metadata.result
+                newly_started = 0
+                if status == JobStatus.RUNNING and not metadata.started_at:
+                    metadata.started_at = datetime.utcnow()
+                    newly_started = 1
+                elif "completed_at" in fields:
+                    metadata.completed_at = datetime.utcnow()
+                self._store_job_metadata(metadata, previous_status)
+                updated = 1
+                previous, task_name = previous_status.value, metadata.task_name
+                enqueue_ts = epoch_seconds(metadata.enqueued_at or metadata.created_at)
+                started_at = metadata.started_at.isoformat() if metadata.started_at else ""
+            
+            if not updated:
+                logger.warning(f"⚠️ Job metadata not found: {job_id}")
+                return
+            
+            if status == JobStatus.FAILED and error_kind == ErrorKind.TRANSIENT:
+                # Recovery replays it once its backoff has elapsed
+                self.redis_client.zadd(self.recoverable_key, {job_id: time.time()})
+            
+            if "completed_at" in fields:
+                self._release_idempotency_key(job_id)
+            
+            self._record_latency(task_name, previous, status, enqueue_ts, started_at, newly_started)
+            self._publish_job_event(job_id, status, fields)
             
         except Exception as e:
             logger.warning(f"⚠️ Failed to update job status: {e}")
     
-    def retry_job(self, job_id: str) -> bool:
+    def _record_latency(self, task_name: str, previous: str, status: JobStatus,
+                        enqueue_ts: Any, started_at: str, newly_started: Any):
+        """Record queue wait on the first start and run time when a running job finishes"""
+        if not task_name:
+            return
+        
+        now = datetime.utcnow()
+        
+        if status == JobStatus.RUNNING and int(newly_started) and enqueue_ts:
+            self.telemetry.observe(task_name, "queue_wait", time.time() - float(enqueue_ts))
+        elif status in [JobStatus.SUCCESS, JobStatus.FAILED, JobStatus.CANCELLED] \
+                and previous == JobStatus.RUNNING.value and started_at:
+            run_time = (now - datetime.fromisoformat(started_at)).total_seconds()
+            self.telemetry.observe(task_name, "run_time", run_time, outcome=status.value)
+    
+    def _publish_job_event(self, job_id: str, status: JobStatus, fields: Dict[str, str]):
+        """Append a job event to its stream and notify live subscribers
+        
+        The stream keeps recent events so SSE clients can resume from their
+        Last-Event-ID; the pub/sub message only tells subscribers to read it.
+        """
+        try:
+            event = {"status": status.value, "timestamp": datetime.utcnow().isoformat()}
+            for field in ['progress', 'completed_at', 'error_kind']:
+                if field in fields:
+                    event[field] = fields[field]
+            if 'error_message' in fields:
+                # Only the summary line; tracebacks stay in the job metadata
+                event['error_message'] = fields['error_message'].split("\n", 1)[0][:200]
+            
+            key = f"{self.events_key}:{job_id}"
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.xadd(key, event, maxlen=self.events_maxlen, approximate=True)
+            pipe.expire(key, self.events_ttl)
+            pipe.publish(key, job_id)
+            pipe.execute()
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to publish job event for {job_id}: {e}")
+    
+    def retry_job(self, job_id: str, delay: Optional[float] = None) -> bool:
         """Retry a failed job"""
         try:
             metadata = self.get_job_status(job_id)
@@ -336,20 +809,34 @@ class RobustJobManager:
             if metadata.retry_count >= metadata.max_retries:
                 logger.warning(f"⚠️ Job {job_id} exceeded max retries")
                 self._move_to_dead_letter(metadata)
+                self.telemetry.record_retry(metadata.task_name, "dead_lettered")
+                # Dead-lettered jobs leave the failed set so recovery skips them
+                self.update_job_status(job_id, JobStatus.CANCELLED)
                 return False
             
-            # Increment retry count
-            metadata.retry_count += 1
-            metadata.status = JobStatus.RETRY
-            self._store_job_metadata(metadata)
-            
-            # Resubmit job
+            # Resubmit job with its original invocation
             new_job_id = self.submit_job(
                 metadata.task_name,
+                args=metadata.args,
+                kwargs=metadata.kwargs,
                 priority=metadata.priority,
-                user_id=metadata.user_id
+                user_id=metadata.user_id,
+                delay=delay,
+                retry_count=metadata.retry_count + 1,
+                dead_letter_replays=metadata.dead_letter_replays,
+                idempotency_key=f"{job_id}:retry:{metadata.retry_count + 1}"
             )
+            if not new_job_id:
+                # Leave the job as it was so a later recovery run tries again
+                logger.error(f"❌ Job {job_id} could not be resubmitted")
+                return False
+            
+            previous_status = metadata.status
+            metadata.retry_count += 1
+            metadata.status = JobStatus.RETRY
+            self._store_job_metadata(metadata, previous_status)
             
+            self.telemetry.record_retry(metadata.task_name)
             logger.info(f"🔄 Job {job_id} retried as {new_job_id}")
             return True
             
@@ -361,7 +848,7 @@ class RobustJobManager:
         """Move failed job to dead letter queue"""
         try:
             if self.redis_client and self.connection_healthy:
-                dead_letter_data = asdict(metadata)
+                dead_letter_data = self._metadata_to_dict(metadata)
                 dead_letter_data['moved_to_dlq_at'] = datetime.utcnow().isoformat()
                 
                 self.redis_client.lpush(
@@ -374,6 +861,316 @@ class RobustJobManager:
         except Exception as e:
             logger.error(f"❌ Failed to move job to dead letter queue: {e}")
     
+    def _recovery_delay(self, retry_count: int) -> float:
+        """Exponential backoff before replaying a job"""
+        return min(self.recovery_base_delay * (2 ** retry_count), self.recovery_max_delay)
+    
+    def _dependencies_healthy(self) -> bool:
+        """Only replay once Redis and the database answer again"""
+        try:
+            self.redis_client.ping()
+        except Exception:
+            return False
+        return db_manager.test_connection()
+    
+    def recover_jobs(self) -> Dict[str, Any]:
+        """Replay failed and dead-lettered jobs whose failure was transient
+        
+        At most `recovery_batch_size` jobs are replayed per run, spaced
+        `recovery_spacing` seconds apart, and each only after its exponential
+        backoff. Permanent failures and jobs without a captured invocation are
+        never replayed. Nothing is replayed while a dependency is still down.
+        """
+        if not self.redis_client or not self.connection_healthy:
+            return {"status": "skipped", "reason": "redis_unavailable"}
+        
+        if not self._dependencies_healthy():
+            return {"status": "skipped", "reason": "dependencies_unavailable"}
+        
+        stats = {"replayed": 0, "dead_lettered": 0, "backing_off": 0, "resubmit_failed": 0, "dead_letter_replayed": 0}
+        budget = self.recovery_batch_size
+        now = datetime.utcnow()
+        
+        # Failed jobs whose backoff has elapsed, earliest first
+        job_ids = [
+            member.decode() if isinstance(member, bytes) else member
+            for member in self.redis_client.zrangebyscore(
+                self.recoverable_key, "-inf", time.time(), start=0, num=self.recovery_batch_size * 4
+            )
+        ]
+        
+        if job_ids:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for job_id in job_ids:
+                pipe.hgetall(f"{self.job_metadata_key}:{job_id}")
+            raw_jobs = pipe.execute()
+            
+            for job_id, raw in zip(job_ids, raw_jobs):
+                if budget <= 0:
+                    break
+                
+                metadata = self._deserialize_metadata(raw) if raw else None
+                if not metadata or metadata.status != JobStatus.FAILED or metadata.args is None:
+                    self.redis_client.zrem(self.recoverable_key, job_id)
+                    continue
+                
+                eligible_at = (metadata.completed_at or metadata.created_at) + timedelta(
+                    seconds=self._recovery_delay(metadata.retry_count)
+                )
+                if eligible_at > now:
+                    # Re-score so this job does not hold the scan window
+                    self.redis_client.zadd(self.recoverable_key, {job_id: epoch_seconds(eligible_at)}, xx=True)
+                    stats["backing_off"] += 1
+                    continue
+                
+                delay = (self.recovery_batch_size - budget) * self.recovery_spacing
+                if self.retry_job(job_id, delay=delay or None):
+                    stats["replayed"] += 1
+                    budget -= 1
+                elif metadata.retry_count >= metadata.max_retries:
+                    stats["dead_lettered"] += 1
+                else:
+                    # Resubmission failed; keep the job and try again after another backoff
+                    retry_at = time.time() + self._recovery_delay(metadata.retry_count)
+                    self.redis_client.zadd(self.recoverable_key, {job_id: retry_at}, xx=True)
+                    stats["resubmit_failed"] += 1
+                    continue
+                self.redis_client.zrem(self.recoverable_key, job_id)
+        
+        if budget > 0:
+            stats["dead_letter_replayed"] = self._replay_dead_letters(budget, now)
+        
+        logger.info(
+            f"🔧 Job recovery: {stats['replayed']} replayed, {stats['dead_letter_replayed']} from dead letters, "
+            f"{stats['backing_off']} backing off"
+        )
+        return stats
+    
+    def _replay_dead_letters(self, budget: int, now: datetime) -> int:
+        """Replay transient dead-lettered jobs, oldest first, within the budget"""
+        replayed = 0
+        scanned = 0
+        
+        while budget > 0 and scanned < 1000:
+            entries = self.redis_client.lrange(self.dead_letter_key, -(scanned + 100), -(scanned + 1))
+            if not entries:
+                break
+            
+            for raw in reversed(entries):
+                if budget <= 0:
+                    break
+                
+                try:
+                    entry = json.loads(raw)
+                    moved_at = datetime.fromisoformat(entry['moved_to_dlq_at'])
+                except (ValueError, TypeError, KeyError):
+                    continue
+                
+                replays = entry.get('dead_letter_replays') or 0
+                if (entry.get('error_kind') != ErrorKind.TRANSIENT
+                        or entry.get('args') is None
+                        or replays >= self.max_dead_letter_replays
+                        or moved_at + timedelta(seconds=self.recovery_max_delay) > now):
+                    continue
+                
+                # Remove this exact entry (searching from the tail) before replaying
+                if not self.redis_client.lrem(self.dead_letter_key, -1, raw):
+                    continue
+                
+                new_job_id = self.submit_job(
+                    entry['task_name'],
+                    args=entry['args'],
+                    kwargs=entry.get('kwargs'),
+                    priority=JobPriority(entry.get('priority', JobPriority.NORMAL.value)),
+                    user_id=entry.get('user_id'),
+                    delay=(self.recovery_batch_size - budget) * self.recovery_spacing or None,
+                    dead_letter_replays=replays + 1,
+                    idempotency_key=f"{entry.get('job_id')}:dead_letter:{replays + 1}"
+                )
+                self.telemetry.record_retry(entry['task_name'], "dead_letter_replay")
+                logger.info(f"📬 Dead-lettered job {entry.get('job_id')} replayed as {new_job_id}")
+                replayed += 1
+                budget -= 1
+                scanned -= 1  # The list shrank by the removed entry
+            
+            scanned += len(entries)
+            if len(entries) < 100:
+                break
+        
+        return replayed
+    
+    def expire_old_jobs(self) -> Dict[str, Any]:
+        """Delete jobs past the metadata TTL using the created-at index
+        
+        Work is proportional to the number of expired jobs: each batch is one
+        ZRANGEBYSCORE plus a pipeline of UNLINKs and index removals.
+        """
+        if not self.redis_client or not self.connection_healthy:
+            return {"status": "skipped", "reason": "redis_unavailable"}
+        
+        cutoff_ts = time.time() - self.metadata_ttl
+        cutoff = datetime.utcfromtimestamp(cutoff_ts)
+        expired_count = 0
+        
+        while True:
+            batch = self.redis_client.zrangebyscore(
+                self.created_index_key, "-inf", cutoff_ts, start=0, num=self.expiry_batch_size
+            )
+            if not batch:
+                break
+            
+            job_ids = [member.decode() if isinstance(member, bytes) else member for member in batch]
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.unlink(*[f"{self.job_metadata_key}:{job_id}" for job_id in job_ids])
+            pipe.zrem(self.created_index_key, *job_ids)
+            pipe.execute()
+            
+            expired_count += len(job_ids)
+            if len(job_ids) < self.expiry_batch_size:
+                break
+        
+        # Status indexes share the created-at score, so they trim by range
+        pipe = self.redis_client.pipeline(transaction=False)
+        for status in JobStatus:
+            pipe.zremrangebyscore(self._status_key(status), "-inf", cutoff_ts)
+        pipe.zremrangebyscore(self.recoverable_key, "-inf", cutoff_ts)
+        pipe.execute()
+        
+        return {
+            "expired_jobs": expired_count,
+            "dead_letter_trimmed": self._trim_dead_letter_queue(),
+            "cutoff_date": cutoff.isoformat()
+        }
+    
+    def _trim_dead_letter_queue(self) -> int:
+        """Drop dead-letter entries older than the retention from the list tail
+        
+        Entries are LPUSHed, so the oldest sit at the tail; only the expired
+        tail is read and removed.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.dead_letter_retention)
+        trimmed = 0
+        
+        while True:
+            tail = self.redis_client.lrange(self.dead_letter_key, -100, -1)
+            if not tail:
+                break
+            
+            expired = 0
+            for raw in reversed(tail):
+                try:
+                    moved_at = datetime.fromisoformat(json.loads(raw).get('moved_to_dlq_at', ''))
+                except (ValueError, TypeError):
+                    moved_at = cutoff  # Unreadable entries are treated as expired
+                if moved_at > cutoff:
+                    break
+                expired += 1
+            
+            if not expired:
+                break
+            
+            self.redis_client.ltrim(self.dead_letter_key, 0, -(expired + 1))
+            trimmed += expired
+            if expired < len(tail):
+                break
+        
+        return trimmed
+    
+    def _metadata_to_dict(self, metadata: JobMetadata) -> Dict[str, Any]:
+        data = asdict(metadata)
+        for field in ['created_at', 'enqueued_at', 'started_at', 'completed_at']:
+            if data[field]:
+                data[field] = data[field].isoformat()
+        data['status'] = metadata.status.value
+        data['priority'] = metadata.priority.value
+        return data
+    
+    def query_jobs(self, user_id: Optional[str] = None, task_name: Optional[str] = None,
+                   status: Optional[JobStatus] = None, cursor: Optional[str] = None,
+                   limit: int = 50) -> Dict[str, Any]:
+        """List jobs newest first from the secondary indexes
+        
+        The most selective index is walked (user, then task, then status) and
+        any remaining filters are applied to the loaded jobs. The cursor is
+        the `<created_ts>:<job_id>` of the last job returned.
+        """
+        try:
+            if not self.redis_client or not self.connection_healthy:
+                return {"jobs": [], "next_cursor": None, "error": "redis_unavailable"}
+            
+            if user_id:
+                index_key = f"{self.user_index_key}:{user_id}"
+            elif task_name:
+                index_key = f"{self.task_index_key}:{task_name}"
+            elif status:
+                index_key = self._status_key(status)
+            else:
+                return {"jobs": [], "next_cursor": None, "error": "a user_id, task_name or status filter is required"}
+            
+            limit = max(1, min(limit, 200))
+            
+            # Entries past the metadata TTL no longer have a job behind them
+            expired_before = time.time() - self.metadata_ttl
+            self.redis_client.zremrangebyscore(index_key, "-inf", expired_before)
+            
+            max_score, after_id = "+inf", None
+            if cursor:
+                raw_score, after_id = cursor.split(":", 1)
+                max_score = float(raw_score)
+            
+            jobs: List[Dict[str, Any]] = []
+            next_cursor = None
+            
+            while len(jobs) < limit:
+                batch = self.redis_client.zrevrangebyscore(
+                    index_key, max_score, "-inf", start=0, num=limit * 2, withscores=True
+                )
+                entries = []
+                for member, score in batch:
+                    job_id = member.decode() if isinstance(member, bytes) else member
+                    # Ties on created_at are ordered by job ID, descending
+                    if after_id is not None and score == max_score and job_id >= after_id:
+                        continue
+                    entries.append((job_id, score))
+                
+                if not entries:
+                    break
+                
+                pipe = self.redis_client.pipeline(transaction=False)
+                for job_id, _ in entries:
+                    pipe.hgetall(f"{self.job_metadata_key}:{job_id}")
+                raw_jobs = pipe.execute()
+                
+                missing = []
+                for (job_id, score), raw in zip(entries, raw_jobs):
+                    max_score, after_id = score, job_id
+                    if not raw:
+                        missing.append(job_id)
+                        continue
+                    
+                    metadata = self._deserialize_metadata(raw)
+                    if task_name and metadata.task_name != task_name:
+                        continue
+                    if status and metadata.status != status:
+                        continue
+                    
+                    jobs.append(self._metadata_to_dict(metadata))
+                    if len(jobs) == limit:
+                        next_cursor = f"{score!r}:{job_id}"
+                        break
+                
+                if missing:
+                    self.redis_client.zrem(index_key, *missing)
+                if len(batch) < limit * 2:
+                    break
+            
+            return {"jobs": jobs, "next_cursor": next_cursor}
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to query jobs: {e}")
+            return {"jobs": [], "next_cursor": None, "error": str(e)}
+    
     def get_job_statistics(self) -> Dict[str, Any]:
         """Get job queue statistics"""
         try:
@@ -387,26 +1184,34 @@ class RobustJobManager:
             }
             
             if self.redis_client and self.connection_healthy:
-                # Get job counts by status
-                pattern = f"{self.job_metadata_key}:*"
-                for key in self.redis_client.scan_iter(match=pattern):
-                    try:
-                        data = json.loads(self.redis_client.get(key))
-                        status = data.get('status', 'unknown')
-                        
-                        if status == 'running':
-                            stats['active_jobs'] += 1
-                        elif status == 'pending':
-                            stats['pending_jobs'] += 1
-                        elif status == 'failed':
-                            stats['failed_jobs'] += 1
-                        elif status == 'success':
-                            stats['completed_jobs'] += 1
-                    except:
-                        continue
+                # Counts come from the status indexes; entries older than the
+                # metadata TTL are trimmed first so they match stored jobs
+                expired_before = time.time() - self.metadata_ttl
+                statuses = list(JobStatus)
+                
+                pipe = self.redis_client.pipeline(transaction=False)
+                for status in statuses:
+                    pipe.zremrangebyscore(self._status_key(status), "-inf", expired_before)
+                for status in statuses:
+                    pipe.zcard(self._status_key(status))
+                pipe.llen(self.dead_letter_key)
+                pipe.hgetall(self.transition_counter_key)
+                results = pipe.execute()
+                
+                counts = dict(zip(statuses, results[len(statuses):len(statuses) * 2]))
+                stats['active_jobs'] = counts[JobStatus.RUNNING]
+                stats['pending_jobs'] = counts[JobStatus.PENDING]
+                stats['failed_jobs'] = counts[JobStatus.FAILED]
+                stats['completed_jobs'] = counts[JobStatus.SUCCESS]
+                stats['retrying_jobs'] = counts[JobStatus.RETRY]
+                stats['cancelled_jobs'] = counts[JobStatus.CANCELLED]
                 
                 # Dead letter queue count
-                stats['dead_letter_count'] = self.redis_client.llen(self.dead_letter_key)
+                stats['dead_letter_count'] = results[-2]
+                stats['total_transitions'] = {
+                    (status.decode() if isinstance(status, bytes) else status): int(count)
+                    for status, count in results[-1].items()
+                }
             
             return stats
             
@@ -427,10 +1232,27 @@ class RobustJobManager:
 job_manager = RobustJobManager()
 
 def robust_task(max_retries: int = 3, retry_delay: float = 60.0):
-    """Decorator for creating robust Celery tasks with automatic metadata tracking"""
+    """Decorator for creating robust Celery tasks with automatic metadata tracking
+    
+    Tasks submitted through the job manager carry a job_id and get latency
+    recorded from their metadata. Anything else, such as beat tasks, is timed
+    here from the bound task's request instead.
+    """
     def decorator(func: Callable):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             job_id = kwargs.pop('job_id', None)
+            request = getattr(args[0], 'request', None) if args else None
+            task_name = getattr(request, 'task', None) if not job_id else None
+            started = time.monotonic()
+            
+            # Workers never call initialize(), so connect on first use
+            if job_manager.redis_client is None:
+                job_manager._init_redis()
+            if task_name:
+                queue_wait = request_queue_wait(request, time.time())
+                if queue_wait is not None:
+                    job_manager.telemetry.observe(task_name, "queue_wait", queue_wait)
             
             try:
                 # Update job status to running
@@ -443,6 +1265,10 @@ def robust_task(max_retries: int = 3, retry_delay: float = 60.0):
                 # Update job status to success
                 if job_id:
                     job_manager.update_job_status(job_id, JobStatus.SUCCESS, result=result)
+                elif task_name:
+                    job_manager.telemetry.observe(
+                        task_name, "run_time", time.monotonic() - started, outcome=JobStatus.SUCCESS.value
+                    )
                 
                 return result
                 
@@ -452,7 +1278,15 @@ def robust_task(max_retries: int = 3, retry_delay: float = 60.0):
                 
                 # Update job status to failed
                 if job_id:
-                    job_manager.update_job_status(job_id, JobStatus.FAILED, error_message=error_msg)
+                    job_manager.update_job_status(
+                        job_id, JobStatus.FAILED,
+                        error_message=error_msg,
+                        error_kind=classify_error(e)
+                    )
+                elif task_name:
+                    job_manager.telemetry.observe(
+                        task_name, "run_time", time.monotonic() - started, outcome=JobStatus.FAILED.value
+                    )
                 
                 raise
         
@@ -0,0 +1,201 @@
+"""
+Job Latency Telemetry
+Per-task histograms of broker queue wait and run time, plus retry counts
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from celery.signals import before_task_publish
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = [0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600]
+
+HISTOGRAMS = ("queue_wait", "run_time")
+
+# Message header carrying the publish time, read back as `task.request.ttpr_sent_at`
+SENT_AT_HEADER = "ttpr_sent_at"
+
+@before_task_publish.connect
+def stamp_sent_time(headers=None, **kwargs):
+    """Stamp every published task with its send time so workers can measure queue wait"""
+    if headers is not None:
+        headers.setdefault(SENT_AT_HEADER, time.time())
+
+def request_queue_wait(request, now: float) -> Optional[float]:
+    """Seconds a task spent in the broker, from its send time or ETA if later"""
+    sent_at = getattr(request, SENT_AT_HEADER, None) or (getattr(request, "headers", None) or {}).get(SENT_AT_HEADER)
+    if not sent_at:
+        return None
+
+    ready_at = float(sent_at)
+    eta = getattr(request, "eta", None)
+    if eta:
+        try:
+            ready_at = max(ready_at, datetime.fromisoformat(eta).timestamp())
+        except (TypeError, ValueError):
+            pass
+    return now - ready_at
+
+class JobTelemetry:
+    """Cumulative latency histograms and counters per task, stored in Redis
+
+    Each task has one hash holding, per histogram, a count per bucket plus
+    the sum and count of observations, and its outcome and retry counters.
+    Workers and the API share the data, so any process can export it.
+    """
+
+    def __init__(self, job_manager):
+        self.job_manager = job_manager
+        self.key_prefix = "ttpr:job_metrics"
+        self.tasks_key = f"{self.key_prefix}:tasks"
+
+    @property
+    def redis_client(self):
+        return self.job_manager.redis_client
+
+    def _task_key(self, task_name: str) -> str:
+        return f"{self.key_prefix}:{task_name}"
+
+    @staticmethod
+    def _bucket(seconds: float) -> str:
+        for bound in LATENCY_BUCKETS:
+            if seconds <= bound:
+                return str(bound)
+        return "+Inf"
+
+    def observe(self, task_name: str, histogram: str, seconds: float, outcome: Optional[str] = None):
+        """Record one queue-wait or run-time observation"""
+        try:
+            seconds = max(0.0, seconds)
+            key = self._task_key(task_name)
+
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.sadd(self.tasks_key, task_name)
+            pipe.hincrby(key, f"{histogram}:bucket:{self._bucket(seconds)}", 1)
+            pipe.hincrby(key, f"{histogram}:count", 1)
+            pipe.hincrbyfloat(key, f"{histogram}:sum", seconds)
+            if outcome:
+                pipe.hincrby(key, f"outcome:{outcome}", 1)
+            pipe.execute()
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to record {histogram} for {task_name}: {e}")
+
+    def record_retry(self, task_name: str, kind: str = "retry"):
+        """Count a retry or dead-letter replay of a task"""
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.sadd(self.tasks_key, task_name)
+            pipe.hincrby(self._task_key(task_name), f"retries:{kind}", 1)
+            pipe.execute()
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to record retry for {task_name}: {e}")
+
+    def _load(self) -> Dict[str, Dict[str, float]]:
+        task_names = sorted(
+            name.decode() if isinstance(name, bytes) else name
+            for name in self.redis_client.smembers(self.tasks_key)
+        )
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for task_name in task_names:
+            pipe.hgetall(self._task_key(task_name))
+
+        tasks = {}
+        for task_name, raw in zip(task_names, pipe.execute()):
+            tasks[task_name] = {
+                (field.decode() if isinstance(field, bytes) else field): float(value)
+                for field, value in raw.items()
+            }
+        return tasks
+
+    @staticmethod
+    def _cumulative(data: Dict[str, float], histogram: str) -> List[tuple]:
+        running = 0
+        cumulative = []
+        for bound in [str(b) for b in LATENCY_BUCKETS] + ["+Inf"]:
+            running += data.get(f"{histogram}:bucket:{bound}", 0)
+            cumulative.append((bound, int(running)))
+        return cumulative
+
+    def _quantile(self, data: Dict[str, float], histogram: str, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile"""
+        count = data.get(f"{histogram}:count", 0)
+        if not count:
+            return None
+        for bound, running in self._cumulative(data, histogram):
+            if running >= q * count:
+                return None if bound == "+Inf" else float(bound)
+        return None
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Latency summary per task for the health endpoint"""
+        try:
+            if not self.redis_client or not self.job_manager.connection_healthy:
+                return {"status": "unavailable"}
+
+            summary = {}
+            for task_name, data in self._load().items():
+                row = {
+                    "outcomes": {
+                        field.split(":", 1)[1]: int(value)
+                        for field, value in data.items() if field.startswith("outcome:")
+                    },
+                    "retries": {
+                        field.split(":", 1)[1]: int(value)
+                        for field, value in data.items() if field.startswith("retries:")
+                    }
+                }
+                for histogram in HISTOGRAMS:
+                    count = int(data.get(f"{histogram}:count", 0))
+                    row[histogram] = {
+                        "count": count,
+                        "avg_seconds": round(data.get(f"{histogram}:sum", 0) / count, 3) if count else None,
+                        "p50_le_seconds": self._quantile(data, histogram, 0.5),
+                        "p95_le_seconds": self._quantile(data, histogram, 0.95),
+                        "p99_le_seconds": self._quantile(data, histogram, 0.99)
+                    }
+                summary[task_name] = row
+
+            return {"status": "ok", "buckets": LATENCY_BUCKETS, "tasks": summary}
+
+        except Exception as e:
+            logger.error(f"❌ Failed to build job latency summary: {e}")
+            return {"status": "error", "error": str(e)}
+
+    def export_prometheus(self) -> str:
+        """Render all task metrics in the Prometheus text exposition format"""
+        lines = []
+        tasks = self._load() if self.redis_client and self.job_manager.connection_healthy else {}
+
+        for histogram in HISTOGRAMS:
+            metric = f"ttpr_job_{histogram}_seconds"
+            lines.append(f"# HELP {metric} Job {histogram.replace('_', ' ')} in seconds")
+            lines.append(f"# TYPE {metric} histogram")
+            for task_name, data in tasks.items():
+                for bound, running in self._cumulative(data, histogram):
+                    lines.append(f'{metric}_bucket{{task="{task_name}",le="{bound}"}} {running}')
+                lines.append(f'{metric}_sum{{task="{task_name}"}} {data.get(f"{histogram}:sum", 0)}')
+                lines.append(f'{metric}_count{{task="{task_name}"}} {int(data.get(f"{histogram}:count", 0))}')
+
+        lines.append("# HELP ttpr_job_outcomes_total Finished jobs by outcome")
+        lines.append("# TYPE ttpr_job_outcomes_total counter")
+        for task_name, data in tasks.items():
+            for field, value in data.items():
+                if field.startswith("outcome:"):
+                    lines.append(f'ttpr_job_outcomes_total{{task="{task_name}",outcome="{field.split(":", 1)[1]}"}} {int(value)}')
+
+        lines.append("# HELP ttpr_job_retries_total Job retries and dead-letter replays")
+        lines.append("# TYPE ttpr_job_retries_total counter")
+        for task_name, data in tasks.items():
+            for field, value in data.items():
+                if field.startswith("retries:"):
+                    lines.append(f'ttpr_job_retries_total{{task="{task_name}",kind="{field.split(":", 1)[1]}"}} {int(value)}')
+
+        return "\n".join(lines) + "\n"
@@ -15,7 +15,7 @@ from .ab_test_routes import router as ab_test_router
 from .channel_routes import router as channel_router
 from .billing_routes import router as billing_router
 from .admin_routes import router as admin_router
-from .auth_dependencies import get_current_firebase_user, get_current_user_session
+from .auth_dependencies import get_current_firebase_user, get_current_user_session, get_current_user_bearer_or_session
 import logging
 import asyncio
 import requests
@@ -27,8 +27,6 @@ from jwt import PyJWKClient
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-processed_auth_codes = set()
-
 app = FastAPI(
     title="TitleTesterPro API",
     description="A SaaS platform for A/B testing YouTube titles - Render Deployment",
@@ -187,9 +185,6 @@ async def debug_cors_domains():
 async def firebase_auth(request: Request):
     """Handle Firebase ID token authentication with session creation"""
     from fastapi import Response
-    import secrets
-    import hashlib
-    from datetime import datetime, timedelta
     
     try:
         # Get token from both possible locations
@@ -267,14 +262,18 @@ async def firebase_auth(request: Request):
             db.commit()
             db.refresh(user)
         
-        # Create secure session token
-        session_token = secrets.token_urlsafe(32)
-        session_hash = hashlib.sha256(session_token.encode()).hexdigest()
-        
-        # Store session in user record (you might want a separate sessions table)
-        user.session_token = session_hash
-        user.session_expires = datetime.utcnow() + timedelta(days=7)  # 7 day session
-        db.commit()
+        # Create secure session token; one session per device
+        from .session_store import session_store, session_cookie_options
+        if settings.session_mode == "signed":
+            from .signed_sessions import signed_session_manager
+            session_token = signed_session_manager.issue(user)
+        else:
+            session_token = session_store.create(
+                db,
+                user,
+                user_agent=request.headers.get("user-agent"),
+                ip_address=request.client.host if request.client else None
+            )
         
         logger.info(f"[AUTH] Created session for user {user.id} ({user.email})")
         
@@ -294,29 +293,10 @@ async def firebase_auth(request: Request):
         response = JSONResponse(content=response_data)
         
         # Set production-grade session cookie with proper attributes
-        import os  # ensure imported at top if not already
-        
-        is_production = os.getenv("ENV", "").lower() in {"prod", "production"}
-        host = request.url.hostname or ""
-        is_ttp = host.endswith("titletesterpro.com")
-        
-        # Domain: only set on titletesterpro.com; keep host-only on Render
-        cookie_domain = ".titletesterpro.com" if is_ttp else None
-        
-        # SameSite: must be None in production so cross-site (Vercel → Render) works
-        cookie_samesite = "none" if is_production else "lax"
-        
-        response.set_cookie(
-            key="session_token",
-            value=session_token,
-            max_age=7 * 24 * 60 * 60,  # 7 days
-            httponly=True,
-            secure=is_production,
-            samesite=cookie_samesite,
-            domain=cookie_domain,
-        )
+        cookie_options = session_cookie_options(request)
+        response.set_cookie(key="session_token", value=session_token, **cookie_options)
         
-        logger.info(f"[AUTH] Session cookie set for user {user.id} - domain: {cookie_domain}, samesite: {cookie_samesite}")
+        logger.info(f"[AUTH] Session cookie set for user {user.id} - domain: {cookie_options['domain']}, samesite: {cookie_options['samesite']}")
         
         return response
         
@@ -325,13 +305,19 @@ async def firebase_auth(request: Request):
         raise HTTPException(status_code=401, detail="Authentication failed")
 
 @app.post("/api/auth/logout")
-async def logout(current_user: User = Depends(get_current_user_session), db: Session = Depends(get_db)):
+async def logout(request: Request, current_user: User = Depends(get_current_user_session), db: Session = Depends(get_db)):
     """Clear user session and log out"""
     try:
-        # Clear session from database
-        current_user.session_token = None
-        current_user.session_expires = None
-        db.commit()
+        # End this device's session only
+        session_token = request.cookies.get("session_token")
+        from .signed_sessions import signed_session_manager
+        if signed_session_manager.is_signed_token(session_token):
+            claims = signed_session_manager.verify(session_token)
+            if claims:
+                signed_session_manager.revoke(claims)
+        else:
+            from .session_store import session_store
+            session_store.revoke(db, session_token)
         
         logger.info(f"[AUTH] User {current_user.id} logged out")
         
@@ -735,6 +721,10 @@ async def startup_event():
     # Start Firebase init in background
     asyncio.create_task(init_firebase_async())
     
+    # Warm the ID token signing certificates so the first request verifies locally
+    from .firebase_token_verifier import firebase_token_verifier
+    asyncio.get_event_loop().run_in_executor(None, firebase_token_verifier.refresh)
+    
     # Initialize database with proper Render pattern
     async def init_database_async():
         try:
@@ -762,6 +752,12 @@ async def startup_event():
     app.state.startup_status["status"] = "healthy"
     logger.info("✅ App startup completed - health endpoints ready")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled outbound HTTP connections"""
+    from .google_token_refresh import google_token_refresher
+    await google_token_refresher.close()
+
 @app.get("/api/quota/usage")
 async def get_quota_usage(current_user: User = Depends(get_current_firebase_user), db: Session = Depends(get_db)):
     """Get current user's API quota usage"""
@@ -777,20 +773,23 @@ async def get_quota_usage(current_user: User = Depends(get_current_firebase_user
             QuotaUsage.date < today + timedelta(days=1)
         ).first()
         
-        if not quota_record:
-            return {
-                "quota_units_used": 0,
-                "daily_limit": 10000,
-                "percentage_used": 0.0
-            }
+        from .youtube_quota_manager import youtube_quota_manager
+        fair_share_report = youtube_quota_manager.scheduler.get_tenant_report(user_id=current_user.id)
+        fair_share = (fair_share_report.get("tenants") or [None])[0]
+        
+        # Include usage recorded since the last buffer flush
+        from .quota_usage_buffer import quota_usage_buffer
+        pending = quota_usage_buffer.get_pending(current_user.id, today.strftime('%Y-%m-%d'))
+        quota_units_used = (quota_record.quota_units_used if quota_record else 0) + pending.get("quota_units_used", 0)
         
         daily_limit = 10000
-        percentage_used = (quota_record.quota_units_used / daily_limit) * 100
+        percentage_used = (quota_units_used / daily_limit) * 100
         
         return {
-            "quota_units_used": quota_record.quota_units_used,
+            "quota_units_used": quota_units_used,
             "daily_limit": daily_limit,
-            "percentage_used": min(percentage_used, 100.0)
+            "percentage_used": min(percentage_used, 100.0),
+            "fair_share": fair_share
         }
         
     except Exception as e:
@@ -800,6 +799,49 @@ async def get_quota_usage(current_user: User = Depends(get_current_firebase_user
             detail="Failed to fetch quota usage"
         )
 
+@app.get("/api/quota/forecast")
+async def get_quota_forecast(current_user: User = Depends(get_current_firebase_user), db: Session = Depends(get_db)):
+    """Get the projected YouTube API quota curve for all active tests"""
+    from .quota_forecaster import quota_forecaster
+    
+    forecast = quota_forecaster.get_forecast(db)
+    if forecast.get("status") == "error":
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to build quota forecast"
+        )
+    return forecast
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_progress(
+    job_id: str,
+    request: Request,
+    last_event_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user_bearer_or_session)
+):
+    """Stream a job's status and progress as Server-Sent Events
+    
+    Browsers connect with EventSource (`withCredentials`), authenticated by
+    the session cookie; other clients can send the bearer token. Reconnecting
+    clients resume after the Last-Event-ID header (or the `last_event_id`
+    query parameter for clients that cannot set headers).
+    """
+    from fastapi.responses import StreamingResponse
+    from .job_manager import job_manager
+    from .job_events import stream_job_events
+    from .auth_dependencies import is_admin_user
+    
+    # Owners follow their own jobs; admins can follow system jobs too
+    metadata = job_manager.get_job_status(job_id)
+    if not metadata or (metadata.user_id != current_user.id and not is_admin_user(current_user)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    
+    return StreamingResponse(
+        stream_job_events(job_id, request.headers.get("last-event-id") or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 security = HTTPBearer()
 
 
@@ -1373,6 +1415,40 @@ def job_health():
             "message": "Job health check system failure"
         }
 
+@app.get("/health/jobs/latency")
+def job_latency():
+    """Queue wait and run time per task, with retry counts"""
+    from .job_manager import job_manager
+
+    return {
+        **job_manager.telemetry.get_summary(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@app.get("/health/token-refresh")
+async def token_refresh_health():
+    """Outcomes of proactive Google token refresh runs"""
+    from .google_token_refresh import google_token_refresher
+
+    return {
+        **(await google_token_refresher.get_stats()),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@app.get("/metrics/jobs")
+def job_metrics():
+    """Job latency metrics in the Prometheus text format"""
+    from fastapi.responses import PlainTextResponse
+    from .job_manager import job_manager
+
+    try:
+        body = job_manager.telemetry.export_prometheus()
+    except Exception as e:
+        logger.error(f"Job metrics export failed: {e}")
+        raise HTTPException(status_code=503, detail="Job metrics unavailable")
+
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 
 # Debug endpoints (TEMPORARY - only when FIREBASE_DEBUG=1)
 @app.get("/debug/firebase")
@@ -1436,18 +1512,20 @@ def handle_oauth_callback(
     db: Session = Depends(get_db)
 ):
     """Handle OAuth callback and exchange authorization code for tokens"""
+    from .auth_code_store import auth_code_store
+    code_claimed = False
     try:
         logger.info(f"OAuth callback received: code={request.authorization_code[:20]}..., redirect_uri={request.redirect_uri}")
         
-        if request.authorization_code in processed_auth_codes:
+        # Shared across workers so a code is exchanged only once
+        code_claimed = auth_code_store.claim(request.authorization_code)
+        if not code_claimed:
             logger.warning(f"Authorization code already processed, rejecting duplicate request")
             raise HTTPException(
                 status_code=400,
                 detail="Authorization code has already been used"
             )
         
-        processed_auth_codes.add(request.authorization_code)
-        
         # Write callback info to debug file
         with open("oauth_debug.txt", "w") as f:
             f.write(f"OAuth callback started\n")
@@ -1682,10 +1760,12 @@ def handle_oauth_callback(
             detail="Failed to communicate with Google OAuth servers"
         )
     except HTTPException:
-        processed_auth_codes.discard(request.authorization_code)
+        if code_claimed:
+            auth_code_store.release(request.authorization_code)
         raise
     except Exception as e:
-        processed_auth_codes.discard(request.authorization_code)
+        if code_claimed:
+            auth_code_store.release(request.authorization_code)
         logger.error(f"OAuth callback handling failed: {e}")
         logger.error(f"Exception type: {type(e).__name__}")
         logger.error(f"Exception args: {e.args}")
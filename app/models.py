@@ -1,15 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float, Index, event, inspect
+from sqlalchemy.orm import relationship, Session, object_session
 from sqlalchemy.sql import func
 from sqlalchemy.sql.expression import text
 from .database import Base
 from .database_utils import get_database_compatible_datetime
 import uuid
 from datetime import datetime, timedelta
-from cryptography.fernet import Fernet
 from .config import settings
+from .token_crypto import get_fernet, decrypted_token_cache
 import base64
-import hashlib
 import logging
 from typing import Optional
 
@@ -28,7 +27,7 @@ class User(Base):
     
     google_access_token = Column(Text)  # Encrypted
     google_refresh_token = Column(Text)  # Encrypted
-    token_expires_at = Column(DateTime)
+    token_expires_at = Column(DateTime, index=True)
     
     youtube_channel_id = Column(String)
     youtube_channel_title = Column(String)
@@ -55,13 +54,6 @@ class User(Base):
     ab_tests = relationship("ABTest", back_populates="user")
     youtube_channels = relationship("YouTubeChannel", back_populates="user")
     
-    @staticmethod
-    def _get_encryption_key() -> bytes:
-        """Generate encryption key from secret key"""
-        key_material = settings.secret_key.encode()
-        digest = hashlib.sha256(key_material).digest()
-        return base64.urlsafe_b64encode(digest)
-    
     @classmethod
     def _encrypt_token(cls, token: Optional[str]) -> Optional[str]:
         """Encrypt a token for secure storage"""
@@ -69,8 +61,7 @@ class User(Base):
             return None
         
         try:
-            fernet = Fernet(cls._get_encryption_key())
-            encrypted_token = fernet.encrypt(token.encode())
+            encrypted_token = get_fernet().encrypt(token.encode())
             return base64.urlsafe_b64encode(encrypted_token).decode()
         except Exception as e:
             logger.error(f"Token encryption failed: {e}")
@@ -86,9 +77,8 @@ class User(Base):
             return encrypted_token
         
         try:
-            fernet = Fernet(cls._get_encryption_key())
             decoded_token = base64.urlsafe_b64decode(encrypted_token.encode())
-            decrypted_token = fernet.decrypt(decoded_token)
+            decrypted_token = get_fernet().decrypt(decoded_token)
             return decrypted_token.decode()
         except Exception as e:
             logger.error(f"Token decryption failed: {e}")
@@ -106,6 +96,11 @@ class User(Base):
             self.token_expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
             self.updated_at = datetime.utcnow()
             
+            if access_token:
+                decrypted_token_cache.put(self.id, self.token_expires_at, access_token)
+            else:
+                decrypted_token_cache.discard(self.id)
+            
             logger.info(f"Updated OAuth tokens for user {self.id}")
             
         except Exception as e:
@@ -116,6 +111,11 @@ class User(Base):
         """Get decrypted Google access token"""
         logger.debug(f"Getting access token for user {self.id}")
         
+        # Same token as last time: skip the column load and the decryption
+        cached_token = decrypted_token_cache.get(self.id, self.token_expires_at)
+        if cached_token:
+            return cached_token
+        
         if not self.google_access_token:
             logger.warning(f"User {self.id} has no encrypted access token stored")
             return None
@@ -126,6 +126,7 @@ class User(Base):
         decrypted_token = self._decrypt_token(self.google_access_token)
         if decrypted_token:
             logger.debug(f"Successfully decrypted access token for user {self.id}")
+            decrypted_token_cache.put(self.id, self.token_expires_at, decrypted_token)
         else:
             logger.error(f"Failed to decrypt access token for user {self.id}")
             
@@ -161,22 +162,36 @@ class User(Base):
         self.google_refresh_token = None
         self.token_expires_at = None
         self.updated_at = datetime.utcnow()
+        decrypted_token_cache.discard(self.id)
         
         logger.info(f"Cleared OAuth tokens for user {self.id}")
     
+    def _has_stored_token(self, column: str) -> bool:
+        """Whether an encrypted token is stored, answered from the cached snapshot when possible
+        
+        Users served by the user resolver carry which tokens were present when
+        the snapshot was taken, so this check does not load the encrypted
+        columns. Expiring token_expires_at (as a token refresh does) falls back
+        to the columns.
+        """
+        presence = getattr(self, "_token_presence", None)
+        if presence is not None and column not in self.__dict__ and "token_expires_at" in self.__dict__:
+            return presence.get(column, False)
+        return getattr(self, column) is not None
+    
     def has_valid_tokens(self) -> bool:
         """Check if user has valid, non-expired tokens"""
         return (
-            self.google_access_token is not None and 
-            self.google_refresh_token is not None and 
+            self._has_stored_token("google_access_token") and 
+            self._has_stored_token("google_refresh_token") and 
             not self.is_token_expired()
         )
     
     def needs_token_refresh(self) -> bool:
         """Check if tokens need to be refreshed"""
         return (
-            self.google_refresh_token is not None and 
-            (self.google_access_token is None or self.is_token_expired())
+            self._has_stored_token("google_refresh_token") and 
+            (not self._has_stored_token("google_access_token") or self.is_token_expired())
         )
     
     def to_dict(self) -> dict:
@@ -197,6 +212,22 @@ class User(Base):
         }
 
 
+class UserSession(Base):
+    __tablename__ = "sessions"
+    
+    token_hash = Column(String, primary_key=True)  # SHA-256 of the session cookie
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    expires_at = Column(DateTime, nullable=False, index=True)
+    last_seen_at = Column(DateTime)
+    
+    # Device metadata, so users can tell their sessions apart
+    user_agent = Column(String)
+    ip_address = Column(String)
+    
+    created_at = Column(DateTime, server_default=get_database_compatible_datetime())
+
+
 class ABTest(Base):
     __tablename__ = "ab_tests"
     
@@ -297,6 +328,10 @@ class YouTubeChannel(Base):
 
 class QuotaUsage(Base):
     __tablename__ = "quota_usage"
+    __table_args__ = (
+        # One row per user and day; buffered flushes upsert into it
+        Index("ix_quota_usage_user_id_date", "user_id", "date", unique=True),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
@@ -310,3 +345,61 @@ class QuotaUsage(Base):
     
     created_at = Column(DateTime, server_default=get_database_compatible_datetime())
     updated_at = Column(DateTime, server_default=get_database_compatible_datetime(), onupdate=get_database_compatible_datetime())
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    """Invalidate cached user snapshots whenever a user row is written"""
+    from .user_resolver import user_resolver
+    user_resolver.invalidate(target.id)
+    
+    # Invalidate again on commit so snapshots read mid-transaction are dropped too
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+def _mark_claims_changed(target):
+    """Reissue the user's signed session tokens once the write is committed"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_claims_user_ids", set()).add(target.id)
+    else:
+        from .signed_sessions import signed_session_manager
+        signed_session_manager.bump_claims_version(target.id)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_changed_claims(mapper, connection, target):
+    """Signed session tokens carry the plan, so a plan change makes them stale"""
+    from .signed_sessions import CLAIM_CHANGE_COLUMNS
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in CLAIM_CHANGE_COLUMNS):
+        _mark_claims_changed(target)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_claims(mapper, connection, target):
+    _mark_claims_changed(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    changed_user_ids = session.info.pop("changed_user_ids", None)
+    if changed_user_ids:
+        from .user_resolver import user_resolver
+        for user_id in changed_user_ids:
+            user_resolver.invalidate(user_id)
+    
+    changed_claims_user_ids = session.info.pop("changed_claims_user_ids", None)
+    if changed_claims_user_ids:
+        from .signed_sessions import signed_session_manager
+        for user_id in changed_claims_user_ids:
+            signed_session_manager.bump_claims_version(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_user_ids", None)
+    session.info.pop("changed_claims_user_ids", None)
@@ -0,0 +1,192 @@
+"""
+Degraded-Mode Quota Accounting
+Keeps enforcing a per-worker share of the YouTube quota while Redis is unavailable
+"""
+
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+from datetime import datetime
+
+from .config import settings
+from .quota_scheduler import DEFAULT_PLAN
+
+logger = logging.getLogger(__name__)
+
+class DegradedQuotaAccountant:
+    """In-process quota accountant used while the central Redis counters are down
+
+    Each worker gets an equal share of the daily quota that was still remaining
+    the last time Redis answered, spends against it locally and journals every
+    unit it spends. When Redis comes back the journal is merged into the
+    central counters so no consumption is lost.
+    """
+
+    def __init__(self, quota_manager):
+        self.quota_manager = quota_manager
+        self.worker_count = max(1, settings.quota_fallback_workers)
+        self._lock = threading.Lock()
+
+        # (day, user_id) -> units spent while degraded and not yet reconciled
+        self.journal: Dict[Tuple[str, Optional[str]], int] = {}
+
+        self.degraded_since: Optional[datetime] = None
+        self.budget_day: Optional[str] = None
+        self.daily_budget = 0
+        self.daily_used = 0
+        self.rate_window: Optional[int] = None
+        self.rate_used = 0
+        self.last_known_usage: Tuple[Optional[str], int] = (None, 0)
+
+    @property
+    def active(self) -> bool:
+        return self.degraded_since is not None
+
+    def remember_usage(self, day: str, usage: int):
+        """Remember the latest central daily usage to size the fallback budget"""
+        self.last_known_usage = (day, usage)
+
+    def _ensure_budget(self, current_time: datetime):
+        """Size this worker's share when entering degraded mode or on day rollover"""
+        day = current_time.strftime('%Y-%m-%d')
+        if self.budget_day == day:
+            return
+
+        known_day, known_usage = self.last_known_usage
+        used = known_usage if known_day == day else 0
+        remaining = max(0, self.quota_manager.quota_limits.daily_limit - used)
+
+        self.budget_day = day
+        self.daily_budget = remaining // self.worker_count
+        self.daily_used = 0
+
+        if self.degraded_since is None:
+            self.degraded_since = current_time
+            logger.warning(
+                f"⚠️ Quota accounting degraded: enforcing local share of {self.daily_budget} units "
+                f"({remaining} remaining / {self.worker_count} workers)"
+            )
+
+    def check(self, cost: int, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Check an operation against this worker's share"""
+        with self._lock:
+            current_time = datetime.utcnow()
+            self._ensure_budget(current_time)
+
+            if self.daily_used + cost > self.daily_budget:
+                return {
+                    "allowed": False,
+                    "reason": "daily_quota_exceeded",
+                    "current_usage": self.daily_used,
+                    "limit": self.daily_budget,
+                    "cost": cost,
+                    "degraded": True
+                }
+
+            window = int(current_time.timestamp() // 100)
+            if self.rate_window != window:
+                self.rate_window = window
+                self.rate_used = 0
+
+            rate_limit = self.quota_manager.quota_limits.per_100_seconds_limit // self.worker_count
+            if self.rate_used + cost > rate_limit:
+                return {
+                    "allowed": False,
+                    "reason": "rate_limit_exceeded",
+                    "current_usage": self.rate_used,
+                    "limit": rate_limit,
+                    "cost": cost,
+                    "retry_after": 100,
+                    "degraded": True
+                }
+
+            return {
+                "allowed": True,
+                "reason": "degraded_local_quota",
+                "cost": cost,
+                "daily_remaining": self.daily_budget - (self.daily_used + cost),
+                "degraded": True
+            }
+
+    def record(self, cost: int, user_id: Optional[str] = None):
+        """Spend units locally and journal them for reconciliation"""
+        with self._lock:
+            current_time = datetime.utcnow()
+            self._ensure_budget(current_time)
+
+            window = int(current_time.timestamp() // 100)
+            if self.rate_window != window:
+                self.rate_window = window
+                self.rate_used = 0
+
+            self.daily_used += cost
+            self.rate_used += cost
+
+            entry = (self.budget_day, user_id)
+            self.journal[entry] = self.journal.get(entry, 0) + cost
+
+    def reconcile(self) -> Dict[str, Any]:
+        """Merge the local journal into the central Redis counters"""
+        with self._lock:
+            if not self.journal:
+                self._reset()
+                return {"reconciled_units": 0, "entries": 0}
+
+            redis_client = self.quota_manager.redis_client
+            scheduler = self.quota_manager.scheduler
+            prefix = self.quota_manager.quota_key_prefix
+
+            try:
+                daily_totals: Dict[str, int] = {}
+                pipe = redis_client.pipeline()
+
+                for (day, user_id), units in self.journal.items():
+                    daily_totals[day] = daily_totals.get(day, 0) + units
+                    if user_id:
+                        pipe.hincrby(scheduler._usage_key(day), user_id, units)
+                        pipe.expire(scheduler._usage_key(day), 86400 * 2)
+                        pipe.hsetnx(scheduler._tenants_key(day), user_id, DEFAULT_PLAN)
+                        pipe.expire(scheduler._tenants_key(day), 86400 * 2)
+
+                for day, units in daily_totals.items():
+                    daily_key = f"{prefix}:daily:{day}"
+                    pipe.incrby(daily_key, units)
+                    pipe.expire(daily_key, 86400)
+
+                pipe.execute()
+
+                result = {
+                    "reconciled_units": sum(daily_totals.values()),
+                    "entries": len(self.journal),
+                    "days": daily_totals,
+                    "degraded_since": self.degraded_since.isoformat() if self.degraded_since else None
+                }
+                logger.info(f"✅ Reconciled {result['reconciled_units']} quota units journaled while degraded")
+
+                self.journal = {}
+                self._reset()
+                return result
+
+            except Exception as e:
+                # Keep the journal; the quota manager stays degraded and retries the merge
+                logger.error(f"❌ Quota journal reconciliation failed: {e}")
+                return {"error": str(e), "pending_units": sum(self.journal.values())}
+
+    def _reset(self):
+        self.degraded_since = None
+        self.budget_day = None
+        self.daily_budget = 0
+        self.daily_used = 0
+        self.rate_window = None
+        self.rate_used = 0
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get degraded-mode accounting status"""
+        return {
+            "active": self.active,
+            "degraded_since": self.degraded_since.isoformat() if self.degraded_since else None,
+            "worker_count": self.worker_count,
+            "local_budget": self.daily_budget,
+            "local_used": self.daily_used,
+            "pending_reconciliation_units": sum(self.journal.values())
+        }
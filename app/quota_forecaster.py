@@ -0,0 +1,225 @@
+"""
+YouTube Quota Forecasting and Test Admission
+Projects quota consumption from the rotation schedule of every active test
+"""
+
+import logging
+import math
+from typing import Dict, Any, Optional, Iterable
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from .models import ABTest
+from .youtube_quota_manager import youtube_quota_manager, QuotaLimitType
+
+logger = logging.getLogger(__name__)
+
+class AdmissionDecision:
+    ADMIT = "admit"
+    DEFER = "defer"
+    REJECT = "reject"
+
+class QuotaForecaster:
+    """Projects hourly and per-day quota demand and admits, defers or rejects tests"""
+
+    def __init__(self, quota_manager=None):
+        self.quota_manager = quota_manager or youtube_quota_manager
+        self.horizon_hours = 48
+        self.safety_ratio = 0.9  # Keep 10% of the daily quota free for interactive calls
+
+    @property
+    def rotation_cost(self) -> int:
+        """Quota units spent by one rotation (videos.list + videos.update)"""
+        costs = self.quota_manager.api_costs
+        return costs.videos_update + costs.videos_list
+
+    @property
+    def daily_budget(self) -> int:
+        return int(self.quota_manager.quota_limits.daily_limit * self.safety_ratio)
+
+    @staticmethod
+    def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            return value.replace(tzinfo=None) - (value.utcoffset() or timedelta(0))
+        return value
+
+    def _rotation_times(self, started_at: datetime, duration_hours: int, interval_hours: int,
+                        now: datetime, horizon_end: datetime) -> Iterable[datetime]:
+        """Yield the remaining rotation instants of a test inside the horizon"""
+        interval = timedelta(hours=max(1, interval_hours or 1))
+        ends_at = started_at + timedelta(hours=duration_hours or 0)
+
+        # First rotation strictly after now
+        elapsed = max(timedelta(0), now - started_at)
+        k = math.floor(elapsed / interval) + 1
+        rotation_at = started_at + interval * k
+
+        while rotation_at < ends_at and rotation_at < horizon_end:
+            yield rotation_at
+            rotation_at += interval
+
+    def _empty_curve(self, now: datetime, hours: int) -> Dict[datetime, int]:
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        return {hour_start + timedelta(hours=h): 0 for h in range(hours)}
+
+    def _add_schedule(self, curve: Dict[datetime, int], started_at: datetime, duration_hours: int,
+                      interval_hours: int, now: datetime):
+        horizon_end = max(curve) + timedelta(hours=1)
+
+        for rotation_at in self._rotation_times(started_at, duration_hours, interval_hours, now, horizon_end):
+            bucket = rotation_at.replace(minute=0, second=0, microsecond=0)
+            if bucket in curve:
+                curve[bucket] += self.rotation_cost
+
+    def _project_active_tests(self, db: Session, now: datetime, hours: int) -> Dict[datetime, int]:
+        """Hourly projected demand from all active tests"""
+        curve = self._empty_curve(now, hours)
+
+        active_tests = db.query(
+            ABTest.started_at,
+            ABTest.test_duration_hours,
+            ABTest.rotation_interval_hours
+        ).filter(
+            ABTest.status == "active",
+            ABTest.started_at.isnot(None)
+        ).all()
+
+        for started_at, duration_hours, interval_hours in active_tests:
+            self._add_schedule(curve, self._naive_utc(started_at), duration_hours, interval_hours, now)
+
+        return curve
+
+    def _daily_totals(self, curve: Dict[datetime, int], now: datetime, current_usage: int) -> Dict[str, int]:
+        """Fold the hourly curve into per-day totals, seeding today with actual usage"""
+        totals = {now.strftime('%Y-%m-%d'): current_usage}
+        for bucket, units in curve.items():
+            day = bucket.strftime('%Y-%m-%d')
+            totals[day] = totals.get(day, 0) + units
+        return totals
+
+    def _current_usage(self) -> int:
+        return self.quota_manager._get_quota_usage(QuotaLimitType.DAILY)
+
+    def get_forecast(self, db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Build the projected quota curve and estimated exhaustion time"""
+        try:
+            now = now or datetime.utcnow()
+            current_usage = self._current_usage()
+            daily_limit = self.quota_manager.quota_limits.daily_limit
+
+            curve = self._project_active_tests(db, now, self.horizon_hours)
+
+            points = []
+            exhaustion_at = None
+            running_day = now.strftime('%Y-%m-%d')
+            cumulative = current_usage
+
+            for bucket in sorted(curve):
+                day = bucket.strftime('%Y-%m-%d')
+                if day != running_day:
+                    running_day = day
+                    cumulative = 0
+                cumulative += curve[bucket]
+
+                if exhaustion_at is None and cumulative > daily_limit:
+                    exhaustion_at = bucket
+
+                points.append({
+                    "hour": bucket.isoformat(),
+                    "projected_units": curve[bucket],
+                    "cumulative_day_units": cumulative,
+                    "percentage_of_daily_limit": round(cumulative / daily_limit * 100, 2)
+                })
+
+            return {
+                "generated_at": now.isoformat(),
+                "horizon_hours": self.horizon_hours,
+                "daily_limit": daily_limit,
+                "admission_budget": self.daily_budget,
+                "current_usage": current_usage,
+                "rotation_cost": self.rotation_cost,
+                "daily_totals": self._daily_totals(curve, now, current_usage),
+                "projected_exhaustion_at": exhaustion_at.isoformat() if exhaustion_at else None,
+                "hours_until_exhaustion": round((exhaustion_at - now).total_seconds() / 3600, 1) if exhaustion_at else None,
+                "curve": points
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Quota forecast failed: {e}")
+            return {"status": "error", "error": str(e)}
+
+    def _test_demand_per_day(self, duration_hours: int, interval_hours: int) -> int:
+        """Worst-case quota units a single test needs in one UTC day"""
+        rotations_per_day = math.ceil(min(24, duration_hours) / max(1, interval_hours))
+        return rotations_per_day * self.rotation_cost
+
+    def evaluate_admission(self, db: Session, duration_hours: int, interval_hours: int,
+                           start_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Decide whether a test starting at `start_at` fits the projected quota"""
+        try:
+            now = datetime.utcnow()
+            start_at = self._naive_utc(start_at) or now
+
+            peak_demand = self._test_demand_per_day(duration_hours, interval_hours)
+            if peak_demand > self.daily_budget:
+                return {
+                    "decision": AdmissionDecision.REJECT,
+                    "reason": "test_exceeds_daily_quota",
+                    "test_daily_demand": peak_demand,
+                    "daily_budget": self.daily_budget
+                }
+
+            # Projected load only falls as tests finish, so a candidate start is
+            # safe when every day up to one day after it stays within budget.
+            # Project two days past the horizon so those days are complete.
+            baseline = self._project_active_tests(db, now, self.horizon_hours + 48)
+            current_usage = self._current_usage()
+
+            # Try the requested start, then each later hour inside the horizon
+            for offset in range(self.horizon_hours):
+                candidate_start = start_at + timedelta(hours=offset)
+                curve = dict(baseline)
+                # The start itself performs one rotation immediately
+                bucket = candidate_start.replace(minute=0, second=0, microsecond=0)
+                if bucket in curve:
+                    curve[bucket] += self.rotation_cost
+                self._add_schedule(curve, candidate_start, duration_hours, interval_hours, now)
+
+                last_day = (candidate_start + timedelta(days=1)).strftime('%Y-%m-%d')
+                totals = {
+                    day: units for day, units in self._daily_totals(curve, now, current_usage).items()
+                    if day <= last_day
+                }
+                worst_day = max(totals, key=totals.get)
+
+                if totals[worst_day] <= self.daily_budget:
+                    if offset == 0:
+                        return {
+                            "decision": AdmissionDecision.ADMIT,
+                            "projected_peak_day": worst_day,
+                            "projected_peak_units": totals[worst_day],
+                            "daily_budget": self.daily_budget
+                        }
+                    return {
+                        "decision": AdmissionDecision.DEFER,
+                        "reason": "projected_quota_exhaustion",
+                        "earliest_start": candidate_start.isoformat(),
+                        "retry_after": int((candidate_start - now).total_seconds()),
+                        "daily_budget": self.daily_budget
+                    }
+
+            return {
+                "decision": AdmissionDecision.REJECT,
+                "reason": "no_capacity_in_forecast_horizon",
+                "horizon_hours": self.horizon_hours,
+                "daily_budget": self.daily_budget
+            }
+
+        except Exception as e:
+            # Admission control must never take test management down
+            logger.error(f"❌ Quota admission check failed: {e}")
+            return {"decision": AdmissionDecision.ADMIT, "reason": "forecast_error", "error": str(e)}
+
+# Global forecaster instance
+quota_forecaster = QuotaForecaster()
@@ -0,0 +1,270 @@
+"""
+Weighted Fair-Share Quota Scheduling
+Divides the shared YouTube project quota between tenants by subscription plan
+"""
+
+import heapq
+import logging
+from typing import Dict, List, Any, Optional, Callable, TypeVar
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Relative share of the daily quota per subscription plan
+PLAN_WEIGHTS = {
+    "free": 1,
+    "starter": 2,
+    "professional": 4,
+    "enterprise": 8
+}
+
+DEFAULT_PLAN = "free"
+
+class FairShareQuotaScheduler:
+    """Weighted fair queuing of quota-consuming work across tenants
+
+    Every tenant that consumes quota today is registered with the weight of its
+    subscription plan. Its entitlement is its weighted slice of the daily limit
+    among the active tenants. A tenant may go beyond its entitlement into
+    headroom the others are not expected to need: each other tenant keeps back
+    what it would still spend today at its pace so far, up to its unused
+    entitlement, and the share of idle tenants is free to borrow.
+    """
+
+    def __init__(self, quota_manager):
+        self.quota_manager = quota_manager
+
+    @property
+    def redis_client(self):
+        return self.quota_manager.redis_client
+
+    @property
+    def healthy(self) -> bool:
+        return bool(self.redis_client) and self.quota_manager.connection_healthy
+
+    def _day(self, current_time: Optional[datetime] = None) -> str:
+        return (current_time or datetime.utcnow()).strftime('%Y-%m-%d')
+
+    def _tenants_key(self, day: str) -> str:
+        return f"{self.quota_manager.quota_key_prefix}:tenants:{day}"
+
+    def _usage_key(self, day: str) -> str:
+        return f"{self.quota_manager.quota_key_prefix}:tenant_usage:{day}"
+
+    @staticmethod
+    def get_plan_weight(plan: Optional[str]) -> int:
+        """Get scheduling weight for a subscription plan"""
+        return PLAN_WEIGHTS.get((plan or DEFAULT_PLAN).lower(), PLAN_WEIGHTS[DEFAULT_PLAN])
+
+    def register_tenant(self, user_id: str, plan: Optional[str] = None):
+        """Mark a tenant as active today with its subscription plan"""
+        try:
+            if not self.healthy or not user_id:
+                return
+
+            key = self._tenants_key(self._day())
+            pipe = self.redis_client.pipeline()
+            pipe.hset(key, user_id, (plan or DEFAULT_PLAN).lower())
+            pipe.expire(key, 86400 * 2)
+            pipe.execute()
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to register quota tenant {user_id}: {e}")
+
+    def record_usage(self, user_id: str, cost: int):
+        """Add consumed units to a tenant's daily counter"""
+        try:
+            if not self.healthy or not user_id:
+                return
+
+            day = self._day()
+            pipe = self.redis_client.pipeline()
+            pipe.hincrby(self._usage_key(day), user_id, cost)
+            pipe.expire(self._usage_key(day), 86400 * 2)
+            # Tenants seen only through usage still count as active
+            pipe.hsetnx(self._tenants_key(day), user_id, DEFAULT_PLAN)
+            pipe.expire(self._tenants_key(day), 86400 * 2)
+            pipe.execute()
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to record tenant usage for {user_id}: {e}")
+
+    def _load_day(self, day: str) -> Dict[str, Dict[str, Any]]:
+        """Load plan and usage for every active tenant on a day"""
+        pipe = self.redis_client.pipeline()
+        pipe.hgetall(self._tenants_key(day))
+        pipe.hgetall(self._usage_key(day))
+        raw_tenants, raw_usage = pipe.execute()
+
+        tenants: Dict[str, Dict[str, Any]] = {}
+        for raw_user_id, raw_plan in raw_tenants.items():
+            user_id = raw_user_id.decode() if isinstance(raw_user_id, bytes) else raw_user_id
+            plan = raw_plan.decode() if isinstance(raw_plan, bytes) else raw_plan
+            tenants[user_id] = {"plan": plan, "weight": self.get_plan_weight(plan), "used": 0}
+
+        for raw_user_id, raw_used in raw_usage.items():
+            user_id = raw_user_id.decode() if isinstance(raw_user_id, bytes) else raw_user_id
+            tenant = tenants.setdefault(
+                user_id,
+                {"plan": DEFAULT_PLAN, "weight": self.get_plan_weight(DEFAULT_PLAN), "used": 0}
+            )
+            tenant["used"] = int(raw_used)
+
+        return tenants
+
+    def _compute_entitlements(self, tenants: Dict[str, Dict[str, Any]]):
+        """Attach each tenant's weighted slice of the daily limit"""
+        daily_limit = self.quota_manager.quota_limits.daily_limit
+        total_weight = sum(t["weight"] for t in tenants.values()) or 1
+
+        for tenant in tenants.values():
+            tenant["entitlement"] = daily_limit * tenant["weight"] / total_weight
+
+    @staticmethod
+    def _expected_demand(tenant: Dict[str, Any], current_time: datetime) -> float:
+        """Units a tenant is expected to spend for the rest of the day"""
+        elapsed = (current_time - current_time.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds()
+        remaining = timedelta(days=1).total_seconds() - elapsed
+        # The first hour's pace is too noisy to extrapolate from
+        pace = tenant["used"] / max(elapsed, 3600.0)
+        return min(pace * remaining, max(0.0, tenant["entitlement"] - tenant["used"]))
+
+    def check_tenant_allowance(self, user_id: str, cost: int, daily_usage: int) -> Dict[str, Any]:
+        """Check whether a tenant may spend `cost` units under fair sharing"""
+        try:
+            if not self.healthy or not user_id:
+                return {"allowed": True, "reason": "fair_share_unavailable"}
+
+            current_time = datetime.utcnow()
+            tenants = self._load_day(self._day(current_time))
+            tenants.setdefault(
+                user_id,
+                {"plan": DEFAULT_PLAN, "weight": self.get_plan_weight(DEFAULT_PLAN), "used": 0}
+            )
+            self._compute_entitlements(tenants)
+
+            tenant = tenants[user_id]
+            if tenant["used"] + cost <= tenant["entitlement"]:
+                return {"allowed": True, "within_entitlement": True}
+
+            # Borrowing: only from headroom the other tenants are not expected to use
+            reserved_for_others = sum(
+                self._expected_demand(other, current_time)
+                for other_id, other in tenants.items()
+                if other_id != user_id
+            )
+            daily_limit = self.quota_manager.quota_limits.daily_limit
+            if daily_usage + cost + reserved_for_others <= daily_limit:
+                return {"allowed": True, "within_entitlement": False, "borrowed": True}
+
+            return {
+                "allowed": False,
+                "reason": "tenant_share_exceeded",
+                "current_usage": tenant["used"],
+                "limit": int(tenant["entitlement"]),
+                "cost": cost,
+                "user_id": user_id
+            }
+
+        except Exception as e:
+            logger.warning(f"⚠️ Fair-share check failed for {user_id}: {e}")
+            return {"allowed": True, "reason": "fair_share_error", "error": str(e)}
+
+    def order_by_fair_share(self, items: List[T], tenant_of: Callable[[T], str],
+                            plan_of: Callable[[T], Optional[str]],
+                            cost_of: Callable[[T], int]) -> List[T]:
+        """Order work items by weighted fair queuing virtual finish time
+
+        A tenant's virtual clock starts at its consumption today divided by its
+        weight and advances by cost / weight for every item it is served, so
+        heavier plans are served proportionally more often and a tenant that has
+        already burnt through its share goes to the back of the line.
+        """
+        if len(items) < 2:
+            return list(items)
+
+        try:
+            usage = {}
+            if self.healthy:
+                usage = {user_id: t["used"] for user_id, t in self._load_day(self._day()).items()}
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to load tenant usage for scheduling: {e}")
+            usage = {}
+
+        queues: Dict[str, List[T]] = {}
+        weights: Dict[str, int] = {}
+        for item in items:
+            tenant_id = tenant_of(item)
+            queues.setdefault(tenant_id, []).append(item)
+            weights.setdefault(tenant_id, self.get_plan_weight(plan_of(item)))
+
+        virtual_time = {tenant_id: usage.get(tenant_id, 0) / weights[tenant_id] for tenant_id in queues}
+        positions = {tenant_id: 0 for tenant_id in queues}
+
+        heap = []
+        for order, tenant_id in enumerate(queues):
+            head = queues[tenant_id][0]
+            finish = virtual_time[tenant_id] + cost_of(head) / weights[tenant_id]
+            heap.append((finish, order, tenant_id))
+        heapq.heapify(heap)
+
+        ordered: List[T] = []
+        while heap:
+            finish, order, tenant_id = heapq.heappop(heap)
+            ordered.append(queues[tenant_id][positions[tenant_id]])
+            virtual_time[tenant_id] = finish
+            positions[tenant_id] += 1
+
+            if positions[tenant_id] < len(queues[tenant_id]):
+                head = queues[tenant_id][positions[tenant_id]]
+                heapq.heappush(heap, (finish + cost_of(head) / weights[tenant_id], order, tenant_id))
+
+        return ordered
+
+    def get_tenant_report(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Report consumption versus entitlement per tenant for today"""
+        try:
+            current_time = datetime.utcnow()
+
+            if not self.healthy:
+                return {"status": "unavailable", "timestamp": current_time.isoformat()}
+
+            tenants = self._load_day(self._day(current_time))
+            self._compute_entitlements(tenants)
+
+            daily_limit = self.quota_manager.quota_limits.daily_limit
+            total_weight = sum(t["weight"] for t in tenants.values())
+
+            report = []
+            for tenant_id, tenant in tenants.items():
+                if user_id and tenant_id != user_id:
+                    continue
+                entitlement = tenant["entitlement"]
+                report.append({
+                    "user_id": tenant_id,
+                    "plan": tenant["plan"],
+                    "weight": tenant["weight"],
+                    "share_percentage": round(tenant["weight"] / total_weight * 100, 2) if total_weight else 0.0,
+                    "entitlement": int(entitlement),
+                    "used": tenant["used"],
+                    "remaining_entitlement": max(0, int(entitlement) - tenant["used"]),
+                    "borrowed": max(0, tenant["used"] - int(entitlement)),
+                    "percentage_of_entitlement": round(tenant["used"] / entitlement * 100, 2) if entitlement else 0.0
+                })
+
+            report.sort(key=lambda row: row["used"], reverse=True)
+
+            return {
+                "status": "ok",
+                "daily_limit": daily_limit,
+                "active_tenants": len(tenants),
+                "total_used": sum(t["used"] for t in tenants.values()),
+                "tenants": report,
+                "timestamp": current_time.isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Failed to build tenant quota report: {e}")
+            return {"status": "error", "error": str(e)}
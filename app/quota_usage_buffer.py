@@ -0,0 +1,307 @@
+"""
+Buffered Quota Usage Accounting
+Aggregates per-call quota increments and flushes them to QuotaUsage in batches
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional, Tuple
+from datetime import datetime
+
+import redis
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import QuotaUsage
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("api_calls_count", "quota_units_used", "videos_list_calls", "videos_update_calls")
+
+class QuotaUsageBuffer:
+    """Aggregates quota increments in Redis hashes and flushes them periodically
+
+    Every API call becomes a couple of HINCRBYs on a per-(day, user) hash
+    instead of a Celery job and a read-modify-write transaction. The flush task
+    drains the dirty (day, user) pairs and upserts one row per pair inside a
+    single transaction. If Redis is unavailable increments are aggregated in
+    process and flushed from the recording worker itself.
+    """
+
+    def __init__(self):
+        self.redis_client: Optional[redis.Redis] = None
+        self.key_prefix = "ttpr:quota_buffer"
+        self.dirty_key = f"{self.key_prefix}:dirty"
+        self.lock_key = f"{self.key_prefix}:flush_lock"
+        self.flush_interval = settings.quota_flush_interval_seconds
+        self.batch_size = 500
+
+        self._local_lock = threading.Lock()
+        self._local_buffer: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._last_local_flush = time.time()
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        if self.redis_client is None and settings.redis_url:
+            self.redis_client = redis.from_url(
+                settings.redis_url,
+                socket_timeout=5,
+                socket_connect_timeout=5,
+                retry_on_timeout=True
+            )
+        return self.redis_client
+
+    def _hash_key(self, day: str, user_id: str) -> str:
+        return f"{self.key_prefix}:{day}|{user_id}"
+
+    @staticmethod
+    def _increments(api_call_type: str, quota_units: int) -> Dict[str, int]:
+        increments = {"api_calls_count": 1, "quota_units_used": quota_units}
+        if api_call_type == "videos_list":
+            increments["videos_list_calls"] = 1
+        elif api_call_type == "videos_update":
+            increments["videos_update_calls"] = 1
+        return increments
+
+    def record(self, user_id: str, api_call_type: str, quota_units: int):
+        """Aggregate one API call's quota usage"""
+        if not user_id:
+            return
+
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        increments = self._increments(api_call_type, quota_units)
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                pipe = client.pipeline(transaction=False)
+                key = self._hash_key(day, user_id)
+                for field, amount in increments.items():
+                    pipe.hincrby(key, field, amount)
+                pipe.expire(key, 86400 * 3)
+                pipe.sadd(self.dirty_key, f"{day}|{user_id}")
+                pipe.execute()
+                return
+        except Exception as e:
+            logger.warning(f"⚠️ Quota buffer Redis unavailable, aggregating in process: {e}")
+
+        self._record_local(day, user_id, increments)
+
+    def _record_local(self, day: str, user_id: str, increments: Dict[str, int]):
+        with self._local_lock:
+            counters = self._local_buffer.setdefault((day, user_id), dict.fromkeys(COUNTER_FIELDS, 0))
+            for field, amount in increments.items():
+                counters[field] += amount
+
+            due = time.time() - self._last_local_flush >= self.flush_interval
+
+        if due:
+            self._flush_local_buffer()
+
+    def _flush_local_buffer(self):
+        """Flush the in-process buffer from the worker that holds it"""
+        locked = self._acquire_flush_lock()
+        with self._local_lock:
+            self._last_local_flush = time.time()
+            if locked is False:
+                # Another worker is flushing; try again next interval
+                return
+            pending = self._local_buffer
+            self._local_buffer = {}
+
+        try:
+            if not pending:
+                return
+            from .database_manager import db_manager
+            with db_manager.get_db_session() as db:
+                self._write_batch(db, pending)
+        except Exception as e:
+            logger.error(f"❌ Local quota buffer flush failed, keeping counters: {e}")
+            self._restore_local(pending)
+        finally:
+            if locked:
+                self._release_flush_lock()
+
+    def _restore_local(self, pending: Dict[Tuple[str, str], Dict[str, int]]):
+        """Put counters taken from the in-process buffer back after a failed write"""
+        with self._local_lock:
+            for entry, counters in pending.items():
+                merged = self._local_buffer.setdefault(entry, dict.fromkeys(COUNTER_FIELDS, 0))
+                for field, amount in counters.items():
+                    merged[field] += amount
+
+    def _acquire_flush_lock(self) -> Optional[bool]:
+        """Take the flush lock shared by every worker; None when Redis is unreachable
+
+        Without Redis flushes go ahead unlocked: the upsert keeps concurrent
+        writers from inserting the same (user, day) row twice.
+        """
+        try:
+            client = self._get_redis()
+            if client is None:
+                return None
+            return bool(client.set(self.lock_key, "1", nx=True, ex=max(60, self.flush_interval * 2)))
+        except Exception as e:
+            # The client connects lazily, so an outage surfaces here
+            logger.warning(f"⚠️ Quota buffer Redis unavailable for flush: {e}")
+            return None
+
+    def _release_flush_lock(self):
+        try:
+            self.redis_client.delete(self.lock_key)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to release quota flush lock: {e}")
+
+    def _drain_redis(self, client: redis.Redis) -> Dict[Tuple[str, str], Dict[str, int]]:
+        """Atomically take a batch of dirty (day, user) counters out of Redis"""
+        members = client.spop(self.dirty_key, self.batch_size) or []
+        if not members:
+            return {}
+
+        pipe = client.pipeline(transaction=True)
+        entries = []
+        for member in members:
+            member = member.decode() if isinstance(member, bytes) else member
+            day, user_id = member.split("|", 1)
+            key = self._hash_key(day, user_id)
+            pipe.hgetall(key)
+            pipe.delete(key)
+            entries.append((day, user_id))
+        results = pipe.execute()
+
+        drained = {}
+        for index, entry in enumerate(entries):
+            raw = results[index * 2]
+            if not raw:
+                continue
+            drained[entry] = {
+                (field.decode() if isinstance(field, bytes) else field): int(value)
+                for field, value in raw.items()
+            }
+        return drained
+
+    def _restore_redis(self, client: redis.Redis, drained: Dict[Tuple[str, str], Dict[str, int]]):
+        """Put drained counters back after a failed database write"""
+        pipe = client.pipeline(transaction=False)
+        for (day, user_id), counters in drained.items():
+            key = self._hash_key(day, user_id)
+            for field, amount in counters.items():
+                pipe.hincrby(key, field, amount)
+            pipe.expire(key, 86400 * 3)
+            pipe.sadd(self.dirty_key, f"{day}|{user_id}")
+        pipe.execute()
+
+    @staticmethod
+    def _insert(db: Session):
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(QuotaUsage)
+        if dialect == "sqlite":
+            return sqlite.insert(QuotaUsage)
+        raise RuntimeError(f"Quota usage upsert is not supported on {dialect}")
+
+    def _write_batch(self, db: Session, batch: Dict[Tuple[str, str], Dict[str, int]]) -> int:
+        """Add aggregated counters to each (user, day) row in one upsert
+
+        INSERT ... ON CONFLICT DO UPDATE on the (user_id, date) unique index,
+        so concurrent flushes add to the same row instead of racing to create it.
+        """
+        if not batch:
+            return 0
+
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "date": datetime.strptime(day, '%Y-%m-%d'),
+                **{field: counters.get(field, 0) for field in COUNTER_FIELDS}
+            }
+            for (day, user_id), counters in batch.items()
+        ]
+
+        statement = self._insert(db).values(rows)
+        columns = QuotaUsage.__table__.c
+        statement = statement.on_conflict_do_update(
+            index_elements=[columns.user_id, columns.date],
+            set_={
+                **{field: func.coalesce(columns[field], 0) + statement.excluded[field] for field in COUNTER_FIELDS},
+                "updated_at": func.now()
+            }
+        )
+        db.execute(statement)
+        db.commit()
+        return len(rows)
+
+    def flush(self, db: Session) -> Dict[str, Any]:
+        """Flush all buffered counters to QuotaUsage"""
+        flushed_rows = 0
+        flushed_units = 0
+
+        # Only one flusher at a time, on both the Redis and in-process paths
+        locked = self._acquire_flush_lock()
+        if locked is False:
+            return {"status": "skipped", "reason": "flush_in_progress"}
+
+        try:
+            if locked:
+                client = self.redis_client
+                while True:
+                    drained = self._drain_redis(client)
+                    if not drained:
+                        break
+                    try:
+                        flushed_rows += self._write_batch(db, drained)
+                        flushed_units += sum(c.get("quota_units_used", 0) for c in drained.values())
+                    except Exception:
+                        db.rollback()
+                        self._restore_redis(client, drained)
+                        raise
+
+            with self._local_lock:
+                pending = self._local_buffer
+                self._local_buffer = {}
+                self._last_local_flush = time.time()
+            if pending:
+                try:
+                    flushed_rows += self._write_batch(db, pending)
+                except Exception:
+                    db.rollback()
+                    self._restore_local(pending)
+                    raise
+                flushed_units += sum(c.get("quota_units_used", 0) for c in pending.values())
+        finally:
+            if locked:
+                self._release_flush_lock()
+
+        return {
+            "status": "flushed",
+            "rows_written": flushed_rows,
+            "quota_units": flushed_units,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    def get_pending(self, user_id: str, day: Optional[str] = None) -> Dict[str, int]:
+        """Get counters recorded for a user but not yet flushed"""
+        day = day or datetime.utcnow().strftime('%Y-%m-%d')
+        pending = dict.fromkeys(COUNTER_FIELDS, 0)
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                for field, value in client.hgetall(self._hash_key(day, user_id)).items():
+                    field = field.decode() if isinstance(field, bytes) else field
+                    pending[field] = pending.get(field, 0) + int(value)
+        except Exception as e:
+            logger.debug(f"Pending quota lookup failed: {e}")
+
+        with self._local_lock:
+            for field, value in self._local_buffer.get((day, user_id), {}).items():
+                pending[field] += value
+
+        return pending
+
+# Global quota usage buffer
+quota_usage_buffer = QuotaUsageBuffer()
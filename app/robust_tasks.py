@@ -10,26 +10,39 @@ import asyncio
 import time
 import json
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from celery import current_app
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import OperationalError
 
-from .job_manager import robust_task, get_database_session, job_manager, JobStatus
-from .models import ABTest, TitleRotation, QuotaUsage, User
+from .job_manager import robust_task, get_database_session, job_manager, JobStatus, JobPriority, JobSubmission
+from .models import ABTest, TitleRotation, User
 from .youtube_api import YouTubeAPIClient
+from .youtube_quota_manager import youtube_quota_manager, QuotaExceededException
+from .quota_usage_buffer import quota_usage_buffer
+from .rotation_queue import deferred_rotation_queue, GLOBAL_REFUSALS
 from .database_manager import retry_on_database_error
+from .google_token_refresh import google_token_refresher, TOKEN_COLUMNS
+from .config import settings
 
 logger = logging.getLogger(__name__)
 
 @current_app.task(bind=True)
 @robust_task(max_retries=3, retry_delay=60.0)
 def rotate_titles_robust(self, job_id: str = None):
-    """Robust title rotation with comprehensive error handling"""
+    """Plan due title rotations and fan them out as one job per tenant"""
     logger.info(f"🔄 Starting robust title rotation job {job_id}")
     
     try:
+        # While the shared quota is exhausted every rotation would be refused,
+        # so skip the run entirely until the window resets
+        exhausted_until = deferred_rotation_queue.get_exhausted_until()
+        if exhausted_until:
+            logger.info(f"⏸️ Quota exhausted until {exhausted_until.isoformat()}, skipping rotation run")
+            return {"rotated_count": 0, "message": "Quota exhausted", "resumes_at": exhausted_until.isoformat()}
+        
         with get_database_session() as db:
             active_tests = _get_active_tests_safely(db)
             
@@ -37,53 +50,163 @@ def rotate_titles_robust(self, job_id: str = None):
                 logger.info("No active tests found for rotation")
                 return {"rotated_count": 0, "message": "No active tests"}
             
-            rotation_results = []
-            successful_rotations = 0
+            # Serve tenants in weighted fair-share order so one large account
+            # cannot drain the shared daily quota ahead of everyone else
+            active_tests = youtube_quota_manager.scheduler.order_by_fair_share(
+                active_tests,
+                tenant_of=lambda test: test.user_id,
+                plan_of=lambda test: test.user.subscription_plan if test.user else None,
+                cost_of=lambda test: youtube_quota_manager.api_costs.videos_update
+            )
             
-            for test in active_tests:
-                try:
-                    if job_id:
-                        progress = successful_rotations / len(active_tests)
-                        job_manager.update_job_status(job_id, JobStatus.RUNNING, progress=progress)
-                    
-                    result = _perform_robust_title_rotation(db, test)
-                    rotation_results.append({
-                        "test_id": test.id,
-                        "status": "success" if result else "skipped",
-                        "result": result
-                    })
-                    
-                    if result:
-                        successful_rotations += 1
-                        
-                except Exception as e:
-                    logger.error(f"❌ Rotation failed for test {test.id}: {e}")
-                    rotation_results.append({
-                        "test_id": test.id,
-                        "status": "error",
-                        "error": str(e)
-                    })
+            # Rotations released after a quota reset go first, in release
+            # order; tests still parked are left alone until their turn
+            deferred = deferred_rotation_queue.partition([test.id for test in active_tests])
+            tests_by_id = {test.id: test for test in active_tests}
+            released = [tests_by_id[test_id] for test_id in deferred["released"]]
+            active_tests = released + [
+                test for test in active_tests
+                if test.id not in deferred["parked"] and test.id not in deferred["released"]
+            ]
             
-            db.commit()
-            
-            result_summary = {
-                "total_tests": len(active_tests),
-                "successful_rotations": successful_rotations,
-                "results": rotation_results,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            
-            logger.info(f"✅ Title rotation completed: {successful_rotations}/{len(active_tests)} successful")
-            return result_summary
+            # One job per tenant, queued in the fair-share order of its first due test
+            test_ids_by_tenant: Dict[str, List[str]] = {}
+            for test in _due_tests(db, active_tests):
+                test_ids_by_tenant.setdefault(test.user_id, []).append(test.id)
+        
+        job_ids = job_manager.submit_many([
+            JobSubmission(
+                "app.robust_tasks.rotate_tenant_titles_robust",
+                kwargs={"user_id": user_id, "test_ids": test_ids},
+                priority=JobPriority.HIGH
+            )
+            for user_id, test_ids in test_ids_by_tenant.items()
+        ])
+        
+        result_summary = {
+            "total_tests": len(active_tests),
+            "due_tests": sum(len(test_ids) for test_ids in test_ids_by_tenant.values()),
+            "tenant_jobs": dict(zip(test_ids_by_tenant, job_ids)),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        unscheduled = sum(1 for scheduled in job_ids if scheduled is None)
+        if unscheduled:
+            logger.warning(f"⚠️ {unscheduled} tenant rotation jobs could not be queued; they are retried next run")
+        logger.info(f"✅ Title rotation planned: {result_summary['due_tests']} due tests across {len(job_ids)} tenants")
+        return result_summary
             
     except Exception as e:
         logger.error(f"❌ Title rotation job failed: {e}")
         raise
 
+@current_app.task(bind=True)
+@robust_task(max_retries=3, retry_delay=60.0)
+def rotate_tenant_titles_robust(self, user_id: str, test_ids: List[str], job_id: str = None):
+    """Rotate one tenant's due tests, in the order they were planned"""
+    # The tests stay due, so the first run after the reset plans them again
+    exhausted_until = deferred_rotation_queue.get_exhausted_until()
+    if exhausted_until:
+        return {"rotated_count": 0, "message": "Quota exhausted", "resumes_at": exhausted_until.isoformat()}
+    
+    with get_database_session() as db:
+        tests_by_id = {
+            test.id: test
+            for test in db.query(ABTest).filter(
+                ABTest.id.in_(test_ids),
+                ABTest.user_id == user_id,
+                ABTest.status == "active"
+            ).all()
+        }
+        tests = [tests_by_id[test_id] for test_id in test_ids if test_id in tests_by_id]
+        
+        result_summary = _rotate_tests(db, tests, job_id)
+        db.commit()
+    
+    logger.info(
+        f"✅ Title rotation for user {user_id}: "
+        f"{result_summary['successful_rotations']}/{result_summary['total_tests']} successful"
+    )
+    return result_summary
+
+def _due_tests(db: Session, tests: List[ABTest]) -> List[ABTest]:
+    """Keep the tests whose rotation interval has elapsed, with one query"""
+    if not tests:
+        return []
+    
+    last_started = dict(
+        db.query(TitleRotation.ab_test_id, func.max(TitleRotation.started_at))
+        .filter(TitleRotation.ab_test_id.in_([test.id for test in tests]))
+        .group_by(TitleRotation.ab_test_id)
+        .all()
+    )
+    now = datetime.utcnow()
+    return [
+        test for test in tests
+        if last_started.get(test.id) is None
+        or (now - last_started[test.id]).total_seconds() >= test.rotation_interval_hours * 3600
+    ]
+
+def _rotate_tests(db: Session, tests: List[ABTest], job_id: str = None) -> Dict[str, Any]:
+    """Rotate tests in order, parking the rest of a tenant's tests once it is refused"""
+    rotation_results = []
+    successful_rotations = 0
+    refused_tenants: Dict[str, str] = {}  # tenant -> refusal reason
+    
+    for index, test in enumerate(tests):
+        try:
+            if test.user_id in refused_tenants:
+                # Park with the tenant's own refusal so it resumes when that window resets
+                reason = refused_tenants[test.user_id]
+                deferred_rotation_queue.defer(test.id, reason)
+                rotation_results.append({"test_id": test.id, "status": "deferred", "reason": reason})
+                continue
+            
+            if job_id:
+                progress = successful_rotations / len(tests)
+                job_manager.update_job_status(job_id, JobStatus.RUNNING, progress=progress)
+            
+            result = _perform_robust_title_rotation(db, test)
+            rotation_results.append({
+                "test_id": test.id,
+                "status": "success" if result else "skipped",
+                "result": result
+            })
+            
+            if result:
+                successful_rotations += 1
+        
+        except QuotaExceededException as e:
+            deferred_rotation_queue.defer(test.id, e.reason)
+            rotation_results.append({"test_id": test.id, "status": "deferred", "reason": e.reason})
+            
+            if e.reason in GLOBAL_REFUSALS:
+                # Nothing else can run before the reset either
+                for remaining in tests[index + 1:]:
+                    deferred_rotation_queue.defer(remaining.id, e.reason)
+                    rotation_results.append({"test_id": remaining.id, "status": "deferred", "reason": e.reason})
+                break
+            refused_tenants[test.user_id] = e.reason
+                
+        except Exception as e:
+            logger.error(f"❌ Rotation failed for test {test.id}: {e}")
+            rotation_results.append({
+                "test_id": test.id,
+                "status": "error",
+                "error": str(e)
+            })
+    
+    return {
+        "total_tests": len(tests),
+        "successful_rotations": successful_rotations,
+        "results": rotation_results,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 @retry_on_database_error(max_retries=3)
 def _get_active_tests_safely(db: Session) -> List[ABTest]:
     """Safely get active tests with database retry logic"""
-    return db.query(ABTest).filter(
+    return db.query(ABTest).options(joinedload(ABTest.user)).filter(
         ABTest.status == "active",
         ABTest.started_at.isnot(None)
     ).all()
@@ -101,6 +224,15 @@ def _perform_robust_title_rotation(db: Session, test: ABTest) -> Dict[str, Any]:
             logger.error(f"User not found for test {test.id}")
             return None
         
+        # Check the user's fair share of the quota before touching the rotation
+        youtube_quota_manager.scheduler.register_tenant(user.id, user.subscription_plan)
+        quota_check = youtube_quota_manager.check_quota_available("videos_update", user.id)
+        if not quota_check["allowed"]:
+            raise QuotaExceededException(
+                f"Quota refused for test {test.id}: {quota_check['reason']}",
+                reason=quota_check["reason"]
+            )
+        
         access_token = user.get_google_access_token()
         if not access_token:
             logger.error(f"No access token for user {user.id}")
@@ -128,6 +260,7 @@ def _perform_robust_title_rotation(db: Session, test: ABTest) -> Dict[str, Any]:
             return None
         
         # Update quota usage
+        youtube_quota_manager.record_quota_usage("videos_update", user.id)
         _update_quota_usage_safely(user.id, "videos_update", 50)
         
         # Update test variant index
@@ -171,19 +304,15 @@ def _is_rotation_due(db: Session, test: ABTest) -> bool:
 def _attempt_token_refresh(db: Session, user: User) -> bool:
     """Attempt to refresh user's Google tokens"""
     try:
-        from .auth_manager import auth_manager
-        
-        refresh_token = user.get_google_refresh_token()
-        if not refresh_token:
+        if not user.google_refresh_token:
             logger.error(f"No refresh token for user {user.id}")
             return False
         
-        new_tokens = auth_manager.refresh_google_token(refresh_token)
-        user.set_google_tokens(
-            access_token=new_tokens.get("access_token"),
-            refresh_token=new_tokens.get("refresh_token", refresh_token)
-        )
-        db.commit()
+        access_token = google_token_refresher.refresh_blocking(user.id)
+        # The refresher stored the new token; reload it on next access
+        db.expire(user, TOKEN_COLUMNS)
+        if not access_token:
+            return False
         
         logger.info(f"✅ Refreshed tokens for user {user.id}")
         return True
@@ -282,14 +411,10 @@ def _create_new_rotation_record(test: ABTest, variant_index: int, title: str, ac
 def _update_quota_usage_safely(user_id: str, api_call_type: str, quota_units: int):
     """Update quota usage with error handling"""
     try:
-        # Submit as a separate job to avoid blocking main task
-        job_manager.submit_job(
-            "app.robust_tasks.update_quota_usage_robust",
-            args=[user_id, api_call_type, quota_units],
-            priority=job_manager.JobPriority.LOW
-        )
+        # Aggregated in Redis and written by flush_quota_usage_robust
+        quota_usage_buffer.record(user_id, api_call_type, quota_units)
     except Exception as e:
-        logger.warning(f"⚠️ Failed to submit quota update job: {e}")
+        logger.warning(f"⚠️ Failed to buffer quota usage: {e}")
 
 @current_app.task(bind=True)
 @robust_task(max_retries=3, retry_delay=30.0)
@@ -326,6 +451,7 @@ def cleanup_completed_tests_robust(self, job_id: str = None):
                         test.status = "completed"
                         test.completed_at = now
                         completed_count += 1
+                        deferred_rotation_queue.discard(test.id)
                         
                         logger.info(f"✅ Completed test {test.id}")
                         
@@ -352,41 +478,49 @@ def cleanup_completed_tests_robust(self, job_id: str = None):
 def update_quota_usage_robust(self, user_id: str, api_call_type: str, quota_units: int, job_id: str = None):
     """Robust quota usage update"""
     try:
-        with get_database_session() as db:
-            today = datetime.utcnow().date()
-            
-            quota_record = db.query(QuotaUsage).filter(
-                QuotaUsage.user_id == user_id,
-                QuotaUsage.date >= today,
-                QuotaUsage.date < today + timedelta(days=1)
-            ).first()
-            
-            if not quota_record:
-                quota_record = QuotaUsage(
-                    user_id=user_id,
-                    date=datetime.utcnow(),
-                    api_calls_count=0,
-                    quota_units_used=0,
-                    videos_list_calls=0,
-                    videos_update_calls=0
-                )
-                db.add(quota_record)
-            
-            quota_record.api_calls_count = (quota_record.api_calls_count or 0) + 1
-            quota_record.quota_units_used = (quota_record.quota_units_used or 0) + quota_units
-            
-            if api_call_type == "videos_list":
-                quota_record.videos_list_calls = (quota_record.videos_list_calls or 0) + 1
-            elif api_call_type == "videos_update":
-                quota_record.videos_update_calls = (quota_record.videos_update_calls or 0) + 1
+        quota_usage_buffer.record(user_id, api_call_type, quota_units)
+        
+        logger.info(f"✅ Buffered quota usage for user {user_id}: +{quota_units} units")
+        return {"user_id": user_id, "quota_units": quota_units, "api_call_type": api_call_type}
             
-            db.commit()
+    except Exception as e:
+        logger.error(f"❌ Quota usage update failed: {e}")
+        raise
+
+@current_app.task(bind=True)
+@robust_task(max_retries=2, retry_delay=30.0)
+def flush_quota_usage_robust(self, job_id: str = None):
+    """Flush buffered quota counters into quota_usage"""
+    try:
+        with get_database_session() as db:
+            result = quota_usage_buffer.flush(db)
             
-            logger.info(f"✅ Updated quota usage for user {user_id}: +{quota_units} units")
-            return {"user_id": user_id, "quota_units": quota_units, "api_call_type": api_call_type}
+            if result.get("rows_written"):
+                logger.info(f"✅ Flushed quota usage: {result['rows_written']} rows, {result['quota_units']} units")
+            return result
             
     except Exception as e:
-        logger.error(f"❌ Quota usage update failed: {e}")
+        logger.error(f"❌ Quota usage flush failed: {e}")
+        raise
+
+@current_app.task(bind=True)
+@robust_task(max_retries=1, retry_delay=60.0)
+def refresh_expiring_tokens_robust(self, job_id: str = None):
+    """Refresh Google tokens about to expire so requests never wait on Google"""
+    try:
+        result = google_token_refresher.run_blocking(google_token_refresher.refresh_expiring(
+            window_seconds=settings.token_refresh_window_seconds,
+            batch_size=settings.token_refresh_batch_size,
+            concurrency=settings.token_refresh_concurrency,
+            rate_per_second=settings.token_refresh_rate_per_second
+        ))
+        
+        if result["candidates"]:
+            logger.info(f"✅ Proactive token refresh: {result}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"❌ Proactive token refresh failed: {e}")
         raise
 
 @current_app.task(bind=True)
@@ -396,15 +530,13 @@ def recover_failed_jobs(self, job_id: str = None):
     logger.info(f"🔧 Starting job recovery task {job_id}")
     
     try:
-        stats = job_manager.get_job_statistics()
-        recovery_count = 0
-        
-        # Logic to identify and retry failed jobs would go here
-        # For now, just return statistics
+        recovery = job_manager.recover_jobs()
+        recovery_count = recovery.get("replayed", 0) + recovery.get("dead_letter_replayed", 0)
         
         result = {
             "recovery_count": recovery_count,
-            "job_statistics": stats,
+            "recovery": recovery,
+            "job_statistics": job_manager.get_job_statistics(),
             "timestamp": datetime.utcnow().isoformat()
         }
         
@@ -426,32 +558,17 @@ def cleanup_old_job_metadata(self, job_id: str = None):
             logger.warning("⚠️ Redis not available for cleanup")
             return {"status": "skipped", "reason": "redis_unavailable"}
         
-        # Clean up job metadata older than 7 days
-        cutoff_date = datetime.utcnow() - timedelta(days=7)
-        cleaned_count = 0
-        
-        pattern = f"{job_manager.job_metadata_key}:*"
-        for key in job_manager.redis_client.scan_iter(match=pattern):
-            try:
-                data = job_manager.redis_client.get(key)
-                if data:
-                    job_data = json.loads(data)
-                    created_at = datetime.fromisoformat(job_data.get('created_at', ''))
-                    
-                    if created_at < cutoff_date:
-                        job_manager.redis_client.delete(key)
-                        cleaned_count += 1
-                        
-            except Exception as e:
-                logger.warning(f"⚠️ Error processing job metadata key {key}: {e}")
+        # Expire job metadata past the TTL via the created-at index
+        expiry = job_manager.expire_old_jobs()
         
         result = {
-            "cleaned_count": cleaned_count,
-            "cutoff_date": cutoff_date.isoformat(),
+            "cleaned_count": expiry.get("expired_jobs", 0),
+            "dead_letter_trimmed": expiry.get("dead_letter_trimmed", 0),
+            "cutoff_date": expiry.get("cutoff_date"),
             "timestamp": datetime.utcnow().isoformat()
         }
         
-        logger.info(f"✅ Job metadata cleanup completed: {cleaned_count} entries removed")
+        logger.info(f"✅ Job metadata cleanup completed: {result['cleaned_count']} jobs, {result['dead_letter_trimmed']} dead letters removed")
         return result
         
     except Exception as e:
@@ -0,0 +1,181 @@
+"""
+Deferred Title Rotation Queue
+Parks rotations refused for quota until the quota window resets
+"""
+
+import calendar
+import logging
+from typing import Dict, List, Any, Optional, Set
+from datetime import datetime
+
+import redis
+
+from .config import settings
+from .youtube_quota_manager import youtube_quota_manager, QuotaLimitType
+
+logger = logging.getLogger(__name__)
+
+# Quota refusal reason -> window whose reset releases the rotation
+REFUSAL_WINDOWS = {
+    "daily_quota_exceeded": QuotaLimitType.DAILY,
+    "tenant_share_exceeded": QuotaLimitType.DAILY,
+    "rate_limit_exceeded": QuotaLimitType.PER_100_SECONDS,
+    "user_rate_limit_exceeded": QuotaLimitType.PER_USER_100_SECONDS
+}
+
+# Refusals that apply to every tenant, so the whole rotation run can stop
+GLOBAL_REFUSALS = {"daily_quota_exceeded", "rate_limit_exceeded"}
+
+class DeferredRotationQueue:
+    """Sorted set of test IDs scored by the time their rotation may run again
+
+    A refused rotation is parked with the estimated reset time of the quota
+    window that refused it, staggered by `release_spacing` seconds per
+    rotation already waiting on that reset so released work is paced. A
+    global refusal also closes a gate until the reset so the beat task does
+    no database or Redis work per test while the quota is exhausted.
+    """
+
+    def __init__(self, quota_manager=None):
+        self.quota_manager = quota_manager or youtube_quota_manager
+        self.redis_client: Optional[redis.Redis] = None
+        self.queue_key = "ttpr:deferred_rotations"
+        self.gate_key = "ttpr:deferred_rotations:exhausted_until"
+        self.release_spacing = 2  # seconds between released rotations
+        self.release_batch_size = 25  # released rotations per beat tick
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        if self.redis_client is None and settings.redis_url:
+            self.redis_client = redis.from_url(
+                settings.redis_url,
+                socket_timeout=5,
+                socket_connect_timeout=5,
+                retry_on_timeout=True
+            )
+        return self.redis_client
+
+    @staticmethod
+    def _timestamp(value: datetime) -> int:
+        return calendar.timegm(value.utctimetuple())
+
+    def get_exhausted_until(self) -> Optional[datetime]:
+        """Get the reset time while a global quota refusal is in effect"""
+        try:
+            client = self._get_redis()
+            if client is None:
+                return None
+
+            raw = client.get(self.gate_key)
+            if raw is None:
+                return None
+
+            reset_ts = int(raw)
+            if reset_ts <= self._timestamp(datetime.utcnow()):
+                return None
+            return datetime.utcfromtimestamp(reset_ts)
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to read quota exhaustion gate: {e}")
+            return None
+
+    def defer(self, test_id: str, reason: Optional[str]) -> Optional[datetime]:
+        """Park a refused rotation until its quota window resets"""
+        try:
+            client = self._get_redis()
+            if client is None:
+                return None
+
+            limit_type = REFUSAL_WINDOWS.get(reason, QuotaLimitType.DAILY)
+            reset_at = self.quota_manager.get_estimated_reset_time(limit_type)
+            reset_ts = self._timestamp(reset_at)
+
+            # Stagger behind rotations already waiting on the same reset
+            waiting = client.zcount(self.queue_key, reset_ts, "+inf")
+            release_ts = reset_ts + waiting * self.release_spacing
+
+            pipe = client.pipeline()
+            pipe.zadd(self.queue_key, {test_id: release_ts}, nx=True)
+            if reason in GLOBAL_REFUSALS:
+                pipe.set(self.gate_key, reset_ts)
+                pipe.expireat(self.gate_key, reset_ts)
+            pipe.execute()
+
+            logger.info(f"⏸️ Deferred rotation for test {test_id} until {datetime.utcfromtimestamp(release_ts).isoformat()} ({reason})")
+            return datetime.utcfromtimestamp(release_ts)
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to defer rotation for test {test_id}: {e}")
+            return None
+
+    def partition(self, test_ids: List[str]) -> Dict[str, Any]:
+        """Split tests into released, still parked and not deferred
+
+        Up to `release_batch_size` due rotations are removed from the queue and
+        returned in release order; the rest stay parked for later ticks.
+        """
+        try:
+            client = self._get_redis()
+            if client is None:
+                return {"released": [], "parked": set()}
+
+            now_ts = self._timestamp(datetime.utcnow())
+
+            due = [
+                member.decode() if isinstance(member, bytes) else member
+                for member in client.zrangebyscore(
+                    self.queue_key, "-inf", now_ts, start=0, num=self.release_batch_size
+                )
+            ]
+            if due:
+                client.zrem(self.queue_key, *due)
+
+            parked: Set[str] = {
+                member.decode() if isinstance(member, bytes) else member
+                for member in client.zrangebyscore(self.queue_key, "-inf", "+inf")
+            }
+
+            candidates = set(test_ids)
+            return {
+                "released": [test_id for test_id in due if test_id in candidates],
+                "parked": parked & candidates
+            }
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to read deferred rotations: {e}")
+            return {"released": [], "parked": set()}
+
+    def discard(self, test_id: str):
+        """Drop a test from the queue, e.g. when it is no longer active"""
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.zrem(self.queue_key, test_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to discard deferred rotation {test_id}: {e}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get deferred rotation queue status"""
+        try:
+            client = self._get_redis()
+            if client is None:
+                return {"status": "unavailable"}
+
+            now_ts = self._timestamp(datetime.utcnow())
+            next_release = client.zrange(self.queue_key, 0, 0, withscores=True)
+            exhausted_until = self.get_exhausted_until()
+
+            return {
+                "status": "ok",
+                "deferred": client.zcard(self.queue_key),
+                "due": client.zcount(self.queue_key, "-inf", now_ts),
+                "next_release_at": datetime.utcfromtimestamp(next_release[0][1]).isoformat() if next_release else None,
+                "quota_exhausted_until": exhausted_until.isoformat() if exhausted_until else None,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get deferred rotation status: {e}")
+            return {"status": "error", "error": str(e)}
+
+# Global deferred rotation queue
+deferred_rotation_queue = DeferredRotationQueue()
@@ -0,0 +1,234 @@
+"""
+Session Store
+Cookie sessions in a dedicated table with a Redis read-through cache and
+batched sliding expiry, allowing one session per device
+"""
+
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
+
+import redis
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import User, UserSession
+
+logger = logging.getLogger(__name__)
+
+def session_cookie_options(request) -> Dict[str, Any]:
+    """Cookie attributes for the session cookie on this request's host"""
+    is_production = os.getenv("ENV", "").lower() in {"prod", "production"}
+    host = request.url.hostname or ""
+    is_ttp = host.endswith("titletesterpro.com")
+    
+    return {
+        "max_age": 7 * 24 * 60 * 60,  # 7 days
+        "httponly": True,
+        "secure": is_production,
+        # SameSite: must be None in production so cross-site (Vercel → Render) works
+        "samesite": "none" if is_production else "lax",
+        # Domain: only set on titletesterpro.com; keep host-only on Render
+        "domain": ".titletesterpro.com" if is_ttp else None
+    }
+
+class SessionStore:
+    """Creates, resolves and revokes cookie sessions
+
+    A resolved session is cached in Redis until it expires (capped at
+    `cache_ttl`), so most requests read no session row. Activity is recorded
+    in process and written back by whichever request finds the
+    `touch_interval` elapsed, as one UPDATE sliding every active session's
+    expiry forward.
+    """
+
+    def __init__(self):
+        self.redis_client: Optional[redis.Redis] = None
+        self.key_prefix = "ttpr:session"
+        self.session_lifetime = timedelta(days=7)
+        self.cache_ttl = 3600
+        self.negative_cache_ttl = 30
+        self.touch_interval = 300  # seconds between activity flushes
+        self.max_sessions_per_user = 10
+
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._last_flush = time.time()
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        if self.redis_client is None and settings.redis_url:
+            self.redis_client = redis.from_url(
+                settings.redis_url,
+                socket_timeout=2,
+                socket_connect_timeout=2,
+                retry_on_timeout=True
+            )
+        return self.redis_client
+
+    @staticmethod
+    def hash_token(session_token: str) -> str:
+        return hashlib.sha256(session_token.encode()).hexdigest()
+
+    def _cache_key(self, token_hash: str) -> str:
+        return f"{self.key_prefix}:{token_hash}"
+
+    def _cache(self, token_hash: str, entry: Optional[Dict[str, Any]], ttl: int):
+        try:
+            client = self._get_redis()
+            if client is not None and ttl > 0:
+                client.set(self._cache_key(token_hash), json.dumps(entry), ex=ttl)
+        except Exception as e:
+            logger.debug(f"Session cache write failed: {e}")
+
+    def create(self, db: Session, user: User, user_agent: Optional[str] = None,
+               ip_address: Optional[str] = None) -> str:
+        """Start a new session for the user and return the cookie value"""
+        session_token = secrets.token_urlsafe(32)
+        token_hash = self.hash_token(session_token)
+        now = datetime.utcnow()
+
+        db.add(UserSession(
+            token_hash=token_hash,
+            user_id=user.id,
+            expires_at=now + self.session_lifetime,
+            last_seen_at=now,
+            user_agent=(user_agent or "")[:512] or None,
+            ip_address=ip_address
+        ))
+        db.flush()
+
+        # Keep the newest sessions per user; older devices are signed out
+        stale = [
+            row.token_hash for row in db.query(UserSession.token_hash)
+            .filter(UserSession.user_id == user.id)
+            .order_by(UserSession.last_seen_at.desc())
+            .offset(self.max_sessions_per_user)
+            .all()
+        ]
+        if stale:
+            db.query(UserSession).filter(UserSession.token_hash.in_(stale)).delete(synchronize_session=False)
+        db.commit()
+
+        if stale:
+            self._evict(stale)
+
+        self._cache(token_hash, {
+            "user_id": user.id,
+            "firebase_uid": user.firebase_uid,
+            "expires_at": (now + self.session_lifetime).isoformat()
+        }, self.cache_ttl)
+        return session_token
+
+    def resolve(self, db: Session, session_token: str) -> Optional[Dict[str, Any]]:
+        """Get {user_id, firebase_uid, expires_at} for a live session"""
+        token_hash = self.hash_token(session_token)
+        now = datetime.utcnow()
+
+        entry = None
+        try:
+            client = self._get_redis()
+            raw = client.get(self._cache_key(token_hash)) if client is not None else None
+            if raw is not None:
+                entry = json.loads(raw)
+                if entry is None:
+                    return None  # Recently looked up and not found
+        except Exception as e:
+            logger.debug(f"Session cache read failed: {e}")
+
+        if entry is None:
+            row = db.query(UserSession.user_id, UserSession.expires_at, User.firebase_uid).join(
+                User, User.id == UserSession.user_id
+            ).filter(
+                UserSession.token_hash == token_hash,
+                UserSession.expires_at > now
+            ).first()
+
+            if row is None:
+                self._cache(token_hash, None, self.negative_cache_ttl)
+                return None
+
+            entry = {"user_id": row.user_id, "firebase_uid": row.firebase_uid, "expires_at": row.expires_at.isoformat()}
+            remaining = int((row.expires_at - now).total_seconds())
+            self._cache(token_hash, entry, min(self.cache_ttl, remaining))
+
+        if datetime.fromisoformat(entry["expires_at"]) <= now:
+            return None
+
+        self._touch(token_hash)
+        return entry
+
+    def _touch(self, token_hash: str):
+        with self._lock:
+            self._touched[token_hash] = time.time()
+            due = time.time() - self._last_flush >= self.touch_interval
+            if due:
+                touched = list(self._touched)
+                self._touched = {}
+                self._last_flush = time.time()
+
+        if due:
+            self.flush_activity(touched)
+
+    def flush_activity(self, token_hashes) -> int:
+        """Slide the expiry of recently used sessions in one statement"""
+        if not token_hashes:
+            return 0
+
+        try:
+            from .database_manager import db_manager
+            now = datetime.utcnow()
+            with db_manager.get_db_session() as db:
+                updated = db.query(UserSession).filter(
+                    UserSession.token_hash.in_(token_hashes),
+                    UserSession.expires_at > now
+                ).update({
+                    UserSession.last_seen_at: now,
+                    UserSession.expires_at: now + self.session_lifetime
+                }, synchronize_session=False)
+
+                # Expired sessions are never read again
+                db.query(UserSession).filter(UserSession.expires_at <= now).delete(synchronize_session=False)
+
+            logger.debug(f"🔄 Extended {updated} active sessions")
+            return updated
+
+        except Exception as e:
+            logger.warning(f"⚠️ Session activity flush failed: {e}")
+            return 0
+
+    def _evict(self, token_hashes):
+        try:
+            client = self._get_redis()
+            if client is not None and token_hashes:
+                client.delete(*[self._cache_key(token_hash) for token_hash in token_hashes])
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to evict cached sessions: {e}")
+
+    def revoke(self, db: Session, session_token: str):
+        """End one session (logout on this device)"""
+        token_hash = self.hash_token(session_token)
+        db.query(UserSession).filter(UserSession.token_hash == token_hash).delete(synchronize_session=False)
+        db.commit()
+        with self._lock:
+            self._touched.pop(token_hash, None)
+        self._evict([token_hash])
+
+    def revoke_all(self, db: Session, user_id: str) -> int:
+        """End every session of a user (logout everywhere)"""
+        token_hashes = [
+            row.token_hash for row in db.query(UserSession.token_hash).filter(UserSession.user_id == user_id).all()
+        ]
+        if token_hashes:
+            db.query(UserSession).filter(UserSession.user_id == user_id).delete(synchronize_session=False)
+            db.commit()
+            self._evict(token_hashes)
+        return len(token_hashes)
+
+# Global session store
+session_store = SessionStore()
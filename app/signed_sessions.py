@@ -0,0 +1,205 @@
+"""
+Signed Session Tokens
+Stateless, short-lived session cookies verified in process, with a compact
+revocation list each process syncs from Redis
+"""
+
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional
+
+import jwt
+import redis
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .config import settings
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+SESSION_AUDIENCE = "ttpr-session"
+
+# User columns copied into the token; writing any of them bumps the user's claims version
+CLAIM_COLUMNS = {"firebase_uid": "uid", "email": "email", "subscription_plan": "plan",
+                 "subscription_status": "status"}
+CLAIM_CHANGE_COLUMNS = tuple(CLAIM_COLUMNS) + ("is_active",)
+
+class SignedSessionManager:
+    """Issues and verifies signed session tokens
+
+    A token carries the user ID, Firebase UID, email, plan and expiry, so a
+    request is authenticated from the token alone; other user columns load
+    on first access. Tokens live `token_ttl` seconds and are reissued from
+    the user row once past half their life, up to `max_session_age` after
+    sign-in; an expired token means signing in again.
+
+    Logout adds the token ID to a Redis sorted set scored by the token's
+    expiry. Writing a claim column (or deactivating the user) records a new
+    claims version for the user, the time of the change, in a second sorted
+    set; a token carrying an older version is reissued on its next request.
+    Both sets only hold entries younger than one token lifetime, and every
+    process pulls them every `sync_interval` seconds.
+    """
+
+    def __init__(self):
+        self.redis_client: Optional[redis.Redis] = None
+        self.revoked_key = "ttpr:signed_sessions:revoked"
+        self.claims_versions_key = "ttpr:signed_sessions:claims_versions"
+        self.token_ttl = settings.signed_session_ttl_seconds
+        self.max_session_age = 86400 * 7
+        self.sync_interval = 10
+
+        self._signing_key = hashlib.sha256(f"session:{settings.secret_key}".encode()).digest()
+        self._lock = threading.Lock()
+        self._revoked: Dict[str, float] = {}
+        self._claims_versions: Dict[str, float] = {}
+        self._last_sync = 0.0
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        if self.redis_client is None and settings.redis_url:
+            self.redis_client = redis.from_url(
+                settings.redis_url,
+                socket_timeout=2,
+                socket_connect_timeout=2,
+                retry_on_timeout=True
+            )
+        return self.redis_client
+
+    @staticmethod
+    def is_signed_token(session_token: str) -> bool:
+        """Signed tokens are JWTs; table session tokens never contain dots"""
+        return bool(session_token) and session_token.count(".") == 2
+
+    def claims_version(self, user_id: str) -> float:
+        """The user's current claims version; 0 when their claims have not changed lately"""
+        try:
+            client = self._get_redis()
+            if client is not None:
+                return client.zscore(self.claims_versions_key, user_id) or 0
+        except Exception as e:
+            logger.debug(f"Claims version lookup failed for {user_id}: {e}")
+
+        with self._lock:
+            return self._claims_versions.get(user_id, 0)
+
+    def issue(self, user: User, session_started_at: Optional[int] = None,
+              claims_version: Optional[float] = None) -> str:
+        """Issue a token for the user, keeping the original sign-in time on reissue
+
+        Pass the claims version read before the user was loaded, so a write
+        landing in between leaves the token behind and gets it reissued.
+        """
+        now = int(time.time())
+        claims = {
+            "sub": user.id,
+            "uid": user.firebase_uid,
+            "email": user.email,
+            "plan": user.subscription_plan,
+            "status": user.subscription_status,
+            "cv": self.claims_version(user.id) if claims_version is None else claims_version,
+            "iat": now,
+            "exp": now + self.token_ttl,
+            "sat": session_started_at or now,
+            "jti": uuid.uuid4().hex,
+            "aud": SESSION_AUDIENCE
+        }
+        return jwt.encode(claims, self._signing_key, algorithm="HS256")
+
+    def _sync(self):
+        """Pull the revocation list if this process's copy is older than `sync_interval`"""
+        now = time.time()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        try:
+            client = self._get_redis()
+            if client is None:
+                return
+
+            pipe = client.pipeline(transaction=False)
+            pipe.zremrangebyscore(self.revoked_key, "-inf", now)
+            pipe.zrangebyscore(self.revoked_key, now, "+inf", withscores=True)
+            pipe.zremrangebyscore(self.claims_versions_key, "-inf", now - self.token_ttl)
+            pipe.zrange(self.claims_versions_key, 0, -1, withscores=True)
+            _, revoked, _, claims_versions = pipe.execute()
+
+            decode = lambda value: value.decode() if isinstance(value, bytes) else value
+            with self._lock:
+                self._revoked = {decode(jti): score for jti, score in revoked}
+                self._claims_versions = {decode(user_id): score for user_id, score in claims_versions}
+
+        except Exception as e:
+            logger.warning(f"⚠️ Signed session revocation sync failed, using last known list: {e}")
+
+    def verify(self, session_token: str) -> Optional[Dict[str, Any]]:
+        """Get the claims of a valid, unrevoked token"""
+        try:
+            claims = jwt.decode(
+                session_token,
+                self._signing_key,
+                algorithms=["HS256"],
+                audience=SESSION_AUDIENCE,
+                options={"require": ["exp", "iat", "sub", "jti", "sat"]}
+            )
+        except jwt.InvalidTokenError as e:
+            logger.debug(f"Signed session rejected: {e}")
+            return None
+
+        if claims["sat"] + self.max_session_age < time.time():
+            return None
+
+        self._sync()
+        with self._lock:
+            if claims["jti"] in self._revoked:
+                return None
+        return claims
+
+    def needs_reissue(self, claims: Dict[str, Any]) -> bool:
+        """Reissue past half-life, or when the user's claims changed after issue"""
+        if claims["exp"] - time.time() < self.token_ttl / 2:
+            return True
+        # Tokens issued before plan claims were added
+        if "cv" not in claims:
+            return True
+        with self._lock:
+            return self._claims_versions.get(claims["sub"], 0) > claims["cv"]
+
+    def user_from_claims(self, db: Session, claims: Dict[str, Any]) -> User:
+        """Attach the token's user to the session as a persistent User without querying"""
+        user = User(id=claims["sub"], is_active=True)
+        for column, claim in CLAIM_COLUMNS.items():
+            setattr(user, column, claims[claim])
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def revoke(self, claims: Dict[str, Any]):
+        """Reject this token everywhere until it expires"""
+        with self._lock:
+            self._revoked[claims["jti"]] = claims["exp"]
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.zadd(self.revoked_key, {claims["jti"]: claims["exp"]})
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to publish signed session revocation: {e}")
+
+    def bump_claims_version(self, user_id: str):
+        """Make tokens issued before now carry stale claims"""
+        now = time.time()
+        with self._lock:
+            self._claims_versions[user_id] = now
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.zadd(self.claims_versions_key, {user_id: now})
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to publish claims version for {user_id}: {e}")
+
+# Global signed session manager
+signed_session_manager = SignedSessionManager()
@@ -0,0 +1,60 @@
+"""
+Celery Task Routing
+Dedicated queues per workload role so each role gets its own worker pool
+"""
+
+from kombu import Queue
+
+class TaskRole:
+    ROTATION = "rotation"        # Title rotations; latency sensitive
+    ACCOUNTING = "accounting"    # Quota usage recording and flushing
+    MAINTENANCE = "maintenance"  # Cleanup, recovery and housekeeping
+
+QUEUE_PREFIX = "ttpr"
+
+def queue_name(role: str) -> str:
+    return f"{QUEUE_PREFIX}.{role}"
+
+TASK_ROLES = {
+    # Robust tasks
+    "app.robust_tasks.rotate_titles_robust": TaskRole.ROTATION,
+    "app.robust_tasks.rotate_tenant_titles_robust": TaskRole.ROTATION,
+    "app.robust_tasks.update_quota_usage_robust": TaskRole.ACCOUNTING,
+    "app.robust_tasks.flush_quota_usage_robust": TaskRole.ACCOUNTING,
+    "app.robust_tasks.cleanup_completed_tests_robust": TaskRole.MAINTENANCE,
+    "app.robust_tasks.recover_failed_jobs": TaskRole.MAINTENANCE,
+    "app.robust_tasks.cleanup_old_job_metadata": TaskRole.MAINTENANCE,
+    "app.robust_tasks.refresh_expiring_tokens_robust": TaskRole.MAINTENANCE,
+
+    # Legacy tasks
+    "app.tasks.rotate_titles": TaskRole.ROTATION,
+    "app.tasks.update_quota_usage": TaskRole.ACCOUNTING,
+    "app.tasks.flush_quota_usage": TaskRole.ACCOUNTING,
+    "app.tasks.cleanup_completed_tests": TaskRole.MAINTENANCE,
+    "app.tasks.refresh_expiring_tokens": TaskRole.MAINTENANCE,
+}
+
+# The Redis transport emulates priorities with one sub-queue per step and
+# serves lower numbers first, so 0 is the most urgent
+PRIORITY_STEPS = list(range(10))
+
+def celery_priority(priority_value: int) -> int:
+    """Map a JobPriority value (LOW=1 .. CRITICAL=4) to a Redis broker priority"""
+    return max(0, min(9, 9 - (priority_value - 1) * 3))
+
+def configure_task_routing(celery_app):
+    """Declare role queues, route tasks to them and enable broker priorities"""
+    roles = [TaskRole.ROTATION, TaskRole.ACCOUNTING, TaskRole.MAINTENANCE]
+
+    celery_app.conf.update(
+        task_queues=[Queue(queue_name(role), routing_key=queue_name(role)) for role in roles],
+        task_routes={task_name: {"queue": queue_name(role)} for task_name, role in TASK_ROLES.items()},
+        task_default_queue=queue_name(TaskRole.MAINTENANCE),
+        task_default_priority=celery_priority(2),
+        broker_transport_options={
+            **(celery_app.conf.broker_transport_options or {}),
+            "priority_steps": PRIORITY_STEPS,
+            "sep": ":",
+            "queue_order_strategy": "priority"
+        }
+    )
@@ -1,9 +1,12 @@
 from celery import current_app
 from sqlalchemy.orm import Session
 from .database import SessionLocal
-from .models import ABTest, TitleRotation, QuotaUsage, User
+from .models import ABTest, TitleRotation, User
 from .youtube_api import YouTubeAPIClient
-from datetime import datetime, timedelta
+from .quota_usage_buffer import quota_usage_buffer
+from .google_token_refresh import google_token_refresher
+from .config import settings
+from datetime import datetime
 import logging
 import asyncio
 
@@ -86,7 +89,7 @@ def _perform_title_rotation(db: Session, test: ABTest):
                 
                 current_rotation.ended_at = datetime.utcnow()
                 
-                update_quota_usage.delay(user.id, "video_analytics", 1)
+                quota_usage_buffer.record(user.id, "video_analytics", 1)
                 
             except Exception as e:
                 logger.error(f"Error fetching end metrics for rotation {current_rotation.id}: {str(e)}")
@@ -104,7 +107,7 @@ def _perform_title_rotation(db: Session, test: ABTest):
                 logger.error(f"Failed to update video title for test {test.id}")
                 return
                 
-            update_quota_usage.delay(user.id, "videos_update", 50)
+            quota_usage_buffer.record(user.id, "videos_update", 50)
             
         except Exception as e:
             logger.error(f"Error updating video title for test {test.id}: {str(e)}")
@@ -129,7 +132,7 @@ def _perform_title_rotation(db: Session, test: ABTest):
                 comments_start=video_analytics.get('comments', 0)
             )
             
-            update_quota_usage.delay(user.id, "video_analytics", 1)
+            quota_usage_buffer.record(user.id, "video_analytics", 1)
             
         except Exception as e:
             logger.error(f"Error fetching start metrics for new rotation: {str(e)}")
@@ -192,41 +195,38 @@ def cleanup_completed_tests():
 @current_app.task
 def update_quota_usage(user_id: str, api_call_type: str, quota_units: int):
     """Update API quota usage for a user"""
+    quota_usage_buffer.record(user_id, api_call_type, quota_units)
+
+
+@current_app.task
+def flush_quota_usage():
+    """Write buffered quota counters to the database"""
     db = SessionLocal()
     try:
-        today = datetime.utcnow().date()
-        
-        quota_record = db.query(QuotaUsage).filter(
-            QuotaUsage.user_id == user_id,
-            QuotaUsage.date >= today,
-            QuotaUsage.date < today + timedelta(days=1)
-        ).first()
-        
-        if not quota_record:
-            quota_record = QuotaUsage(
-                user_id=user_id,
-                date=datetime.utcnow(),
-                api_calls_count=0,
-                quota_units_used=0,
-                videos_list_calls=0,
-                videos_update_calls=0
-            )
-            db.add(quota_record)
-        
-        quota_record.api_calls_count = (quota_record.api_calls_count or 0) + 1
-        quota_record.quota_units_used = (quota_record.quota_units_used or 0) + quota_units
-        
-        if api_call_type == "videos_list":
-            quota_record.videos_list_calls = (quota_record.videos_list_calls or 0) + 1
-        elif api_call_type == "videos_update":
-            quota_record.videos_update_calls = (quota_record.videos_update_calls or 0) + 1
-            
-        db.commit()
-        logger.info(f"Updated quota usage for user {user_id}: +{quota_units} units")
+        result = quota_usage_buffer.flush(db)
+        logger.info(f"Flushed quota usage: {result.get('rows_written', 0)} rows")
+        return result
         
     except Exception as e:
         db.rollback()
-        logger.error(f"Error updating quota usage: {str(e)}")
+        logger.error(f"Error flushing quota usage: {str(e)}")
         raise
     finally:
         db.close()
+
+@current_app.task
+def refresh_expiring_tokens():
+    """Refresh Google tokens about to expire so requests never wait on Google"""
+    try:
+        result = google_token_refresher.run_blocking(google_token_refresher.refresh_expiring(
+            window_seconds=settings.token_refresh_window_seconds,
+            batch_size=settings.token_refresh_batch_size,
+            concurrency=settings.token_refresh_concurrency,
+            rate_per_second=settings.token_refresh_rate_per_second
+        ))
+        logger.info(f"Proactive token refresh: {result}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error refreshing expiring tokens: {str(e)}")
+        raise
@@ -0,0 +1,84 @@
+"""
+OAuth Token Encryption
+Per-process Fernet keys with rotation support and a bounded cache of
+decrypted access tokens
+"""
+
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from datetime import datetime
+
+from cryptography.fernet import Fernet, MultiFernet
+
+from .config import settings
+
+_fernet_lock = threading.Lock()
+_fernet: Optional[MultiFernet] = None
+
+def derive_key(secret: str) -> bytes:
+    """Derive a Fernet key from an application secret"""
+    return base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest())
+
+def get_fernet() -> MultiFernet:
+    """Get the process-wide token cipher
+
+    Encrypts with the current SECRET_KEY and decrypts with it or any key in
+    PREVIOUS_SECRET_KEYS, so tokens stored under a retired key stay readable
+    and are re-encrypted with the current key on their next refresh.
+    """
+    global _fernet
+    if _fernet is None:
+        with _fernet_lock:
+            if _fernet is None:
+                secrets = [settings.secret_key] + [
+                    secret.strip() for secret in settings.previous_secret_keys.split(",") if secret.strip()
+                ]
+                _fernet = MultiFernet([Fernet(derive_key(secret)) for secret in secrets])
+    return _fernet
+
+class DecryptedTokenCache:
+    """Bounded LRU of decrypted access tokens keyed by user ID
+
+    An entry is only returned while the user's `token_expires_at` still
+    matches the one it was cached with and has not passed, so any token
+    change (refresh, clear) makes the old plaintext unreachable.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[datetime, str]]" = OrderedDict()
+
+    def get(self, user_id: str, expires_at: Optional[datetime]) -> Optional[str]:
+        if not user_id or expires_at is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] != expires_at or datetime.utcnow() >= expires_at:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id: str, expires_at: Optional[datetime], token: Optional[str]):
+        if not user_id or expires_at is None or not token:
+            return
+
+        with self._lock:
+            self._entries[user_id] = (expires_at, token)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+# Global decrypted access token cache
+decrypted_token_cache = DecryptedTokenCache()
@@ -0,0 +1,259 @@
+"""
+Cached User Resolution
+Maps a Firebase UID to a snapshot of its user row, in process and in Redis,
+so authenticated requests resolve their user without database queries
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from datetime import datetime
+
+import redis
+from sqlalchemy import DateTime
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .config import settings
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Secrets stay out of Redis; they are loaded from the database on first access
+SNAPSHOT_EXCLUDED = {"google_access_token", "google_refresh_token", "session_token"}
+
+# Only whether these are set is cached, so token checks need no query
+TOKEN_PRESENCE_COLUMNS = ("google_access_token", "google_refresh_token")
+
+class UserResolver:
+    """Resolves authenticated Firebase UIDs to User rows through two cache tiers
+
+    Snapshots carry the user's version, a Redis counter bumped whenever the
+    row is written (see the User mapper events in models.py). A Redis
+    snapshot whose version is behind is ignored; in-process snapshots are
+    dropped on local writes and otherwise trusted for `local_ttl` seconds.
+    The snapshot is attached to the request session without a query, so
+    handlers can still modify and commit the user as before.
+    """
+
+    def __init__(self):
+        self.redis_client: Optional[redis.Redis] = None
+        self.key_prefix = "ttpr:user_resolver"
+        self.snapshot_ttl = 300
+        self.user_id_ttl = 86400 * 30
+        self.local_ttl = 10
+        self.max_local_entries = 5000
+
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._canonicalizing = set()
+
+        self._datetime_columns = {
+            column.key for column in User.__table__.columns if isinstance(column.type, DateTime)
+        }
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        if self.redis_client is None and settings.redis_url:
+            self.redis_client = redis.from_url(
+                settings.redis_url,
+                socket_timeout=2,
+                socket_connect_timeout=2,
+                retry_on_timeout=True
+            )
+        return self.redis_client
+
+    def _snapshot_key(self, firebase_uid: str) -> str:
+        return f"{self.key_prefix}:uid:{firebase_uid}"
+
+    def _version_key(self, user_id: str) -> str:
+        return f"{self.key_prefix}:version:{user_id}"
+
+    def _user_id_key(self, firebase_uid: str) -> str:
+        return f"{self.key_prefix}:user_id:{firebase_uid}"
+
+    def _get_version(self, user_id: str) -> int:
+        client = self._get_redis()
+        raw = client.get(self._version_key(user_id)) if client is not None else None
+        return int(raw) if raw else 0
+
+    def _snapshot(self, user: User, version: int) -> Dict[str, Any]:
+        columns = {}
+        for column in User.__table__.columns:
+            if column.key in SNAPSHOT_EXCLUDED:
+                continue
+            value = getattr(user, column.key)
+            columns[column.key] = value.isoformat() if isinstance(value, datetime) else value
+        tokens = {column: getattr(user, column) is not None for column in TOKEN_PRESENCE_COLUMNS}
+        return {"user_id": user.id, "version": version, "columns": columns, "tokens": tokens}
+
+    def _materialize(self, db: Session, snapshot: Dict[str, Any]) -> User:
+        """Attach a snapshot to the session as a persistent User without querying"""
+        user = User()
+        for key, value in snapshot["columns"].items():
+            if key in self._datetime_columns and value:
+                value = datetime.fromisoformat(value)
+            setattr(user, key, value)
+        make_transient_to_detached(user)
+        user = db.merge(user, load=False)
+        user._token_presence = snapshot.get("tokens")
+        return user
+
+    def _remember_local(self, firebase_uid: str, snapshot: Dict[str, Any]):
+        with self._lock:
+            self._local[firebase_uid] = (snapshot, time.time())
+            self._local.move_to_end(firebase_uid)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+    def _cached_snapshot(self, firebase_uid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._local.get(firebase_uid)
+        if entry and time.time() - entry[1] < self.local_ttl:
+            return entry[0]
+
+        try:
+            client = self._get_redis()
+            if client is None:
+                return None
+
+            raw = client.get(self._snapshot_key(firebase_uid))
+            if raw is None:
+                return None
+
+            snapshot = json.loads(raw)
+            if snapshot["version"] != self._get_version(snapshot["user_id"]):
+                return None
+
+            self._remember_local(firebase_uid, snapshot)
+            return snapshot
+
+        except Exception as e:
+            logger.debug(f"User snapshot lookup failed for {firebase_uid}: {e}")
+            return None
+
+    def _version_before_query(self, firebase_uid: str) -> Optional[int]:
+        """The user's version, read before their row is queried
+
+        None when this UID has never been resolved, so its user is unknown.
+        """
+        try:
+            client = self._get_redis()
+            if client is None:
+                return 0
+            user_id = client.get(self._user_id_key(firebase_uid))
+            if user_id is None:
+                return None
+            return self._get_version(user_id.decode() if isinstance(user_id, bytes) else user_id)
+        except Exception as e:
+            logger.debug(f"User version lookup failed for {firebase_uid}: {e}")
+            return 0
+
+    def _store_snapshot(self, firebase_uid: str, user: User, version: Optional[int]):
+        """Cache the row under the version read before it was queried
+
+        A write that lands between that read and the query bumps the version
+        past the snapshot's, so the snapshot is never served as current. With
+        no earlier version to go on, the snapshot is only kept in process and
+        the UID's user is recorded so the next miss can read one.
+        """
+        snapshot = self._snapshot(user, version or 0)
+        self._remember_local(firebase_uid, snapshot)
+
+        try:
+            client = self._get_redis()
+            if client is None:
+                return
+            client.set(self._user_id_key(firebase_uid), user.id, ex=self.user_id_ttl)
+            if version is not None:
+                client.set(self._snapshot_key(firebase_uid), json.dumps(snapshot), ex=self.snapshot_ttl)
+        except Exception as e:
+            logger.debug(f"User snapshot store failed for {firebase_uid}: {e}")
+
+    def _query_user(self, db: Session, firebase_uid: str, email: Optional[str]) -> Optional[User]:
+        """Find the user by any stored UID format in one query, then by email"""
+        # Formats written by earlier versions of the sign-in flow
+        uid_formats = [firebase_uid, f"google_{firebase_uid}", f"google:{firebase_uid}"]
+
+        matches = {
+            user.firebase_uid: user
+            for user in db.query(User).filter(User.firebase_uid.in_(uid_formats)).all()
+        }
+        for uid_format in uid_formats:
+            if uid_format in matches:
+                user = matches[uid_format]
+                if uid_format != firebase_uid:
+                    self._canonicalize_in_background(user.id, firebase_uid)
+                return user
+
+        if email:
+            return db.query(User).filter(User.email == email).first()
+
+        return None
+
+    def resolve(self, db: Session, firebase_uid: str, email: Optional[str]) -> Optional[User]:
+        """Get the user for an authenticated Firebase UID"""
+        snapshot = self._cached_snapshot(firebase_uid)
+        if snapshot is not None:
+            return self._materialize(db, snapshot)
+
+        version = self._version_before_query(firebase_uid)
+        user = self._query_user(db, firebase_uid, email)
+        if user is not None:
+            self._store_snapshot(firebase_uid, user, version)
+        return user
+
+    def invalidate(self, user_id: str):
+        """Bump the user's version and drop local snapshots after a write"""
+        with self._lock:
+            for firebase_uid in [uid for uid, (snapshot, _) in self._local.items() if snapshot["user_id"] == user_id]:
+                del self._local[firebase_uid]
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.incr(self._version_key(user_id))
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to invalidate cached user {user_id}: {e}")
+
+    def _canonicalize_in_background(self, user_id: str, firebase_uid: str):
+        """Rewrite a legacy stored UID to its canonical form once, off the request path"""
+        with self._lock:
+            if firebase_uid in self._canonicalizing:
+                return
+            self._canonicalizing.add(firebase_uid)
+
+        try:
+            client = self._get_redis()
+            if client is not None and not client.set(f"{self.key_prefix}:canonicalized:{firebase_uid}", "1", nx=True, ex=86400):
+                return
+        except Exception as e:
+            logger.debug(f"Canonicalization claim failed for {firebase_uid}: {e}")
+
+        threading.Thread(
+            target=self._canonicalize, args=(user_id, firebase_uid), name="user-uid-canonicalize", daemon=True
+        ).start()
+
+    def _canonicalize(self, user_id: str, firebase_uid: str):
+        try:
+            from .database_manager import db_manager
+            with db_manager.get_db_session() as db:
+                if db.query(User.id).filter(User.firebase_uid == firebase_uid).first():
+                    return
+                user = db.query(User).filter(User.id == user_id).first()
+                if user and user.firebase_uid != firebase_uid:
+                    logger.info(f"🔧 Canonicalizing UID for user {user_id}: {user.firebase_uid} -> {firebase_uid}")
+                    user.firebase_uid = firebase_uid
+
+        except Exception as e:
+            logger.warning(f"⚠️ UID canonicalization failed for user {user_id}: {e}")
+            with self._lock:
+                self._canonicalizing.discard(firebase_uid)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"local_entries": len(self._local), "local_ttl": self.local_ttl, "snapshot_ttl": self.snapshot_ttl}
+
+# Global user resolver
+user_resolver = UserResolver()
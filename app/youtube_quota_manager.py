@@ -19,6 +19,8 @@ from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials
 
 from .config import settings
+from .quota_scheduler import FairShareQuotaScheduler
+from .quota_accountant import DegradedQuotaAccountant
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +56,10 @@ class YouTubeQuotaManager:
         self.quota_key_prefix = "yt_quota"
         self.rate_limit_key_prefix = "yt_rate_limit"
         self.connection_healthy = False
+        self.scheduler = FairShareQuotaScheduler(self)
+        self.degraded_accountant = DegradedQuotaAccountant(self)
+        self.reconnect_interval = 30  # seconds
+        self._last_reconnect_attempt = 0.0
         
     def initialize(self) -> bool:
         """Initialize quota manager with Redis"""
@@ -78,19 +84,60 @@ class YouTubeQuotaManager:
             self.connection_healthy = False
             return False
     
+    def _mark_unhealthy(self, error: Exception):
+        """Switch to degraded in-process accounting after a Redis failure"""
+        if self.connection_healthy:
+            logger.warning(f"⚠️ Redis quota counters unavailable, switching to degraded accounting: {error}")
+        self.connection_healthy = False
+    
+    def _try_reconnect(self) -> bool:
+        """Periodically retry Redis and reconcile the degraded-mode journal"""
+        now = time.time()
+        if now - self._last_reconnect_attempt < self.reconnect_interval:
+            return False
+        self._last_reconnect_attempt = now
+        
+        try:
+            if self.redis_client is None:
+                if not self.initialize():
+                    return False
+            else:
+                self.redis_client.ping()
+            
+            # Stay degraded until the journal is merged, so a failed merge is retried
+            if self.degraded_accountant.active or self.degraded_accountant.journal:
+                result = self.degraded_accountant.reconcile()
+                if "error" in result:
+                    self.connection_healthy = False
+                    return False
+            
+            self.connection_healthy = True
+            logger.info("✅ Redis quota counters reachable again")
+            return True
+            
+        except Exception as e:
+            logger.debug(f"Redis quota reconnect failed: {e}")
+            return False
+    
     def check_quota_available(self, operation: str, user_id: Optional[str] = None, cost_override: Optional[int] = None) -> Dict[str, Any]:
         """Check if quota is available for an operation"""
+        cost = cost_override or getattr(self.api_costs, operation, 1)
+        
         try:
             if not self.connection_healthy:
-                # If Redis is down, allow operations but log warning
-                logger.warning("⚠️ Redis unavailable, allowing operation without quota check")
-                return {"allowed": True, "reason": "quota_check_unavailable"}
+                self._try_reconnect()
+            
+            if not self.connection_healthy:
+                # If Redis is down, enforce this worker's share of the remaining quota
+                return self.degraded_accountant.check(cost, user_id)
             
-            cost = cost_override or getattr(self.api_costs, operation, 1)
             current_time = datetime.utcnow()
             
             # Check daily quota
             daily_usage = self._get_quota_usage(QuotaLimitType.DAILY)
+            if not self.connection_healthy:
+                return self.degraded_accountant.check(cost, user_id)
+            
             if daily_usage + cost > self.quota_limits.daily_limit:
                 return {
                     "allowed": False,
@@ -125,6 +172,11 @@ class YouTubeQuotaManager:
                         "retry_after": 100,
                         "user_id": user_id
                     }
+                
+                # Check the tenant's weighted fair share of the daily quota
+                fair_share = self.scheduler.check_tenant_allowance(user_id, cost, daily_usage)
+                if not fair_share["allowed"]:
+                    return fair_share
             
             return {
                 "allowed": True,
@@ -133,6 +185,9 @@ class YouTubeQuotaManager:
                 "daily_remaining": self.quota_limits.daily_limit - (daily_usage + cost)
             }
             
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self._mark_unhealthy(e)
+            return self.degraded_accountant.check(cost, user_id)
         except Exception as e:
             logger.error(f"❌ Quota check failed: {e}")
             # Allow operation if quota check fails
@@ -160,19 +215,30 @@ class YouTubeQuotaManager:
                 return 0
             
             usage = self.redis_client.get(key)
-            return int(usage) if usage else 0
+            usage = int(usage) if usage else 0
+            
+            if limit_type == QuotaLimitType.DAILY:
+                self.degraded_accountant.remember_usage(current_time.strftime('%Y-%m-%d'), usage)
+            
+            return usage
             
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self._mark_unhealthy(e)
+            return 0
         except Exception as e:
             logger.warning(f"⚠️ Failed to get quota usage: {e}")
             return 0
     
     def record_quota_usage(self, operation: str, user_id: Optional[str] = None, cost_override: Optional[int] = None):
         """Record quota usage for an operation"""
+        cost = cost_override or getattr(self.api_costs, operation, 1)
+        
         try:
             if not self.connection_healthy:
+                # Journal locally; merged into Redis on reconnect
+                self.degraded_accountant.record(cost, user_id)
                 return
             
-            cost = cost_override or getattr(self.api_costs, operation, 1)
             current_time = datetime.utcnow()
             
             # Record daily usage
@@ -191,9 +257,15 @@ class YouTubeQuotaManager:
                 user_rate_key = f"{self.rate_limit_key_prefix}:user:{user_id}:100s:{window}"
                 self.redis_client.incrby(user_rate_key, cost)
                 self.redis_client.expire(user_rate_key, 200)
+                
+                # Record per-tenant daily usage for fair-share scheduling
+                self.scheduler.record_usage(user_id, cost)
             
             logger.debug(f"📊 Recorded quota usage: {operation} = {cost} units")
             
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self._mark_unhealthy(e)
+            self.degraded_accountant.record(cost, user_id)
         except Exception as e:
             logger.warning(f"⚠️ Failed to record quota usage: {e}")
     
@@ -220,6 +292,7 @@ class YouTubeQuotaManager:
                     "remaining": self.quota_limits.per_100_seconds_limit - rate_limit_usage
                 },
                 "status": "healthy" if daily_percentage < 90 else "warning" if daily_percentage < 95 else "critical",
+                "degraded_accounting": self.degraded_accountant.get_status(),
                 "timestamp": current_time.isoformat()
             }
             
@@ -237,9 +310,10 @@ class YouTubeQuotaManager:
             return tomorrow
         elif limit_type in [QuotaLimitType.PER_100_SECONDS, QuotaLimitType.PER_USER_100_SECONDS]:
             # Resets every 100 seconds
-            current_window = int(current_time.timestamp() // 100)
+            # time.time() is epoch seconds; a naive utcnow().timestamp() would be read as local time
+            current_window = int(time.time() // 100)
             next_window_start = (current_window + 1) * 100
-            return datetime.fromtimestamp(next_window_start)
+            return datetime.utcfromtimestamp(next_window_start)
         
         return None
 
@@ -258,7 +332,13 @@ class EnhancedYouTubeAPIClient:
             reason = quota_check["reason"]
             if reason == "daily_quota_exceeded":
                 raise QuotaExceededException(
-                    f"Daily quota limit exceeded. Used: {quota_check['current_usage']}/{quota_check['limit']}"
+                    f"Daily quota limit exceeded. Used: {quota_check['current_usage']}/{quota_check['limit']}",
+                    reason=reason
+                )
+            elif reason == "tenant_share_exceeded":
+                raise QuotaExceededException(
+                    f"Daily quota share exceeded. Used: {quota_check['current_usage']}/{quota_check['limit']}",
+                    reason=reason
                 )
             elif reason in ["rate_limit_exceeded", "user_rate_limit_exceeded"]:
                 retry_after = quota_check.get("retry_after", 100)
@@ -456,7 +536,10 @@ class EnhancedYouTubeAPIClient:
 # Custom exceptions
 class QuotaExceededException(Exception):
     """Raised when API quota is exceeded"""
-    pass
+    
+    def __init__(self, message: str = "", reason: Optional[str] = None):
+        super().__init__(message)
+        self.reason = reason
 
 class RateLimitExceededException(Exception):
     """Raised when API rate limit is exceeded"""
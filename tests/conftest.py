@@ -0,0 +1,62 @@
+from datetime import datetime
+from unittest import mock
+
+import fakeredis
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database_manager import Base
+from app.job_manager import RobustJobManager
+from app.youtube_quota_manager import YouTubeQuotaManager
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_client(redis_server):
+    return fakeredis.FakeRedis(server=redis_server)
+
+
+@pytest.fixture
+def quota_manager(redis_client):
+    manager = YouTubeQuotaManager()
+    manager.redis_client = redis_client
+    manager.connection_healthy = True
+    return manager
+
+
+@pytest.fixture
+def job_manager(redis_client):
+    """A job manager on fakeredis whose Celery app only records sent tasks"""
+    manager = RobustJobManager()
+    manager.redis_client = redis_client
+    manager.connection_healthy = True
+    manager.celery_app = mock.Mock()
+    return manager
+
+
+@pytest.fixture
+def session_factory():
+    """Sessions on a fresh in-memory SQLite database with the app's schema"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def add_now_function(connection, record):
+        # Column defaults use the PostgreSQL NOW() function
+        connection.create_function("NOW", 0, lambda: datetime.utcnow().isoformat(sep=" "))
+
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
@@ -0,0 +1,81 @@
+from unittest import mock
+
+import fakeredis
+import pytest
+import redis
+
+from app.auth_code_store import AuthCodeStore
+
+
+@pytest.fixture
+def store(redis_client):
+    store = AuthCodeStore(ttl=600)
+    store.redis_client = redis_client
+    return store
+
+
+@pytest.fixture
+def offline_store():
+    store = AuthCodeStore(ttl=600, max_local_entries=3)
+    store.redis_client = mock.Mock()
+    store.redis_client.set.side_effect = redis.ConnectionError("redis down")
+    store.redis_client.delete.side_effect = redis.ConnectionError("redis down")
+    return store
+
+
+def test_code_is_claimed_once(store):
+    assert store.claim("code-1") is True
+    assert store.claim("code-1") is False
+    assert store.claim("code-2") is True
+
+
+def test_claims_are_shared_across_workers(store, redis_server):
+    other_worker = AuthCodeStore()
+    other_worker.redis_client = fakeredis.FakeRedis(server=redis_server)
+
+    assert store.claim("code-1") is True
+    assert other_worker.claim("code-1") is False
+
+
+def test_claim_expires_with_ttl_and_stores_no_raw_code(store, redis_client):
+    store.claim("secret-code")
+
+    keys = redis_client.keys(f"{store.key_prefix}:*")
+    assert len(keys) == 1 and b"secret-code" not in keys[0]
+    assert 0 < redis_client.ttl(keys[0]) <= 600
+
+
+def test_released_code_can_be_retried(store):
+    store.claim("code-1")
+    store.release("code-1")
+
+    assert store.claim("code-1") is True
+
+
+def test_falls_back_to_in_process_claims_without_redis(offline_store):
+    assert offline_store.claim("code-1") is True
+    assert offline_store.claim("code-1") is False
+
+    offline_store.release("code-1")
+    assert offline_store.claim("code-1") is True
+
+
+def test_in_process_claims_are_bounded(offline_store):
+    for n in range(5):
+        offline_store.claim(f"code-{n}")
+
+    assert len(offline_store._local) == 3
+    # The oldest claims were evicted first
+    assert offline_store.claim("code-0") is True
+    assert offline_store.claim("code-4") is False
+
+
+def test_in_process_claims_expire(offline_store):
+    with mock.patch("app.auth_code_store.time.time", return_value=1000.0):
+        offline_store.claim("code-1")
+
+    with mock.patch("app.auth_code_store.time.time", return_value=1000.0 + offline_store.ttl + 1):
+        assert offline_store.claim("code-1") is True
+        offline_store.claim("code-2")
+
+    assert len(offline_store._local) == 2
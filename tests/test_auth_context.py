@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app.auth_context import AuthContext
+from app.auth_dependencies import get_auth_context, get_paid_auth_context
+from app.models import User, YouTubeChannel
+
+
+def test_authorized_emails_are_entitled_without_subscription():
+    context = AuthContext(User(email="liftedkulture@gmail.com", subscription_status="free"), db=None)
+
+    assert context.is_entitled
+
+
+@pytest.mark.parametrize("status,entitled", [("active", True), ("trialing", True), ("free", False),
+                                             ("canceled", False), (None, False)])
+def test_entitlement_follows_subscription_status(status, entitled):
+    context = AuthContext(User(email="user@example.com", subscription_status=status), db=None)
+
+    assert context.is_entitled is entitled
+
+
+def test_entitlement_is_worked_out_once():
+    user = User(email="user@example.com", subscription_status="active")
+    context = AuthContext(user, db=None)
+    assert context.is_entitled
+
+    user.subscription_status = "canceled"
+    assert context.is_entitled
+
+
+def test_access_token_is_decrypted_once_and_can_be_replaced():
+    user = User(email="user@example.com")
+    context = AuthContext(user, db=None)
+
+    with mock.patch.object(User, "get_google_access_token", return_value="token") as decrypt:
+        assert context.access_token == "token"
+        assert context.access_token == "token"
+        assert decrypt.call_count == 1
+
+        context.access_token = "refreshed"
+        assert context.access_token == "refreshed"
+        assert decrypt.call_count == 1
+
+
+def test_selected_channel_is_queried_once(db):
+    user = User(id="u1", firebase_uid="fb1", email="user@example.com")
+    db.add(user)
+    db.add(YouTubeChannel(user_id="u1", channel_id="c1", channel_title="Other", is_selected=False))
+    db.add(YouTubeChannel(user_id="u1", channel_id="c2", channel_title="Main", is_selected=True))
+    db.commit()
+    db.refresh(user)
+
+    queries = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args, **kwargs: queries.append(1))
+    context = AuthContext(user, db)
+
+    assert context.selected_channel.channel_id == "c2"
+    assert context.selected_channel.channel_id == "c2"
+    assert len(queries) == 1
+
+
+def test_auth_context_is_shared_within_a_request():
+    request = SimpleNamespace(state=SimpleNamespace())
+    user = User(email="user@example.com")
+
+    first = asyncio.run(get_auth_context(request, current_user=user, db=None))
+    second = asyncio.run(get_auth_context(request, current_user=user, db=None))
+    other = asyncio.run(get_auth_context(request, current_user=User(email="other@example.com"), db=None))
+
+    assert first is second
+    assert other is not first and request.state.auth_context is other
+
+
+def test_paid_auth_context_refuses_users_without_subscription():
+    context = AuthContext(User(email="user@example.com", subscription_status="free"), db=None)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_paid_auth_context(context))
+
+    assert error.value.status_code == 402
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import auth_dependencies
+from app.auth_dependencies import get_current_admin_user, is_admin_user
+from app.models import User
+
+
+@pytest.fixture(autouse=True)
+def admin_emails(monkeypatch):
+    monkeypatch.setattr(auth_dependencies.settings, "admin_emails", "Ops@Example.com, lead@example.com")
+
+
+def test_admin_emails_match_case_insensitively():
+    assert is_admin_user(User(email="ops@example.com"))
+    assert not is_admin_user(User(email="user@example.com"))
+    assert not is_admin_user(User(email=None))
+
+
+def test_non_admin_is_refused():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_current_admin_user(User(email="user@example.com")))
+
+    assert error.value.status_code == 403
+
+
+def test_nobody_is_admin_when_unconfigured(monkeypatch):
+    monkeypatch.setattr(auth_dependencies.settings, "admin_emails", "")
+
+    assert not is_admin_user(User(email="ops@example.com"))
+
+
+def test_stream_auth_uses_bearer_token_when_sent(monkeypatch):
+    user = User(email="user@example.com")
+
+    async def firebase_user(token, db):
+        assert token == "id-token"
+        return user
+
+    monkeypatch.setattr(auth_dependencies, "get_current_firebase_user", firebase_user)
+
+    assert asyncio.run(auth_dependencies.get_current_user_bearer_or_session(None, None, "id-token", None)) is user
+
+
+def test_stream_auth_falls_back_to_session_cookie(monkeypatch):
+    user = User(email="user@example.com")
+    request = object()
+
+    async def session_user(request_arg, response, db):
+        assert request_arg is request
+        return user
+
+    monkeypatch.setattr(auth_dependencies, "get_current_user_session", session_user)
+
+    assert asyncio.run(auth_dependencies.get_current_user_bearer_or_session(request, None, None, None)) is user
@@ -0,0 +1,107 @@
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from app import firebase_token_verifier as verifier_module
+from app.firebase_token_verifier import FirebaseTokenVerifier
+
+PROJECT = "ttpr-test"
+
+
+def make_signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken")])
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(datetime.utcnow() - timedelta(days=1))
+        .not_valid_after(datetime.utcnow() + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+@pytest.fixture(scope="module")
+def signing_keys():
+    return {"kid-1": make_signing_key(), "kid-2": make_signing_key()}
+
+
+@pytest.fixture
+def certs(signing_keys, monkeypatch):
+    """Serve kid-1 from the certificate endpoint; tests may publish more"""
+    published = {"kid-1": signing_keys["kid-1"][1]}
+    response = mock.Mock(headers={"Cache-Control": "public, max-age=600"})
+    response.json.side_effect = lambda: dict(published)
+    fetch = mock.Mock(return_value=response)
+    monkeypatch.setattr(verifier_module.requests, "get", fetch)
+    fetch.published = published
+    return fetch
+
+
+@pytest.fixture
+def verifier():
+    return FirebaseTokenVerifier(project_id=PROJECT)
+
+
+def sign(signing_keys, kid="kid-1", **overrides):
+    now = int(time.time())
+    claims = {"iss": f"https://securetoken.google.com/{PROJECT}", "aud": PROJECT, "sub": "user-1",
+              "iat": now, "exp": now + 3600, "auth_time": now, **overrides}
+    return jwt.encode(claims, signing_keys[kid][0], algorithm="RS256", headers={"kid": kid})
+
+
+def test_valid_token_is_verified_locally(verifier, certs, signing_keys):
+    claims = verifier.verify(sign(signing_keys))
+
+    assert claims["uid"] == "user-1"
+    assert verifier.verify(sign(signing_keys))["uid"] == "user-1"
+    assert certs.call_count == 1
+
+
+def test_token_for_another_project_is_rejected(verifier, certs, signing_keys):
+    with pytest.raises(jwt.InvalidAudienceError):
+        verifier.verify(sign(signing_keys, aud="other-project"))
+
+
+def test_expired_token_is_rejected(verifier, certs, signing_keys):
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(sign(signing_keys, iat=int(time.time()) - 7200, exp=int(time.time()) - 3600))
+
+
+def test_unknown_key_id_refetches_once_per_interval(verifier, certs, signing_keys):
+    verifier.verify(sign(signing_keys))
+    certs.published["kid-2"] = signing_keys["kid-2"][1]
+
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(sign(signing_keys, kid="kid-2"))
+    assert certs.call_count == 1
+
+    verifier._last_fetch_attempt -= verifier.min_refresh_interval
+    assert verifier.verify(sign(signing_keys, kid="kid-2"))["uid"] == "user-1"
+    assert certs.call_count == 2
+
+
+def test_certificates_are_refreshed_in_background_before_expiry(verifier, certs, signing_keys):
+    verifier.verify(sign(signing_keys))
+    verifier._refresh_at = time.time() - 1
+
+    with mock.patch.object(verifier, "_refresh_in_background") as refresh_in_background:
+        verifier.verify(sign(signing_keys))
+
+    refresh_in_background.assert_called_once()
+
+
+def test_verifier_is_unavailable_without_certificates(verifier, certs, signing_keys):
+    certs.side_effect = OSError("no network")
+
+    assert verifier.verify(sign(signing_keys)) is None
+    assert not verifier.available
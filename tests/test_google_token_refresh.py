@@ -0,0 +1,266 @@
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import fakeredis
+import httpx
+import pytest
+
+from app.auth_manager import AuthServiceUnavailableError, TokenInvalidError
+from app.database_manager import db_manager
+from app.google_token_refresh import GoogleTokenRefresher
+from app.models import User
+
+
+class FakeTokenStore:
+    """Stands in for the users table: one user whose token may need a refresh"""
+
+    def __init__(self, needs_refresh=True):
+        self.needs_refresh = needs_refresh
+        self.access_token = "old-token"
+        self.stored = []
+
+    def load_user_state(self, user_id, min_valid_seconds=0):
+        if user_id != "u1":
+            return None
+        return {
+            "needs_refresh": self.needs_refresh,
+            "refresh_token": "refresh-token" if self.needs_refresh else None,
+            "access_token": None if self.needs_refresh else self.access_token
+        }
+
+    def store_tokens(self, user_id, token_data, refresh_token):
+        self.stored.append((user_id, token_data["access_token"], refresh_token))
+        self.access_token = token_data["access_token"]
+        self.needs_refresh = False
+
+
+@pytest.fixture
+def store():
+    return FakeTokenStore()
+
+
+@pytest.fixture
+def async_redis(redis_server):
+    return fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True)
+
+
+@pytest.fixture
+def refresher(store, async_redis, monkeypatch):
+    refresher = GoogleTokenRefresher()
+    refresher.poll_interval = 0.01
+    calls = []
+
+    async def request_token(refresh_token):
+        calls.append(refresh_token)
+        await asyncio.sleep(0.05)
+        return {"access_token": f"new-token-{len(calls)}", "expires_in": 3600}
+
+    monkeypatch.setattr(refresher, "_load_user_state", store.load_user_state)
+    monkeypatch.setattr(refresher, "_store_tokens", store.store_tokens)
+    monkeypatch.setattr(refresher, "_get_redis", lambda: async_redis)
+    monkeypatch.setattr(refresher, "request_token", request_token)
+    refresher.google_calls = calls
+    return refresher
+
+
+def test_concurrent_refreshes_share_one_google_call(refresher, store):
+    async def run():
+        return await asyncio.gather(*[refresher.refresh("u1") for _ in range(5)])
+
+    tokens = asyncio.run(run())
+
+    assert tokens == ["new-token-1"] * 5
+    assert refresher.google_calls == ["refresh-token"]
+    assert store.stored == [("u1", "new-token-1", "refresh-token")]
+
+
+def test_fresh_token_is_returned_without_calling_google(refresher, store):
+    store.needs_refresh = False
+
+    assert asyncio.run(refresher.refresh("u1")) == "old-token"
+    assert refresher.google_calls == []
+
+
+def test_unknown_user_gets_no_token(refresher):
+    assert asyncio.run(refresher.refresh("missing")) is None
+    assert refresher.google_calls == []
+
+
+def test_lock_is_released_after_refresh(refresher, redis_client):
+    asyncio.run(refresher.refresh("u1"))
+
+    assert not redis_client.exists(f"{refresher.lock_prefix}:u1")
+
+
+def test_failed_refresh_reaches_every_caller_and_releases_lock(refresher, redis_client, monkeypatch):
+    async def request_token(refresh_token):
+        await asyncio.sleep(0.01)
+        raise TokenInvalidError("Refresh token is invalid or expired")
+
+    monkeypatch.setattr(refresher, "request_token", request_token)
+
+    async def run():
+        return await asyncio.gather(*[refresher.refresh("u1") for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, TokenInvalidError) for result in results)
+    assert not redis_client.exists(f"{refresher.lock_prefix}:u1")
+    assert refresher._inflight == {}
+
+
+def test_waits_for_another_worker_and_reads_its_token(refresher, store, redis_client):
+    lock_key = f"{refresher.lock_prefix}:u1"
+    redis_client.set(lock_key, "other-worker", ex=refresher.lock_ttl)
+
+    async def other_worker_finishes():
+        await asyncio.sleep(0.05)
+        store.store_tokens("u1", {"access_token": "their-token"}, "refresh-token")
+        redis_client.delete(lock_key)
+
+    async def run():
+        token, _ = await asyncio.gather(refresher.refresh("u1"), other_worker_finishes())
+        return token
+
+    assert asyncio.run(run()) == "their-token"
+    assert refresher.google_calls == []
+
+
+def test_gives_up_when_another_worker_never_releases(refresher, redis_client):
+    refresher.lock_ttl = 1
+    redis_client.set(f"{refresher.lock_prefix}:u1", "other-worker")
+
+    assert asyncio.run(refresher.refresh("u1")) is None
+    assert refresher.google_calls == []
+
+
+def test_lock_is_not_released_when_held_by_another_worker(refresher, redis_client):
+    lock_key = f"{refresher.lock_prefix}:u1"
+
+    async def run():
+        await refresher._release(lock_key, "my-token")
+
+    redis_client.set(lock_key, "other-worker")
+    asyncio.run(run())
+
+    assert redis_client.get(lock_key) == b"other-worker"
+
+
+def test_refreshes_without_redis(refresher, store, monkeypatch):
+    class DeadRedis:
+        async def set(self, *args, **kwargs):
+            raise ConnectionError("redis down")
+
+        async def eval(self, *args, **kwargs):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(refresher, "_get_redis", lambda: DeadRedis())
+
+    assert asyncio.run(refresher.refresh("u1")) == "new-token-1"
+    assert store.stored == [("u1", "new-token-1", "refresh-token")]
+
+
+def token_endpoint(monkeypatch, refresher, status_code, body):
+    def handler(request):
+        return httpx.Response(status_code, json=body)
+
+    monkeypatch.setattr(refresher, "_get_http", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_request_token_returns_google_response(monkeypatch):
+    refresher = GoogleTokenRefresher()
+    token_endpoint(monkeypatch, refresher, 200, {"access_token": "abc", "expires_in": 3599})
+
+    assert asyncio.run(refresher.request_token("refresh-token"))["access_token"] == "abc"
+
+
+def test_request_token_maps_invalid_grant_to_token_invalid(monkeypatch):
+    refresher = GoogleTokenRefresher()
+    token_endpoint(monkeypatch, refresher, 400, {"error": "invalid_grant"})
+
+    with pytest.raises(TokenInvalidError):
+        asyncio.run(refresher.request_token("refresh-token"))
+
+
+def test_request_token_maps_server_errors_to_unavailable(monkeypatch):
+    refresher = GoogleTokenRefresher()
+    token_endpoint(monkeypatch, refresher, 503, {})
+
+    with pytest.raises(AuthServiceUnavailableError):
+        asyncio.run(refresher.request_token("refresh-token"))
+
+
+def test_request_token_requires_a_refresh_token():
+    with pytest.raises(TokenInvalidError):
+        asyncio.run(GoogleTokenRefresher().request_token(None))
+
+
+@pytest.fixture
+def users_table(session_factory, monkeypatch):
+    @contextmanager
+    def get_db_session():
+        session = session_factory()
+        try:
+            yield session
+            session.commit()
+        finally:
+            session.close()
+
+    monkeypatch.setattr(db_manager, "get_db_session", get_db_session)
+    return session_factory
+
+
+def test_find_expiring_selects_active_users_inside_the_window(users_table):
+    now = datetime.utcnow()
+    session = users_table()
+    for user_id, expires_at, refresh_token, is_active in [
+        ("due-soon", now + timedelta(minutes=5), "r", True),
+        ("just-expired", now - timedelta(minutes=5), "r", True),
+        ("due-sooner", now + timedelta(minutes=1), "r", True),
+        ("later", now + timedelta(hours=2), "r", True),
+        ("long-expired", now - timedelta(hours=2), "r", True),
+        ("no-refresh-token", now + timedelta(minutes=5), None, True),
+        ("inactive", now + timedelta(minutes=5), "r", False),
+    ]:
+        session.add(User(id=user_id, firebase_uid=user_id, email=f"{user_id}@example.com",
+                         token_expires_at=expires_at, google_refresh_token=refresh_token, is_active=is_active))
+    session.commit()
+    session.close()
+
+    assert GoogleTokenRefresher._find_expiring(900, 10) == ["just-expired", "due-sooner", "due-soon"]
+    assert GoogleTokenRefresher._find_expiring(900, 2) == ["just-expired", "due-sooner"]
+
+
+def test_refresh_expiring_counts_outcomes_and_records_stats(refresher, redis_client, monkeypatch):
+    monkeypatch.setattr(refresher, "_find_expiring", lambda window, batch: ["u1", "missing"])
+
+    result = asyncio.run(refresher.refresh_expiring(900, 10, concurrency=2, rate_per_second=10))
+
+    assert result["candidates"] == 2
+    assert (result["refreshed"], result["already_fresh"], result["invalid_grant"], result["failed"]) == (1, 1, 0, 0)
+    stats = redis_client.hgetall(refresher.stats_key)
+    assert stats[b"refreshed"] == b"1" and stats[b"already_fresh"] == b"1"
+    assert stats[b"last_candidates"] == b"2"
+
+
+def test_refresh_expiring_counts_revoked_grants(refresher, monkeypatch):
+    async def request_token(refresh_token):
+        raise TokenInvalidError("Refresh token is invalid or expired")
+
+    monkeypatch.setattr(refresher, "_find_expiring", lambda window, batch: ["u1"])
+    monkeypatch.setattr(refresher, "request_token", request_token)
+
+    result = asyncio.run(refresher.refresh_expiring(900, 10, concurrency=2, rate_per_second=10))
+
+    assert (result["refreshed"], result["invalid_grant"]) == (0, 1)
+
+
+def test_refresh_expiring_runs_without_redis(refresher, store, monkeypatch):
+    monkeypatch.setattr(refresher, "_find_expiring", lambda window, batch: ["u1"])
+    monkeypatch.setattr(refresher, "_get_redis", lambda: None)
+
+    result = asyncio.run(refresher.refresh_expiring(900, 10, concurrency=2, rate_per_second=1))
+
+    assert result["refreshed"] == 1
+    assert store.stored == [("u1", "new-token-1", "refresh-token")]
@@ -0,0 +1,88 @@
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from app import id_token_cache
+from app.id_token_cache import VerifiedTokenCache
+
+
+@pytest.fixture
+def cache(redis_client):
+    token_cache = VerifiedTokenCache()
+    token_cache.redis_client = redis_client
+    return token_cache
+
+
+@pytest.fixture
+def get_user(monkeypatch):
+    lookup = mock.Mock(return_value=SimpleNamespace(tokens_valid_after_timestamp=0, disabled=False))
+    monkeypatch.setattr(id_token_cache.auth, "get_user", lookup)
+    return lookup
+
+
+def test_verified_token_is_served_until_it_expires(cache):
+    cache.put("token", {"uid": "u1", "exp": time.time() + 60})
+    cache.put("expired", {"uid": "u1", "exp": time.time() - 1})
+
+    assert cache.get("token")["uid"] == "u1"
+    assert cache.get("expired") is None
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_cache_evicts_least_recently_used_tokens(cache):
+    cache.max_size = 2
+    for token in ("a", "b"):
+        cache.put(token, {"exp": time.time() + 60})
+    cache.get("a")
+    cache.put("c", {"exp": time.time() + 60})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+
+def test_revocation_is_checked_once_per_interval_across_workers(cache, redis_client, get_user):
+    other_worker = VerifiedTokenCache()
+    other_worker.redis_client = redis_client
+
+    assert cache.revocation_reason("u1", time.time()) is None
+    assert cache.revocation_reason("u1", time.time()) is None
+    assert other_worker.revocation_reason("u1", time.time()) is None
+
+    assert get_user.call_count == 1
+
+
+def test_tokens_issued_before_revocation_are_rejected(cache, get_user):
+    get_user.return_value = SimpleNamespace(tokens_valid_after_timestamp=2_000_000_000_000, disabled=False)
+
+    assert cache.revocation_reason("u1", 1_999_999_999) == "revoked"
+    assert cache.revocation_reason("u1", 2_000_000_001) is None
+
+
+def test_disabled_and_deleted_users_are_rejected(cache, get_user):
+    get_user.return_value = SimpleNamespace(tokens_valid_after_timestamp=0, disabled=True)
+    assert cache.revocation_reason("disabled", time.time()) == "disabled"
+
+    get_user.side_effect = id_token_cache.auth.UserNotFoundError("gone")
+    assert cache.revocation_reason("deleted", time.time()) == "disabled"
+
+
+def test_last_known_state_is_kept_while_firebase_is_unreachable(cache, get_user):
+    cache.check_interval = 0
+    cache.mark_revoked("u1")
+    get_user.side_effect = RuntimeError("firebase down")
+    cache.redis_client.flushall()
+
+    assert cache.revocation_reason("u1", time.time() - 60) == "revoked"
+
+
+def test_mark_revoked_is_shared_with_other_workers(cache, redis_client, get_user):
+    other_worker = VerifiedTokenCache()
+    other_worker.redis_client = redis_client
+    issued_at = int(time.time()) - 1
+
+    cache.mark_revoked("u1")
+
+    assert other_worker.revocation_reason("u1", issued_at) == "revoked"
+    get_user.assert_not_called()
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from app import job_events
+from app.job_manager import JobStatus
+
+TASK = "app.robust_tasks.update_quota_usage_robust"
+
+
+@pytest.fixture(autouse=True)
+def async_redis(redis_server, monkeypatch):
+    client = fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True)
+    monkeypatch.setattr(job_events, "_redis_client", client)
+    return client
+
+
+def collect(job_id, last_event_id=None):
+    async def run():
+        return [frame async for frame in job_events.stream_job_events(job_id, last_event_id)]
+    return asyncio.run(run())
+
+
+def field(frame, name):
+    return next(line.split(": ", 1)[1] for line in frame.splitlines() if line.startswith(f"{name}: "))
+
+
+def event_names(frames):
+    return [line.split(": ", 1)[1] for frame in frames for line in frame.splitlines() if line.startswith("event: ")]
+
+
+def test_stream_replays_events_and_ends_on_terminal_status(job_manager):
+    job_id = job_manager.submit_job(TASK)
+    job_manager.update_job_status(job_id, JobStatus.RUNNING, progress=0.5)
+    job_manager.update_job_status(job_id, JobStatus.SUCCESS)
+
+    frames = collect(job_id)
+
+    assert event_names(frames) == ["progress", "success"]
+    assert json.loads(field(frames[0], "data"))["progress"] == "0.5"
+
+
+def test_stream_resumes_after_last_event_id(job_manager):
+    job_id = job_manager.submit_job(TASK)
+    job_manager.update_job_status(job_id, JobStatus.RUNNING)
+    job_manager.update_job_status(job_id, JobStatus.SUCCESS)
+    first_id = field(collect(job_id)[0], "id")
+
+    assert event_names(collect(job_id, last_event_id=first_id)) == ["success"]
+
+
+def test_stream_delivers_live_events(job_manager):
+    job_id = job_manager.submit_job(TASK)
+    job_manager.update_job_status(job_id, JobStatus.RUNNING)
+
+    async def run():
+        frames = []
+
+        async def consume():
+            async for frame in job_events.stream_job_events(job_id):
+                frames.append(frame)
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        job_manager.update_job_status(job_id, JobStatus.SUCCESS)
+        await asyncio.wait_for(consumer, timeout=5)
+        return frames
+
+    assert event_names(asyncio.run(run())) == ["running", "success"]
+
+
+def test_stalled_stream_ends_with_timeout(job_manager, monkeypatch):
+    monkeypatch.setattr(job_events, "KEEPALIVE_SECONDS", 0.05)
+    monkeypatch.setattr(job_events, "IDLE_TIMEOUT_SECONDS", 0.2)
+    job_id = job_manager.submit_job(TASK)
+
+    frames = collect(job_id)
+
+    assert event_names(frames) == ["pending", "timeout"]
+    assert ": keepalive\n\n" in frames
+
+
+def test_owner_is_taken_from_user_id_kwarg(job_manager):
+    job_id = job_manager.submit_job(TASK, kwargs={"user_id": "u1"})
+
+    assert job_manager.get_job_status(job_id).user_id == "u1"
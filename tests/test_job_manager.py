@@ -0,0 +1,343 @@
+import json
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app.job_manager import ErrorKind, JobStatus, JobSubmission
+
+TASK = "app.robust_tasks.update_quota_usage_robust"
+
+
+def submit(job_manager, *args, **kwargs):
+    return job_manager.submit_job(TASK, args=list(args), **kwargs)
+
+
+def status_members(job_manager, status):
+    return {member.decode() for member in job_manager.redis_client.zrange(job_manager._status_key(status), 0, -1)}
+
+
+def test_statistics_count_jobs_per_status(job_manager):
+    job_ids = [submit(job_manager, i) for i in range(3)]
+    job_manager.update_job_status(job_ids[0], JobStatus.RUNNING)
+    job_manager.update_job_status(job_ids[1], JobStatus.RUNNING)
+    job_manager.update_job_status(job_ids[1], JobStatus.SUCCESS)
+
+    stats = job_manager.get_job_statistics()
+
+    assert stats["pending_jobs"] == 1
+    assert stats["active_jobs"] == 1
+    assert stats["completed_jobs"] == 1
+    assert stats["total_transitions"] == {"pending": 3, "running": 2, "success": 1}
+
+
+def test_update_writes_only_changed_fields_and_moves_status_index(job_manager):
+    job_id = submit(job_manager, "u1", "videos_update", 50)
+
+    job_manager.update_job_status(job_id, JobStatus.RUNNING, progress=0.5)
+
+    metadata = job_manager.get_job_status(job_id)
+    assert metadata.status == JobStatus.RUNNING
+    assert metadata.progress == 0.5
+    assert metadata.args == ["u1", "videos_update", 50]
+    assert metadata.started_at is not None
+    assert status_members(job_manager, JobStatus.PENDING) == set()
+    assert status_members(job_manager, JobStatus.RUNNING) == {job_id}
+
+
+def test_started_at_is_kept_from_the_first_start(job_manager):
+    job_id = submit(job_manager)
+    job_manager.update_job_status(job_id, JobStatus.RUNNING)
+    first_start = job_manager.get_job_status(job_id).started_at
+
+    job_manager.update_job_status(job_id, JobStatus.RUNNING, progress=0.9)
+
+    assert job_manager.get_job_status(job_id).started_at == first_start
+
+
+def test_finished_job_records_result_and_completion(job_manager):
+    job_id = submit(job_manager)
+    job_manager.update_job_status(job_id, JobStatus.RUNNING)
+
+    job_manager.update_job_status(job_id, JobStatus.SUCCESS, result={"rows": 2})
+
+    metadata = job_manager.get_job_status(job_id)
+    assert metadata.result == {"rows": 2}
+    assert metadata.completed_at is not None
+
+
+def test_update_of_unknown_job_creates_nothing(job_manager, redis_client):
+    job_manager.update_job_status("job_missing", JobStatus.RUNNING)
+
+    assert not redis_client.exists(f"{job_manager.job_metadata_key}:job_missing")
+    assert status_members(job_manager, JobStatus.RUNNING) == set()
+
+
+def test_transient_failure_is_queued_for_recovery(job_manager, redis_client):
+    job_id = submit(job_manager)
+
+    job_manager.update_job_status(job_id, JobStatus.FAILED, error_message="boom", error_kind=ErrorKind.TRANSIENT)
+
+    assert redis_client.zscore(job_manager.recoverable_key, job_id) is not None
+
+
+def test_legacy_json_job_is_rewritten_as_a_hash_on_update(job_manager, redis_client):
+    key = f"{job_manager.job_metadata_key}:job_legacy"
+    redis_client.set(key, json.dumps({
+        "job_id": "job_legacy", "task_name": TASK, "status": "pending", "priority": 2,
+        "created_at": datetime.utcnow().isoformat(), "args": ["u1"], "kwargs": {}
+    }))
+
+    job_manager.update_job_status("job_legacy", JobStatus.RUNNING)
+
+    assert redis_client.type(key) == b"hash"
+    metadata = job_manager.get_job_status("job_legacy")
+    assert metadata.status == JobStatus.RUNNING
+    assert metadata.args == ["u1"]
+
+
+def test_query_pages_through_a_users_jobs_newest_first(job_manager):
+    job_ids = [submit(job_manager, i, user_id="u1") for i in range(5)]
+    submit(job_manager, user_id="u2")
+
+    first = job_manager.query_jobs(user_id="u1", limit=2)
+    second = job_manager.query_jobs(user_id="u1", limit=2, cursor=first["next_cursor"])
+    third = job_manager.query_jobs(user_id="u1", limit=2, cursor=second["next_cursor"])
+
+    pages = [[job["job_id"] for job in page["jobs"]] for page in (first, second, third)]
+    assert sum(pages, []) == list(reversed(job_ids))
+    assert third["next_cursor"] is None
+
+
+def test_query_applies_remaining_filters(job_manager):
+    running = submit(job_manager, user_id="u1")
+    submit(job_manager, user_id="u1")
+    job_manager.update_job_status(running, JobStatus.RUNNING)
+
+    result = job_manager.query_jobs(user_id="u1", status=JobStatus.RUNNING)
+
+    assert [job["job_id"] for job in result["jobs"]] == [running]
+
+
+def test_query_requires_a_filter(job_manager):
+    assert "error" in job_manager.query_jobs()
+
+
+def age_job(job_manager, job_id, seconds):
+    """Move a job's created-at score back in every index"""
+    redis_client = job_manager.redis_client
+    for key in redis_client.keys("ttpr:job_index:*"):
+        if redis_client.type(key) == b"zset" and redis_client.zscore(key, job_id) is not None:
+            redis_client.zincrby(key, -seconds, job_id)
+
+
+def test_expiry_deletes_only_jobs_past_the_ttl(job_manager, redis_client):
+    old_job = submit(job_manager)
+    new_job = submit(job_manager)
+    age_job(job_manager, old_job, job_manager.metadata_ttl + 60)
+
+    result = job_manager.expire_old_jobs()
+
+    assert result["expired_jobs"] == 1
+    assert not redis_client.exists(f"{job_manager.job_metadata_key}:{old_job}")
+    assert job_manager.get_job_status(new_job) is not None
+    assert status_members(job_manager, JobStatus.PENDING) == {new_job}
+
+
+def test_expiry_trims_dead_letters_past_retention(job_manager, redis_client):
+    old = (datetime.utcnow() - timedelta(seconds=job_manager.dead_letter_retention + 60)).isoformat()
+    redis_client.lpush(job_manager.dead_letter_key, json.dumps({"job_id": "old", "moved_to_dlq_at": old}))
+    redis_client.lpush(job_manager.dead_letter_key, json.dumps({"job_id": "new", "moved_to_dlq_at": datetime.utcnow().isoformat()}))
+
+    result = job_manager.expire_old_jobs()
+
+    assert result["dead_letter_trimmed"] == 1
+    assert [json.loads(raw)["job_id"] for raw in redis_client.lrange(job_manager.dead_letter_key, 0, -1)] == ["new"]
+
+
+def fail(job_manager, job_id, kind):
+    job_manager.update_job_status(job_id, JobStatus.RUNNING)
+    job_manager.update_job_status(job_id, JobStatus.FAILED, error_message="boom", error_kind=kind)
+
+
+def test_recovery_replays_transient_failures_with_their_arguments(job_manager, monkeypatch):
+    monkeypatch.setattr(job_manager, "_dependencies_healthy", lambda: True)
+    job_manager.recovery_base_delay = 0
+    job_id = submit(job_manager, "u1", "videos_update", 50, user_id="u1")
+    fail(job_manager, job_id, ErrorKind.TRANSIENT)
+    job_manager.celery_app.send_task.reset_mock()
+
+    stats = job_manager.recover_jobs()
+
+    assert stats["replayed"] == 1
+    call = job_manager.celery_app.send_task.call_args
+    assert call.args == (TASK,)
+    assert call.kwargs["args"] == ["u1", "videos_update", 50]
+    replay = job_manager.get_job_status(call.kwargs["task_id"])
+    assert replay.retry_count == 1 and replay.user_id == "u1"
+    assert job_manager.get_job_status(job_id).status == JobStatus.RETRY
+
+
+def test_recovery_skips_permanent_failures_and_waits_out_backoff(job_manager, monkeypatch):
+    monkeypatch.setattr(job_manager, "_dependencies_healthy", lambda: True)
+    permanent = submit(job_manager)
+    fail(job_manager, permanent, ErrorKind.PERMANENT)
+    backing_off = submit(job_manager)
+    fail(job_manager, backing_off, ErrorKind.TRANSIENT)
+    job_manager.celery_app.send_task.reset_mock()
+
+    stats = job_manager.recover_jobs()
+
+    assert stats["replayed"] == 0 and stats["backing_off"] == 1
+    job_manager.celery_app.send_task.assert_not_called()
+
+
+def test_failed_resubmission_keeps_the_job_recoverable(job_manager, redis_client, monkeypatch):
+    monkeypatch.setattr(job_manager, "_dependencies_healthy", lambda: True)
+    job_manager.recovery_base_delay = 0
+    job_id = submit(job_manager, "u1")
+    fail(job_manager, job_id, ErrorKind.TRANSIENT)
+    job_manager.celery_app.send_task.side_effect = ConnectionError("broker down")
+
+    stats = job_manager.recover_jobs()
+
+    assert stats["replayed"] == 0 and stats["resubmit_failed"] == 1
+    assert redis_client.zscore(job_manager.recoverable_key, job_id) is not None
+    failed = job_manager.get_job_status(job_id)
+    assert failed.status == JobStatus.FAILED and failed.retry_count == 0
+
+    job_manager.celery_app.send_task.side_effect = None
+    redis_client.zadd(job_manager.recoverable_key, {job_id: 0})
+    assert job_manager.recover_jobs()["replayed"] == 1
+    assert redis_client.zscore(job_manager.recoverable_key, job_id) is None
+
+
+def test_index_scores_are_epoch_seconds_on_non_utc_hosts(job_manager, redis_client, monkeypatch):
+    monkeypatch.setenv("TZ", "America/Los_Angeles")
+    time.tzset()
+    try:
+        job_id = submit(job_manager)
+        score = redis_client.zscore(job_manager.created_index_key, job_id)
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
+
+    assert abs(score - time.time()) < 5
+
+
+def test_recovery_waits_for_dependencies(job_manager, monkeypatch):
+    monkeypatch.setattr(job_manager, "_dependencies_healthy", lambda: False)
+
+    assert job_manager.recover_jobs() == {"status": "skipped", "reason": "dependencies_unavailable"}
+
+
+def test_transient_dead_letters_are_replayed_once(job_manager, redis_client, monkeypatch):
+    monkeypatch.setattr(job_manager, "_dependencies_healthy", lambda: True)
+    moved_at = datetime.utcnow() - timedelta(seconds=job_manager.recovery_max_delay + 60)
+    entry = {"job_id": "job_dead", "task_name": TASK, "args": ["u1"], "kwargs": {}, "priority": 2,
+             "error_kind": ErrorKind.TRANSIENT, "dead_letter_replays": 0, "moved_to_dlq_at": moved_at.isoformat()}
+    redis_client.lpush(job_manager.dead_letter_key, json.dumps(entry))
+    redis_client.lpush(job_manager.dead_letter_key, json.dumps({**entry, "job_id": "job_spent", "dead_letter_replays": 1}))
+
+    stats = job_manager.recover_jobs()
+
+    assert stats["dead_letter_replayed"] == 1
+    assert job_manager.celery_app.send_task.call_args.kwargs["args"] == ["u1"]
+    assert [json.loads(raw)["job_id"] for raw in redis_client.lrange(job_manager.dead_letter_key, 0, -1)] == ["job_spent"]
+
+
+def test_ordinary_tasks_are_not_deduplicated(job_manager):
+    assert submit(job_manager, "u1") != submit(job_manager, "u1")
+
+
+def test_idempotent_task_submitted_twice_returns_the_queued_job(job_manager):
+    first = job_manager.submit_job("app.robust_tasks.rotate_titles_robust")
+    second = job_manager.submit_job("app.robust_tasks.rotate_titles_robust")
+
+    assert first == second
+    assert job_manager.celery_app.send_task.call_count == 1
+
+
+def test_explicit_idempotency_key_deduplicates_any_task(job_manager):
+    first = submit(job_manager, "u1", idempotency_key="charge-1")
+
+    assert submit(job_manager, "u2", idempotency_key="charge-1") == first
+    assert submit(job_manager, "u1", idempotency_key="charge-2") != first
+
+
+def test_finished_job_releases_its_idempotency_key(job_manager):
+    first = job_manager.submit_job("app.robust_tasks.rotate_titles_robust")
+    job_manager.update_job_status(first, JobStatus.RUNNING)
+    job_manager.update_job_status(first, JobStatus.SUCCESS)
+
+    second = job_manager.submit_job("app.robust_tasks.rotate_titles_robust")
+
+    assert second != first
+
+
+def test_release_leaves_a_key_claimed_by_a_newer_job(job_manager, redis_client):
+    first = submit(job_manager, idempotency_key="k")
+    redis_client.set(f"{job_manager.dedup_key}:k", "job_newer")
+
+    job_manager.update_job_status(first, JobStatus.CANCELLED)
+
+    assert redis_client.get(f"{job_manager.dedup_key}:k") == b"job_newer"
+
+
+def test_failed_submission_releases_its_claim(job_manager):
+    job_manager.celery_app.send_task.side_effect = [RuntimeError("broker down"), mock.DEFAULT]
+
+    assert submit(job_manager, idempotency_key="k") is None
+    assert submit(job_manager, idempotency_key="k") is not None
+
+
+
+def test_submit_many_returns_ids_in_order_and_stores_metadata(job_manager):
+    job_manager.celery_app = mock.MagicMock()
+
+    job_ids = job_manager.submit_many([JobSubmission(TASK, args=[n], kwargs={"user_id": f"u{n}"}) for n in range(3)])
+
+    assert len(set(job_ids)) == 3
+    assert [job_manager.get_job_status(job_id).args for job_id in job_ids] == [[0], [1], [2]]
+    assert job_manager.get_job_status(job_ids[2]).user_id == "u2"
+    assert status_members(job_manager, JobStatus.PENDING) == set(job_ids)
+    sent = job_manager.celery_app.send_task.call_args_list
+    assert [call.kwargs["task_id"] for call in sent] == job_ids
+
+
+def test_submit_many_publishes_each_chunk_over_one_producer(job_manager):
+    job_manager.celery_app = mock.MagicMock()
+    producer = job_manager.celery_app.producer_or_acquire.return_value.__enter__.return_value
+
+    job_manager.submit_many([JobSubmission(TASK, args=[n]) for n in range(5)], chunk_size=2)
+
+    assert job_manager.celery_app.producer_or_acquire.call_count == 3
+    assert all(call.kwargs["producer"] is producer for call in job_manager.celery_app.send_task.call_args_list)
+
+
+def test_submit_many_resolves_duplicates_to_the_queued_job(job_manager):
+    job_manager.celery_app = mock.MagicMock()
+    queued = job_manager.submit_job("app.robust_tasks.rotate_titles_robust")
+
+    job_ids = job_manager.submit_many([
+        JobSubmission("app.robust_tasks.rotate_titles_robust"),
+        JobSubmission(TASK, idempotency_key="k"),
+        JobSubmission(TASK, idempotency_key="k"),
+    ])
+
+    assert job_ids[0] == queued
+    assert job_ids[1] == job_ids[2] != queued
+    assert job_manager.celery_app.send_task.call_count == 2
+
+
+def test_submit_many_releases_claims_of_unpublished_jobs(job_manager, redis_client):
+    job_manager.celery_app = mock.MagicMock()
+    job_manager.celery_app.send_task.side_effect = [mock.Mock(), ConnectionError("broker down")]
+
+    job_ids = job_manager.submit_many([
+        JobSubmission(TASK, idempotency_key="sent"),
+        JobSubmission(TASK, idempotency_key="unsent"),
+    ])
+
+    assert job_ids[0] is not None and job_ids[1] is None
+    assert redis_client.exists(f"{job_manager.dedup_key}:sent")
+    assert not redis_client.exists(f"{job_manager.dedup_key}:unsent")
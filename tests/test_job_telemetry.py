@@ -0,0 +1,100 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import job_manager as job_manager_module
+from app.job_manager import JobStatus, robust_task
+from app.job_telemetry import SENT_AT_HEADER, request_queue_wait, stamp_sent_time
+
+TASK = "app.robust_tasks.rotate_titles_robust"
+
+
+def task_summary(job_manager, task_name=TASK):
+    return job_manager.telemetry.get_summary()["tasks"][task_name]
+
+
+def test_observations_land_in_buckets_and_export(job_manager):
+    job_manager.telemetry.observe(TASK, "run_time", 0.3, outcome="success")
+    job_manager.telemetry.observe(TASK, "run_time", 45, outcome="failed")
+    job_manager.telemetry.record_retry(TASK)
+
+    summary = task_summary(job_manager)
+    exported = job_manager.telemetry.export_prometheus()
+
+    assert summary["run_time"]["count"] == 2
+    assert summary["outcomes"] == {"success": 1, "failed": 1}
+    assert summary["retries"] == {"retry": 1}
+    assert f'ttpr_job_run_time_seconds_bucket{{task="{TASK}",le="0.5"}} 1' in exported
+    assert f'ttpr_job_run_time_seconds_bucket{{task="{TASK}",le="+Inf"}} 2' in exported
+
+
+def test_submitted_job_records_queue_wait_and_run_time_once(job_manager):
+    job_id = job_manager.submit_job(TASK)
+    job_manager.update_job_status(job_id, JobStatus.RUNNING)
+    job_manager.update_job_status(job_id, JobStatus.RUNNING, progress=0.5)
+    job_manager.update_job_status(job_id, JobStatus.SUCCESS)
+
+    summary = task_summary(job_manager)
+
+    assert summary["queue_wait"]["count"] == 1
+    assert summary["run_time"]["count"] == 1
+    assert summary["outcomes"] == {"success": 1}
+
+
+def test_publish_hook_stamps_send_time_once():
+    headers = {}
+    stamp_sent_time(headers=headers)
+    sent_at = headers[SENT_AT_HEADER]
+    stamp_sent_time(headers=headers)
+
+    assert headers[SENT_AT_HEADER] == sent_at
+
+
+def test_queue_wait_counts_from_eta_when_later():
+    eta = 1767225600.0  # 2026-01-01T00:00:00Z
+    request = SimpleNamespace(**{SENT_AT_HEADER: eta - 300, "eta": None})
+    assert request_queue_wait(request, eta + 10) == pytest.approx(310)
+
+    request.eta = "2026-01-01T00:00:00+00:00"
+    assert request_queue_wait(request, eta + 10) == pytest.approx(10)
+
+    assert request_queue_wait(SimpleNamespace(), eta) is None
+
+
+@pytest.fixture
+def bound_task(job_manager, monkeypatch):
+    monkeypatch.setattr(job_manager_module, "job_manager", job_manager)
+
+    @robust_task()
+    def rotate(self, fail=False):
+        if fail:
+            raise ValueError("boom")
+        return "done"
+
+    return rotate
+
+
+def beat_request():
+    return SimpleNamespace(request=SimpleNamespace(task=TASK, eta=None, **{SENT_AT_HEADER: time.time() - 2}))
+
+
+def test_beat_task_without_job_id_is_timed_from_its_request(job_manager, bound_task):
+    assert bound_task(beat_request()) == "done"
+    with pytest.raises(ValueError):
+        bound_task(beat_request(), fail=True)
+
+    summary = task_summary(job_manager)
+    assert summary["queue_wait"]["count"] == 2
+    assert summary["queue_wait"]["avg_seconds"] == pytest.approx(2, abs=0.5)
+    assert summary["outcomes"] == {"success": 1, "failed": 1}
+
+
+def test_task_with_job_id_is_timed_only_from_its_metadata(job_manager, bound_task):
+    job_id = job_manager.submit_job(TASK)
+
+    bound_task(beat_request(), job_id=job_id)
+
+    summary = task_summary(job_manager)
+    assert summary["queue_wait"]["count"] == 1
+    assert summary["run_time"]["count"] == 1
@@ -0,0 +1,76 @@
+from datetime import datetime
+from unittest import mock
+
+import redis
+
+from app.quota_scheduler import DEFAULT_PLAN
+
+
+def go_degraded(quota_manager, workers=2):
+    quota_manager.connection_healthy = False
+    quota_manager._last_reconnect_attempt = float("inf")
+    quota_manager.degraded_accountant.worker_count = workers
+    return quota_manager.degraded_accountant
+
+
+def test_degraded_budget_is_worker_share_of_remaining_quota(quota_manager):
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    accountant = go_degraded(quota_manager, workers=4)
+    accountant.remember_usage(today, 2000)
+
+    result = quota_manager.check_quota_available("videos_update", user_id="u1")
+
+    assert result["allowed"] and result["degraded"]
+    assert accountant.daily_budget == 2000
+
+
+def test_degraded_check_refuses_past_local_share(quota_manager):
+    accountant = go_degraded(quota_manager, workers=100)
+
+    for _ in range(2):
+        quota_manager.record_quota_usage("videos_update", user_id="u1")
+    result = quota_manager.check_quota_available("videos_update", user_id="u1")
+
+    assert not result["allowed"]
+    assert result["reason"] == "daily_quota_exceeded"
+    assert accountant.daily_budget == 100
+
+
+def test_redis_error_during_check_switches_to_degraded_mode(quota_manager):
+    quota_manager.redis_client = mock.Mock(get=mock.Mock(side_effect=redis.ConnectionError("down")))
+
+    result = quota_manager.check_quota_available("videos_list")
+
+    assert result["degraded"]
+    assert not quota_manager.connection_healthy
+
+
+def test_reconcile_merges_journal_into_central_counters(quota_manager, redis_client):
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    accountant = go_degraded(quota_manager)
+    quota_manager.record_quota_usage("videos_update", user_id="u1")
+    quota_manager.record_quota_usage("videos_list")
+
+    result = accountant.reconcile()
+
+    assert result["reconciled_units"] == 51
+    assert int(redis_client.get(f"yt_quota:daily:{today}")) == 51
+    assert int(redis_client.hget(f"yt_quota:tenant_usage:{today}", "u1")) == 50
+    assert redis_client.hget(f"yt_quota:tenants:{today}", "u1").decode() == DEFAULT_PLAN
+    assert not accountant.active and not accountant.journal
+
+
+def test_reconnect_stays_degraded_until_journal_is_merged(quota_manager, redis_client):
+    accountant = go_degraded(quota_manager)
+    quota_manager.record_quota_usage("videos_update", user_id="u1")
+    quota_manager._last_reconnect_attempt = 0.0
+
+    with mock.patch.object(redis_client, "pipeline", side_effect=redis.ConnectionError("down")):
+        assert not quota_manager._try_reconnect()
+    assert not quota_manager.connection_healthy
+    assert sum(accountant.journal.values()) == 50
+
+    quota_manager._last_reconnect_attempt = 0.0
+    assert quota_manager._try_reconnect()
+    assert quota_manager.connection_healthy
+    assert not accountant.journal
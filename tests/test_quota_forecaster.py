@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from app.models import ABTest, User
+from app.quota_forecaster import AdmissionDecision, QuotaForecaster
+
+
+def add_active_test(db, started_at, duration_hours=24, interval_hours=1):
+    if db.get(User, "owner") is None:
+        db.add(User(id="owner", firebase_uid="owner", email="owner@example.com"))
+    db.add(ABTest(
+        user_id="owner", video_id="v", video_title="t", status="active",
+        started_at=started_at, test_duration_hours=duration_hours, rotation_interval_hours=interval_hours
+    ))
+    db.commit()
+
+
+def test_rotation_times_are_strictly_after_now_and_before_end():
+    forecaster = QuotaForecaster()
+    started_at = datetime(2026, 1, 1, 0, 0)
+    now = datetime(2026, 1, 1, 2, 0)
+
+    times = list(forecaster._rotation_times(started_at, 6, 2, now, now + timedelta(days=1)))
+
+    assert times == [datetime(2026, 1, 1, 4, 0)]
+
+
+def test_forecast_projects_active_test_rotations(quota_manager, db):
+    forecaster = QuotaForecaster(quota_manager)
+    now = datetime(2026, 1, 1, 0, 30)
+    add_active_test(db, datetime(2026, 1, 1, 0, 0), duration_hours=4, interval_hours=1)
+
+    forecast = forecaster.get_forecast(db, now=now)
+
+    projected = {point["hour"]: point["projected_units"] for point in forecast["curve"] if point["projected_units"]}
+    assert projected == {
+        "2026-01-01T01:00:00": 51,
+        "2026-01-01T02:00:00": 51,
+        "2026-01-01T03:00:00": 51
+    }
+    assert forecast["projected_exhaustion_at"] is None
+
+
+def test_forecast_reports_exhaustion_hour(quota_manager, db):
+    quota_manager.quota_limits.daily_limit = 100
+    forecaster = QuotaForecaster(quota_manager)
+    now = datetime(2026, 1, 1, 0, 30)
+    add_active_test(db, datetime(2026, 1, 1, 0, 0), duration_hours=4, interval_hours=1)
+
+    forecast = forecaster.get_forecast(db, now=now)
+
+    assert forecast["projected_exhaustion_at"] == "2026-01-01T02:00:00"
+
+
+def test_test_that_cannot_fit_in_any_day_is_rejected(quota_manager, db):
+    quota_manager.quota_limits.daily_limit = 1000
+    forecaster = QuotaForecaster(quota_manager)
+
+    result = forecaster.evaluate_admission(db, duration_hours=24, interval_hours=1)
+
+    assert result["decision"] == AdmissionDecision.REJECT
+    assert result["reason"] == "test_exceeds_daily_quota"
+
+
+def test_test_within_budget_is_admitted(quota_manager, db):
+    forecaster = QuotaForecaster(quota_manager)
+
+    result = forecaster.evaluate_admission(db, duration_hours=24, interval_hours=4)
+
+    assert result["decision"] == AdmissionDecision.ADMIT
+
+
+def test_test_is_deferred_until_active_tests_leave_room(quota_manager, db, monkeypatch):
+    now = datetime(2026, 1, 1, 12, 0)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now
+
+    monkeypatch.setattr("app.quota_forecaster.datetime", FrozenDatetime)
+    quota_manager.quota_limits.daily_limit = 1200  # 1080 admission budget
+    forecaster = QuotaForecaster(quota_manager)
+    # 4 tests x 5 remaining rotations x 51 units = 1020 units today
+    for _ in range(4):
+        add_active_test(db, datetime(2026, 1, 1, 11, 30), duration_hours=6, interval_hours=1)
+
+    result = forecaster.evaluate_admission(db, duration_hours=24, interval_hours=4)
+
+    # From 20:00 the new test rotates only once more before midnight
+    assert result["decision"] == AdmissionDecision.DEFER
+    assert result["earliest_start"] == "2026-01-01T20:00:00"
+    assert result["retry_after"] == 8 * 3600
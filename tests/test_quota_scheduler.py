@@ -0,0 +1,121 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.quota_scheduler import PLAN_WEIGHTS, FairShareQuotaScheduler
+
+
+@pytest.fixture
+def midday(monkeypatch):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(2026, 1, 1, 12, 0)
+
+    monkeypatch.setattr("app.quota_scheduler.datetime", FrozenDatetime)
+
+
+def test_plan_weight_defaults_to_free_for_unknown_plans():
+    assert FairShareQuotaScheduler.get_plan_weight("Enterprise") == PLAN_WEIGHTS["enterprise"]
+    assert FairShareQuotaScheduler.get_plan_weight("platinum") == PLAN_WEIGHTS["free"]
+    assert FairShareQuotaScheduler.get_plan_weight(None) == PLAN_WEIGHTS["free"]
+
+
+def test_entitlement_is_weighted_slice_of_daily_limit(quota_manager):
+    scheduler = quota_manager.scheduler
+    scheduler.register_tenant("free-user", "free")
+    scheduler.register_tenant("pro-user", "professional")
+
+    report = {row["user_id"]: row for row in scheduler.get_tenant_report()["tenants"]}
+
+    assert report["free-user"]["entitlement"] == 2000
+    assert report["pro-user"]["entitlement"] == 8000
+
+
+def test_tenant_within_entitlement_is_allowed(quota_manager):
+    scheduler = quota_manager.scheduler
+    scheduler.register_tenant("a", "free")
+    scheduler.register_tenant("b", "free")
+    scheduler.record_usage("a", 4000)
+
+    result = scheduler.check_tenant_allowance("a", 1000, daily_usage=4000)
+
+    assert result == {"allowed": True, "within_entitlement": True}
+
+
+def test_tenant_may_borrow_share_of_idle_tenants(quota_manager, midday):
+    scheduler = quota_manager.scheduler
+    scheduler.register_tenant("a", "free")
+    scheduler.register_tenant("b", "free")
+    scheduler.record_usage("a", 5000)
+
+    result = scheduler.check_tenant_allowance("a", 4000, daily_usage=5000)
+
+    assert result == {"allowed": True, "within_entitlement": False, "borrowed": True}
+
+
+def test_borrowing_leaves_others_their_expected_demand(quota_manager, midday):
+    scheduler = quota_manager.scheduler
+    scheduler.register_tenant("a", "free")
+    scheduler.register_tenant("b", "free")
+    scheduler.record_usage("a", 5000)
+    # Half the day gone: b is expected to spend another 2000
+    scheduler.record_usage("b", 2000)
+
+    assert scheduler.check_tenant_allowance("a", 1000, daily_usage=7000)["allowed"]
+    result = scheduler.check_tenant_allowance("a", 1050, daily_usage=7000)
+
+    assert not result["allowed"]
+    assert result["reason"] == "tenant_share_exceeded"
+    assert result["limit"] == 5000
+
+
+def test_expected_demand_follows_pace_up_to_unused_entitlement():
+    midday = datetime(2026, 1, 1, 12, 0)
+
+    assert FairShareQuotaScheduler._expected_demand({"used": 1000, "entitlement": 5000}, midday) == 1000
+    assert FairShareQuotaScheduler._expected_demand({"used": 4000, "entitlement": 5000}, midday) == 1000
+    assert FairShareQuotaScheduler._expected_demand({"used": 6000, "entitlement": 5000}, midday) == 0
+
+
+def test_allowance_fails_open_without_redis(quota_manager):
+    quota_manager.connection_healthy = False
+
+    result = quota_manager.scheduler.check_tenant_allowance("a", 10**6, daily_usage=0)
+
+    assert result == {"allowed": True, "reason": "fair_share_unavailable"}
+
+
+def test_order_by_fair_share_serves_heavier_plans_more_often(quota_manager):
+    items = [SimpleNamespace(user="free", plan="free") for _ in range(3)] + \
+            [SimpleNamespace(user="ent", plan="enterprise") for _ in range(3)]
+
+    ordered = quota_manager.scheduler.order_by_fair_share(
+        items, tenant_of=lambda i: i.user, plan_of=lambda i: i.plan, cost_of=lambda i: 50
+    )
+
+    assert [i.user for i in ordered] == ["ent", "ent", "ent", "free", "free", "free"]
+
+
+def test_order_by_fair_share_puts_heavy_consumers_last(quota_manager):
+    quota_manager.scheduler.record_usage("busy", 9000)
+    items = [SimpleNamespace(user="busy", plan="free"), SimpleNamespace(user="idle", plan="free")]
+
+    ordered = quota_manager.scheduler.order_by_fair_share(
+        items, tenant_of=lambda i: i.user, plan_of=lambda i: i.plan, cost_of=lambda i: 50
+    )
+
+    assert [i.user for i in ordered] == ["idle", "busy"]
+
+
+def test_check_quota_available_enforces_fair_share(quota_manager, midday):
+    scheduler = quota_manager.scheduler
+    scheduler.register_tenant("a", "free")
+    scheduler.register_tenant("b", "free")
+    quota_manager.record_quota_usage("videos_update", user_id="a", cost_override=5000)
+    quota_manager.record_quota_usage("videos_update", user_id="b", cost_override=4000)
+
+    result = quota_manager.check_quota_available("videos_update", user_id="a")
+
+    assert result["reason"] == "tenant_share_exceeded"
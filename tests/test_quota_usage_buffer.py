@@ -0,0 +1,124 @@
+from datetime import datetime
+from unittest import mock
+
+import pytest
+import redis
+
+from app.models import QuotaUsage
+from app.quota_usage_buffer import QuotaUsageBuffer
+
+
+@pytest.fixture
+def buffer(redis_client):
+    quota_buffer = QuotaUsageBuffer()
+    quota_buffer.redis_client = redis_client
+    return quota_buffer
+
+
+def usage_rows(db):
+    return {row.user_id: row for row in db.query(QuotaUsage).all()}
+
+
+def test_pending_counters_are_visible_before_flush(buffer):
+    buffer.record("u1", "videos_update", 50)
+    buffer.record("u1", "videos_list", 1)
+
+    pending = buffer.get_pending("u1")
+
+    assert pending == {"api_calls_count": 2, "quota_units_used": 51, "videos_list_calls": 1, "videos_update_calls": 1}
+
+
+def test_flush_writes_one_row_per_user_and_day(buffer, db):
+    for _ in range(3):
+        buffer.record("u1", "videos_update", 50)
+    buffer.record("u2", "videos_list", 1)
+
+    result = buffer.flush(db)
+
+    rows = usage_rows(db)
+    assert result["rows_written"] == 2 and result["quota_units"] == 151
+    assert rows["u1"].quota_units_used == 150 and rows["u1"].videos_update_calls == 3
+    assert rows["u2"].api_calls_count == 1
+    assert buffer.get_pending("u1")["quota_units_used"] == 0
+
+
+def test_flush_adds_to_existing_row(buffer, db):
+    today = datetime.strptime(datetime.utcnow().strftime('%Y-%m-%d'), '%Y-%m-%d')
+    db.add(QuotaUsage(user_id="u1", date=today, api_calls_count=1, quota_units_used=50,
+                      videos_list_calls=0, videos_update_calls=1))
+    db.commit()
+    buffer.record("u1", "videos_update", 50)
+
+    buffer.flush(db)
+
+    assert db.query(QuotaUsage).count() == 1
+    assert usage_rows(db)["u1"].quota_units_used == 100
+
+
+def test_failed_write_puts_counters_back(buffer, db):
+    buffer.record("u1", "videos_update", 50)
+
+    with mock.patch.object(buffer, "_write_batch", side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            buffer.flush(db)
+
+    assert buffer.get_pending("u1")["quota_units_used"] == 50
+    buffer.flush(db)
+    assert usage_rows(db)["u1"].quota_units_used == 50
+
+
+def test_flush_is_skipped_while_another_flush_holds_the_lock(buffer, db, redis_client):
+    redis_client.set(buffer.lock_key, "1")
+    buffer.record("u1", "videos_update", 50)
+
+    assert buffer.flush(db) == {"status": "skipped", "reason": "flush_in_progress"}
+    assert not usage_rows(db)
+
+
+def test_counters_are_kept_in_process_and_flushed_while_redis_is_down(buffer, db):
+    buffer.redis_client = mock.Mock(
+        pipeline=mock.Mock(side_effect=redis.ConnectionError("down")),
+        set=mock.Mock(side_effect=redis.ConnectionError("down")),
+        hgetall=mock.Mock(side_effect=redis.ConnectionError("down"))
+    )
+    buffer.record("u1", "videos_update", 50)
+    assert buffer.get_pending("u1")["quota_units_used"] == 50
+
+    result = buffer.flush(db)
+
+    assert result["status"] == "flushed"
+    assert usage_rows(db)["u1"].quota_units_used == 50
+
+
+def offline_buffer():
+    quota_buffer = QuotaUsageBuffer()
+    quota_buffer.redis_client = mock.Mock(
+        pipeline=mock.Mock(side_effect=redis.ConnectionError("down")),
+        set=mock.Mock(side_effect=redis.ConnectionError("down"))
+    )
+    return quota_buffer
+
+
+def test_workers_flushing_without_redis_share_one_row(db):
+    first, second = offline_buffer(), offline_buffer()
+    first.record("u1", "videos_update", 50)
+    second.record("u1", "videos_list", 1)
+
+    first.flush(db)
+    second.flush(db)
+
+    assert db.query(QuotaUsage).count() == 1
+    row = usage_rows(db)["u1"]
+    assert (row.quota_units_used, row.videos_update_calls, row.videos_list_calls) == (51, 1, 1)
+
+
+def test_in_process_flush_waits_for_the_flush_lock(buffer, redis_client, monkeypatch):
+    redis_client.set(buffer.lock_key, "1")
+    write_batch = mock.Mock()
+    monkeypatch.setattr(buffer, "_write_batch", write_batch)
+    buffer._record_local("2026-01-01", "u1", {"api_calls_count": 1, "quota_units_used": 50})
+
+    buffer._flush_local_buffer()
+
+    write_batch.assert_not_called()
+    assert buffer._local_buffer[("2026-01-01", "u1")]["quota_units_used"] == 50
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from app import robust_tasks
+from app.job_manager import job_manager
+from app.models import ABTest, TitleRotation, User
+from app.rotation_queue import deferred_rotation_queue
+
+
+@pytest.fixture
+def workers(redis_client, session_factory, monkeypatch):
+    """Point the task globals at fakeredis, the test database and a recording Celery app"""
+    @contextmanager
+    def get_database_session():
+        session = session_factory()
+        try:
+            yield session
+            session.commit()
+        finally:
+            session.close()
+
+    monkeypatch.setattr(robust_tasks, "get_database_session", get_database_session)
+    monkeypatch.setattr(job_manager, "redis_client", redis_client)
+    monkeypatch.setattr(job_manager, "connection_healthy", True)
+    monkeypatch.setattr(job_manager, "celery_app", mock.MagicMock())
+    monkeypatch.setattr(deferred_rotation_queue, "redis_client", redis_client)
+    return job_manager.celery_app
+
+
+def add_test(db, test_id, user_id, last_rotation_minutes_ago=None):
+    if db.get(User, user_id) is None:
+        db.add(User(id=user_id, firebase_uid=user_id, email=f"{user_id}@example.com"))
+    db.add(ABTest(id=test_id, user_id=user_id, video_id="v", video_title="t", status="active",
+                  started_at=datetime.utcnow() - timedelta(days=1), rotation_interval_hours=1,
+                  title_variants=["a", "b"]))
+    if last_rotation_minutes_ago is not None:
+        db.add(TitleRotation(ab_test_id=test_id, variant_index=0, title="a",
+                             started_at=datetime.utcnow() - timedelta(minutes=last_rotation_minutes_ago)))
+    db.commit()
+
+
+def test_due_tests_skips_tests_rotated_within_their_interval(db):
+    add_test(db, "never-rotated", "u1")
+    add_test(db, "rotated-long-ago", "u1", last_rotation_minutes_ago=90)
+    add_test(db, "rotated-recently", "u1", last_rotation_minutes_ago=10)
+
+    due = robust_tasks._due_tests(db, db.query(ABTest).all())
+
+    assert {test.id for test in due} == {"never-rotated", "rotated-long-ago"}
+
+
+def test_rotation_run_fans_out_one_job_per_tenant(workers, db):
+    add_test(db, "t1", "u1")
+    add_test(db, "t2", "u1")
+    add_test(db, "t3", "u2")
+    add_test(db, "t4", "u2", last_rotation_minutes_ago=10)
+
+    result = robust_tasks.rotate_titles_robust.run()
+
+    assert result["due_tests"] == 3
+    sent = {call.kwargs["kwargs"]["user_id"]: call for call in workers.send_task.call_args_list}
+    assert set(sent) == {"u1", "u2"}
+    assert sorted(sent["u1"].kwargs["kwargs"]["test_ids"]) == ["t1", "t2"]
+    assert sent["u2"].kwargs["kwargs"]["test_ids"] == ["t3"]
+    assert all(call.args == ("app.robust_tasks.rotate_tenant_titles_robust",) for call in sent.values())
+    assert workers.producer_or_acquire.call_count == 1
+    assert result["tenant_jobs"]["u1"] == sent["u1"].kwargs["task_id"]
+
+
+def test_tenant_job_rotates_only_its_own_active_tests(workers, db, monkeypatch):
+    add_test(db, "t1", "u1")
+    add_test(db, "t2", "u2")
+    rotated = []
+    monkeypatch.setattr(robust_tasks, "_perform_robust_title_rotation",
+                        lambda db, test: rotated.append(test.id) or {"test_id": test.id})
+
+    result = robust_tasks.rotate_tenant_titles_robust.run(user_id="u1", test_ids=["t1", "t2", "gone"])
+
+    assert rotated == ["t1"]
+    assert result["successful_rotations"] == 1
@@ -0,0 +1,72 @@
+import calendar
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.rotation_queue import DeferredRotationQueue
+from app.youtube_quota_manager import QuotaLimitType
+
+
+@pytest.fixture
+def queue(quota_manager, redis_client):
+    rotation_queue = DeferredRotationQueue(quota_manager)
+    rotation_queue.redis_client = redis_client
+    return rotation_queue
+
+
+def make_due(queue, redis_client, *test_ids):
+    past = calendar.timegm((datetime.utcnow() - timedelta(seconds=1)).utctimetuple())
+    for test_id in test_ids:
+        redis_client.zadd(queue.queue_key, {test_id: past})
+
+
+def test_rate_limit_reset_is_next_100_second_window(quota_manager):
+    reset_at = quota_manager.get_estimated_reset_time(QuotaLimitType.PER_100_SECONDS)
+
+    reset_ts = calendar.timegm(reset_at.utctimetuple())
+    assert reset_ts % 100 == 0
+    assert 0 < reset_ts - time.time() <= 100
+
+
+def test_rotations_waiting_on_the_same_reset_are_staggered(queue):
+    first = queue.defer("t1", "tenant_share_exceeded")
+    second = queue.defer("t2", "tenant_share_exceeded")
+
+    assert first.hour == 0 and first.minute == 0
+    assert (second - first).total_seconds() == queue.release_spacing
+
+
+def test_global_refusal_closes_the_gate_until_reset(queue):
+    assert queue.get_exhausted_until() is None
+
+    queue.defer("t1", "daily_quota_exceeded")
+
+    assert queue.get_exhausted_until() == queue.quota_manager.get_estimated_reset_time(QuotaLimitType.DAILY)
+
+
+def test_tenant_refusal_leaves_the_gate_open(queue):
+    queue.defer("t1", "user_rate_limit_exceeded")
+
+    assert queue.get_exhausted_until() is None
+
+
+def test_partition_releases_due_rotations_and_keeps_the_rest_parked(queue, redis_client):
+    queue.defer("later", "daily_quota_exceeded")
+    make_due(queue, redis_client, "due")
+
+    result = queue.partition(["due", "later", "other"])
+
+    assert result == {"released": ["due"], "parked": {"later"}}
+    assert queue.partition(["due"])["released"] == []
+
+
+def test_partition_releases_at_most_one_batch_per_tick(queue, redis_client):
+    queue.release_batch_size = 2
+    make_due(queue, redis_client, "a", "b", "c")
+
+    first = queue.partition(["a", "b", "c"])
+    second = queue.partition(["a", "b", "c"])
+
+    assert len(first["released"]) == 2
+    assert len(second["released"]) == 1
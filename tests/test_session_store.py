@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database_manager import db_manager
+from app.models import User, UserSession
+from app.session_store import SessionStore
+
+
+@pytest.fixture
+def store(redis_client):
+    session_store = SessionStore()
+    session_store.redis_client = redis_client
+    return session_store
+
+
+@pytest.fixture
+def user(db):
+    account = User(id="u1", firebase_uid="fb1", email="one@example.com")
+    db.add(account)
+    db.commit()
+    return account
+
+
+def test_created_session_resolves_from_cache(store, db, user, redis_client):
+    token = store.create(db, user, user_agent="phone")
+    db.query(UserSession).delete()
+    db.commit()
+
+    # The row is gone but the cached entry is still served until evicted
+    assert store.resolve(db, token)["firebase_uid"] == "fb1"
+
+
+def test_session_resolves_from_database_on_cache_miss(store, db, user, redis_client):
+    token = store.create(db, user)
+    redis_client.flushall()
+
+    entry = store.resolve(db, token)
+
+    assert entry["user_id"] == "u1"
+    assert redis_client.exists(store._cache_key(store.hash_token(token)))
+
+
+def test_unknown_token_is_negatively_cached(store, db, user, redis_client):
+    assert store.resolve(db, "not-a-session") is None
+    assert redis_client.get(store._cache_key(store.hash_token("not-a-session"))) == b"null"
+
+
+def test_revoke_ends_only_that_device(store, db, user):
+    phone = store.create(db, user, user_agent="phone")
+    laptop = store.create(db, user, user_agent="laptop")
+
+    store.revoke(db, phone)
+
+    assert store.resolve(db, phone) is None
+    assert store.resolve(db, laptop) is not None
+
+
+def test_revoke_all_ends_every_device(store, db, user):
+    tokens = [store.create(db, user) for _ in range(3)]
+
+    assert store.revoke_all(db, "u1") == 3
+    assert all(store.resolve(db, token) is None for token in tokens)
+
+
+def test_oldest_sessions_are_signed_out_past_the_device_limit(store, db, user):
+    store.max_sessions_per_user = 2
+    oldest = store.create(db, user)
+    db.query(UserSession).update({UserSession.last_seen_at: datetime.utcnow() - timedelta(days=1)})
+    db.commit()
+    newer = [store.create(db, user) for _ in range(2)]
+
+    assert store.resolve(db, oldest) is None
+    assert all(store.resolve(db, token) is not None for token in newer)
+    assert db.query(UserSession).count() == 2
+
+
+def test_activity_flush_slides_expiry_and_drops_expired_sessions(store, db, user, session_factory, monkeypatch):
+    @contextmanager
+    def get_db_session():
+        session = session_factory()
+        try:
+            yield session
+            session.commit()
+        finally:
+            session.close()
+
+    monkeypatch.setattr(db_manager, "get_db_session", get_db_session)
+    active = store.create(db, user)
+    expired = store.create(db, user)
+    soon = datetime.utcnow() + timedelta(hours=1)
+    db.query(UserSession).filter(UserSession.token_hash == store.hash_token(active)).update({UserSession.expires_at: soon})
+    db.query(UserSession).filter(UserSession.token_hash == store.hash_token(expired)).update(
+        {UserSession.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+    assert store.flush_activity([store.hash_token(active), store.hash_token(expired)]) == 1
+
+    db.expire_all()
+    rows = db.query(UserSession).all()
+    assert len(rows) == 1 and rows[0].expires_at > soon + timedelta(days=6)
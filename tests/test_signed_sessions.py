@@ -0,0 +1,181 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import event
+from starlette.requests import Request
+
+from app import signed_sessions
+from app.auth_dependencies import get_current_user_session
+from app.models import User
+from app.signed_sessions import SignedSessionManager
+from app.user_resolver import user_resolver
+
+
+@pytest.fixture
+def manager(redis_client):
+    session_manager = SignedSessionManager()
+    session_manager.redis_client = redis_client
+    return session_manager
+
+
+@pytest.fixture
+def user():
+    return User(id="u1", firebase_uid="fb1", subscription_plan="professional", subscription_status="active")
+
+
+def test_issued_token_verifies_with_user_and_plan_claims(manager, user):
+    token = manager.issue(user)
+
+    claims = manager.verify(token)
+
+    assert manager.is_signed_token(token)
+    assert claims["sub"] == "u1" and claims["uid"] == "fb1"
+    assert (claims["plan"], claims["status"], claims["cv"]) == ("professional", "active", 0)
+
+
+def test_table_session_tokens_are_not_signed_tokens(manager):
+    assert not manager.is_signed_token("opaque-session-token_without-dots")
+
+
+def test_tampered_or_foreign_tokens_are_rejected(manager, user):
+    token = manager.issue(user)
+    foreign = jwt.encode({"sub": "u1", "aud": "ttpr-session"}, "another-key", algorithm="HS256")
+
+    assert manager.verify(token[:-2] + ("AA" if not token.endswith("AA") else "BB")) is None
+    assert manager.verify(foreign) is None
+
+
+def test_sessions_end_at_max_age_even_when_reissued(manager, user):
+    signed_in_at = int(time.time()) - manager.max_session_age - 1
+
+    assert manager.verify(manager.issue(user, session_started_at=signed_in_at)) is None
+
+
+def test_reissue_is_due_past_half_life(manager, user):
+    claims = manager.verify(manager.issue(user))
+    assert not manager.needs_reissue(claims)
+
+    claims["exp"] = time.time() + manager.token_ttl / 2 - 1
+    assert manager.needs_reissue(claims)
+
+
+def test_revocation_reaches_other_processes_at_their_next_sync(manager, user, redis_client):
+    other_process = SignedSessionManager()
+    other_process.redis_client = redis_client
+    token = manager.issue(user)
+    assert other_process.verify(token) is not None
+
+    manager.revoke(manager.verify(token))
+
+    assert manager.verify(token) is None
+    other_process._last_sync = 0
+    assert other_process.verify(token) is None
+
+
+def test_claims_change_reaches_other_processes_at_their_next_sync(manager, user, redis_client):
+    other_process = SignedSessionManager()
+    other_process.redis_client = redis_client
+    token = manager.issue(user)
+    assert not other_process.needs_reissue(other_process.verify(token))
+
+    manager.bump_claims_version("u1")
+
+    assert manager.needs_reissue(manager.verify(token))
+    assert not other_process.needs_reissue(other_process.verify(token))
+    other_process._last_sync = 0
+    assert other_process.needs_reissue(other_process.verify(token))
+    assert not other_process.needs_reissue(other_process.verify(manager.issue(user)))
+
+
+@pytest.fixture
+def sessions(redis_client, session_factory, monkeypatch):
+    """The global manager on fakeredis, with a signed-in user in the test database"""
+    session_manager = signed_sessions.signed_session_manager
+    monkeypatch.setattr(session_manager, "redis_client", redis_client)
+    monkeypatch.setattr(session_manager, "_claims_versions", {})
+    monkeypatch.setattr(user_resolver, "redis_client", redis_client)
+
+    session = session_factory()
+    session.add(User(id="u1", firebase_uid="fb1", email="one@example.com", display_name="One",
+                     subscription_plan="free", subscription_status="free"))
+    session.commit()
+    session.close()
+    return session_manager
+
+
+def authenticate(session_factory, token):
+    request = Request({"type": "http", "headers": [(b"cookie", f"session_token={token}".encode())],
+                       "server": ("testserver", 80), "path": "/"})
+    response = Response()
+    session = session_factory()
+    try:
+        user = asyncio.run(get_current_user_session(request, response, session))
+        return user, response.headers.get("set-cookie"), session
+    except Exception:
+        session.close()
+        raise
+
+
+def change_user(session_factory, **values):
+    session = session_factory()
+    user = session.get(User, "u1")
+    for column, value in values.items():
+        setattr(user, column, value)
+    session.commit()
+    session.close()
+
+
+def test_signed_session_authenticates_without_queries(sessions, session_factory):
+    token = sessions.issue(User(id="u1", firebase_uid="fb1", email="one@example.com",
+                                subscription_plan="free", subscription_status="free"))
+    queries = []
+    event.listen(session_factory.kw["bind"], "before_cursor_execute", lambda *args, **kwargs: queries.append(1))
+
+    user, cookie, session = authenticate(session_factory, token)
+
+    assert (user.id, user.email, user.subscription_status) == ("u1", "one@example.com", "free")
+    assert cookie is None and queries == []
+    # Columns the token does not carry load on first access
+    assert user.display_name == "One" and len(queries) == 1
+    session.close()
+
+
+def test_plan_change_reissues_the_token_with_the_new_plan(sessions, session_factory):
+    session = session_factory()
+    token = sessions.issue(session.get(User, "u1"))
+    session.close()
+
+    change_user(session_factory, subscription_plan="professional", subscription_status="active")
+    user, cookie, session = authenticate(session_factory, token)
+    session.close()
+
+    assert user.subscription_status == "active"
+    reissued = cookie.split(";")[0].split("=", 1)[1]
+    claims = sessions.verify(reissued)
+    assert (claims["plan"], claims["status"]) == ("professional", "active")
+    assert not sessions.needs_reissue(claims)
+
+
+def test_unrelated_writes_keep_the_token_current(sessions, session_factory):
+    session = session_factory()
+    token = sessions.issue(session.get(User, "u1"))
+    session.close()
+
+    change_user(session_factory, display_name="Renamed")
+
+    assert not sessions.needs_reissue(sessions.verify(token))
+
+
+def test_deactivated_user_is_signed_out(sessions, session_factory):
+    session = session_factory()
+    token = sessions.issue(session.get(User, "u1"))
+    session.close()
+
+    change_user(session_factory, is_active=False)
+
+    with pytest.raises(HTTPException) as error:
+        authenticate(session_factory, token)
+    assert error.value.status_code == 401
@@ -0,0 +1,24 @@
+from app.celery_app import celery_app
+from app.job_manager import JobPriority
+from app.task_routing import TASK_ROLES, celery_priority
+
+
+def test_worker_app_registers_every_routed_task():
+    celery_app.loader.import_default_modules()
+
+    assert set(TASK_ROLES) <= set(celery_app.tasks)
+
+
+def test_every_route_targets_a_declared_queue():
+    declared = {queue.name for queue in celery_app.conf.task_queues}
+    routes = celery_app.conf.task_routes
+
+    assert {route["queue"] for route in routes.values()} <= declared
+    assert declared == {route["queue"] for route in routes.values()}
+
+
+def test_higher_job_priority_maps_to_more_urgent_broker_priority():
+    priorities = [celery_priority(priority.value) for priority in JobPriority]
+
+    assert priorities == sorted(priorities, reverse=True)
+    assert all(0 <= priority <= 9 for priority in priorities)
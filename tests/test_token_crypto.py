@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import token_crypto
+from app.models import User
+from app.token_crypto import DecryptedTokenCache, decrypted_token_cache, get_fernet
+
+
+@pytest.fixture
+def secrets(monkeypatch):
+    """Rebuild the process-wide cipher for the given current and previous secrets"""
+    def use(current, previous=""):
+        monkeypatch.setattr(token_crypto.settings, "secret_key", current)
+        monkeypatch.setattr(token_crypto.settings, "previous_secret_keys", previous)
+        monkeypatch.setattr(token_crypto, "_fernet", None)
+    yield use
+    token_crypto._fernet = None
+
+
+def test_cipher_is_built_once_per_process(secrets):
+    secrets("current")
+
+    assert get_fernet() is get_fernet()
+
+
+def test_tokens_encrypted_under_a_previous_secret_stay_readable(secrets):
+    secrets("old-secret")
+    stored = User._encrypt_token("access-token")
+
+    secrets("new-secret", previous="unrelated, old-secret")
+
+    assert User._decrypt_token(stored) == "access-token"
+
+
+def test_tokens_under_an_unknown_secret_are_unreadable(secrets):
+    secrets("old-secret")
+    stored = User._encrypt_token("access-token")
+
+    secrets("new-secret")
+
+    assert User._decrypt_token(stored) is None
+
+
+def test_decrypted_token_is_only_served_for_the_same_expiry():
+    cache = DecryptedTokenCache()
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    cache.put("u1", expires_at, "plaintext")
+
+    assert cache.get("u1", expires_at) == "plaintext"
+    assert cache.get("u1", expires_at + timedelta(seconds=1)) is None
+    assert cache.get("u1", expires_at) is None
+
+
+def test_decrypted_token_cache_is_bounded():
+    cache = DecryptedTokenCache(max_size=2)
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    for user_id in ("a", "b", "c"):
+        cache.put(user_id, expires_at, user_id)
+
+    assert cache.get("a", expires_at) is None
+    assert cache.get("c", expires_at) == "c"
+
+
+def test_user_token_changes_replace_the_cached_plaintext(secrets):
+    secrets("current")
+    user = User(id="u-crypto")
+    user.set_google_tokens("first", "refresh")
+    assert user.get_google_access_token() == "first"
+
+    user.set_google_tokens("second")
+    assert user.get_google_access_token() == "second"
+
+    user.clear_google_tokens()
+    assert user.get_google_access_token() is None
+    assert decrypted_token_cache.get("u-crypto", user.token_expires_at) is None
@@ -0,0 +1,198 @@
+import asyncio
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+import redis
+from sqlalchemy import event
+
+from app import auth_dependencies
+from app.auth_dependencies import get_current_firebase_user
+from app.models import User
+from app.user_resolver import user_resolver
+
+
+@pytest.fixture
+def resolver(redis_client, monkeypatch):
+    # The User write hooks invalidate through the global resolver
+    monkeypatch.setattr(user_resolver, "redis_client", redis_client)
+    monkeypatch.setattr(user_resolver, "_local", OrderedDict())
+    return user_resolver
+
+
+@pytest.fixture
+def queries(session_factory):
+    count = {"n": 0}
+    engine = session_factory.kw["bind"]
+
+    def on_execute(*args, **kwargs):
+        count["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    yield count
+    event.remove(engine, "before_cursor_execute", on_execute)
+
+
+@pytest.fixture
+def user(session_factory):
+    session = session_factory()
+    session.add(User(id="u1", firebase_uid="fb1", email="one@example.com", display_name="One",
+                     google_access_token="encrypted-secret"))
+    session.commit()
+    session.close()
+
+
+def resolve(session_factory, resolver, uid="fb1", email=None):
+    session = session_factory()
+    try:
+        return resolver.resolve(session, uid, email)
+    finally:
+        session.close()
+
+
+def test_repeat_lookups_are_served_without_queries(session_factory, resolver, user, queries):
+    resolve(session_factory, resolver)
+    resolve(session_factory, resolver)
+    queries["n"] = 0
+
+    found = resolve(session_factory, resolver)
+
+    assert found.id == "u1" and found.display_name == "One"
+    assert queries["n"] == 0
+
+
+def test_first_lookup_of_a_uid_is_kept_out_of_redis(session_factory, resolver, user, redis_client):
+    resolve(session_factory, resolver)
+    assert not redis_client.exists(resolver._snapshot_key("fb1"))
+
+    resolver._local.clear()
+    resolve(session_factory, resolver)
+    assert redis_client.exists(resolver._snapshot_key("fb1"))
+
+
+def test_snapshot_is_stored_under_version_read_before_the_query(session_factory, resolver, user, redis_client):
+    resolve(session_factory, resolver)
+    resolver._local.clear()
+
+    # A write lands after the version was read but before the row is returned
+    original_query = resolver._query_user
+
+    def query_then_concurrent_write(db, firebase_uid, email):
+        found = original_query(db, firebase_uid, email)
+        resolver.invalidate(found.id)
+        return found
+
+    with mock.patch.object(resolver, "_query_user", side_effect=query_then_concurrent_write):
+        resolve(session_factory, resolver)
+
+    stored = json.loads(redis_client.get(resolver._snapshot_key("fb1")))
+    assert stored["version"] == resolver._get_version("u1") - 1
+    resolver._local.clear()
+    assert resolver._cached_snapshot("fb1") is None
+
+
+def test_committed_write_is_seen_by_the_next_lookup(session_factory, resolver, user):
+    resolve(session_factory, resolver)
+    resolve(session_factory, resolver)
+
+    session = session_factory()
+    found = resolver.resolve(session, "fb1", None)
+    found.display_name = "Renamed"
+    session.commit()
+    session.close()
+
+    assert resolve(session_factory, resolver).display_name == "Renamed"
+    resolver._local.clear()
+    assert resolve(session_factory, resolver).display_name == "Renamed"
+
+
+def test_secrets_stay_out_of_redis_but_load_on_access(session_factory, resolver, user, redis_client):
+    resolve(session_factory, resolver)
+    resolver._local.clear()
+    resolve(session_factory, resolver)
+    resolver._local.clear()
+
+    stored = json.loads(redis_client.get(resolver._snapshot_key("fb1")))
+    assert "google_access_token" not in stored["columns"]
+
+    session = session_factory()
+    assert resolver.resolve(session, "fb1", None).google_access_token == "encrypted-secret"
+    session.close()
+
+
+def test_legacy_uid_is_found_and_canonicalized(session_factory, resolver):
+    session = session_factory()
+    session.add(User(id="u2", firebase_uid="google_fb2", email="two@example.com"))
+    session.commit()
+    session.close()
+
+    with mock.patch.object(resolver, "_canonicalize_in_background") as canonicalize:
+        assert resolve(session_factory, resolver, uid="fb2").id == "u2"
+
+    canonicalize.assert_called_once_with("u2", "fb2")
+
+
+def test_lookup_falls_back_to_email(session_factory, resolver, user):
+    assert resolve(session_factory, resolver, uid="new-uid", email="one@example.com").id == "u1"
+
+
+def test_lookup_works_while_redis_is_down(session_factory, resolver, user, monkeypatch):
+    monkeypatch.setattr(resolver, "redis_client", mock.Mock(get=mock.Mock(side_effect=redis.ConnectionError("down"))))
+
+    assert resolve(session_factory, resolver).id == "u1"
+
+
+@pytest.fixture
+def signed_in(session_factory, monkeypatch):
+    def add(expires_in):
+        session = session_factory()
+        session.add(User(id="u3", firebase_uid="fb3", email="three@example.com",
+                         google_access_token="access", google_refresh_token="refresh",
+                         token_expires_at=datetime.utcnow() + expires_in))
+        session.commit()
+        session.close()
+
+    monkeypatch.setattr(auth_dependencies.auth_manager, "verify_id_token_comprehensive",
+                        lambda token: {"uid": "fb3", "email": "three@example.com"})
+    return add
+
+
+def authenticate(session_factory):
+    session = session_factory()
+    try:
+        return asyncio.run(get_current_firebase_user("id-token", session))
+    finally:
+        session.close()
+
+
+def test_warm_authentication_runs_no_queries(session_factory, resolver, signed_in, queries):
+    signed_in(timedelta(hours=1))
+    authenticate(session_factory)
+    authenticate(session_factory)
+    queries["n"] = 0
+
+    assert authenticate(session_factory).id == "u3"
+    assert queries["n"] == 0
+
+
+def test_expired_token_is_refreshed_without_loading_secrets(session_factory, resolver, signed_in, queries,
+                                                            monkeypatch):
+    signed_in(timedelta(minutes=-5))
+    refresh = mock.AsyncMock(return_value="new-access")
+    monkeypatch.setattr(auth_dependencies.google_token_refresher, "refresh", refresh)
+    authenticate(session_factory)
+    authenticate(session_factory)
+    queries["n"] = 0
+    refresh.reset_mock()
+
+    session = session_factory()
+    user = asyncio.run(get_current_firebase_user("id-token", session))
+
+    refresh.assert_awaited_once_with("u3")
+    assert queries["n"] == 0
+    # The refresh expired the token columns, so the cached presence flags no longer answer
+    assert user.google_refresh_token == "refresh"
+    assert queries["n"] == 1
+    session.close()